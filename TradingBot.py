@@ -1,593 +1,4313 @@
-from binance.client import Client  # type: ignore
-from binance.exceptions import BinanceAPIException  # type: ignore
-import keyboard
-import time
-import json
-import logging
-import os
-import sys
-import sqlite3
-from typing import Dict, Any, Tuple
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-from multiprocessing import Process, Queue, Event
-
-###################### HANDLERS ######################
-
-## CARREGA JSON
-def load_config(filepath: str) -> Dict[str, Any]:
-    try:
-        with open(filepath, "r") as file:
-            config = json.load(file)
-    except FileNotFoundError:
-        logger.error(f"Arquivo de configuração '{filepath}' não encontrado.")
-        raise
-    except json.JSONDecodeError:
-        logger.error(f"Erro ao decodificar o arquivo de configuração '{filepath}'.")
-        raise
-    return config
-## CONFIGURAÇÕES DE LOG
-log_folder = 'logs'
-if not os.path.exists(log_folder):
-    os.makedirs(log_folder)
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-## HANDLER PARA O ARQUIVO DE LOG
-file_handler = logging.FileHandler(os.path.join(log_folder, 'trading_bot.log'), encoding='utf-8')
-file_handler.setLevel(logging.INFO)
-## HANDLER PARA O TERMINAL
-stream_handler = logging.StreamHandler()
-stream_handler.setLevel(logging.INFO)
-## FORMATADOR PARA OS HANDLERS
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-file_handler.setFormatter(formatter)
-stream_handler.setFormatter(formatter)
-## ADICIONA OS HANDLERS AO LOGGER
-logger.addHandler(file_handler)
-logger.addHandler(stream_handler)
-
-## CONFIGURAÇÕES
-config = load_config("config.json")
-API_KEY = config.get("API_KEY", "")
-API_SECRET = config.get("API_SECRET", "")
-INTERVAL = config.get("INTERVAL", "")
-LOOKBACK = config.get("LOOKBACK", "")
-SYMBOL = config.get("SYMBOL")
-BUY_MIN = float(config["BUY_MIN"])
-BUY_PRICE = float(config["BUY_PRICE"])
-ORDER_MARGIN = float(config["ORDER_MARGIN"]) / 100
-FIBONACCI_LEVELS = [0.236, 0.382, 0.5, 0.618, 0.764]  # Níveis de Fibonacci
-FIBONACCI_TOLERANCE = float(config["FIBONACCI_TOLERANCE"]) / 100
-PERCENTAGE_TO_USE = float(config["PERCENTAGE_TO_USE"]) / 100
-BALANCE_SAFE = float(config["BALANCE_SAFE"])
-TIME_CHECK = int(config["TIME_CHECK"])
-SIMULATION_MODE = config.get("SIMULATION_MODE", False)  # Modo de simulação
-SIMULATION_BALANCE = float(config["SIMULATION_BALANCE"])
-SIMULATION_PRICE = float(config["SIMULATION_PRICE"])
-TRADE_CRITERIA = config.get("TRADE_CRITERIA", "fibonacci")  # Critério de trade: "fibonacci" ou "support_resistance"
-
-## CONFIG JSON FILE
-if getattr(sys, 'frozen', False):
-    base_path = sys._MEIPASS
-else:
-    base_path = os.path.dirname(__file__)
-config_path = os.path.join(base_path, 'config.json')
-## VALIDAÇÃO DE DADOS
-if not API_KEY or not API_SECRET:
-    logger.error("Chaves de API não fornecidas.")
-    raise ValueError("Chaves de API não fornecidas.")
-if not SYMBOL or PERCENTAGE_TO_USE <= 0:
-    logger.error("Configuração inválida detectada.")
-    raise ValueError("Configuração inválida detectada.")
-
-
-
-
-
-
-
-
-###################### CONECCTIONS ######################
-
-
-## INICIALIZA O CLIENTE BINANCE
-def initialize_client(api_key, api_secret):
-    return Client(api_key, api_secret)
-## INICIALIZA O BANCO DE DADOS SQLITE
-def initialize_database():
-    conn = sqlite3.connect('orders.db')
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date_buy TEXT,
-            quantity REAL,
-            buy_price REAL,
-            target_price REAL,
-            sell_price REAL,
-            value_purchased REAL,
-            value_end REAL,
-            profit REAL,
-            date_sell TEXT,
-            status TEXT
-        )
-    ''')
-    conn.commit()
-    return conn, c
-## INSERE ORDEM DE COMPRA
-def insert_order(date_buy: str, quantity: float, buy_price: float, target_price: float) -> int:
-    try:
-        conn = sqlite3.connect('orders.db')
-        c = conn.cursor()
-        
-        # Calcula o valor de compra no momento da compra
-        value_purchased = quantity * buy_price
-        
-        # Insere a ordem no banco de dados
-        c.execute('''
-            INSERT INTO orders (date_buy, quantity, buy_price, target_price, sell_price, value_purchased, value_end, profit, date_sell, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (date_buy, quantity, buy_price, target_price, None, value_purchased, None, None, None,'open'))
-        
-        conn.commit()
-        order_id = c.lastrowid  # Obtém o ID da última ordem inserida
-        conn.close()
-        
-        logger.info(f"Ordem de compra: ID {order_id}, Data: {date_buy}, Quantidade: {quantity}, Valor de Compra: {value_purchased}, Preço de Compra: {buy_price}, Preço alvo: {target_price}")
-        return order_id
-    except sqlite3.Error as e:
-        logger.error(f"Erro ao inserir ordem no banco de dados: {e}")
-        raise
-## ATUALIZA ORDEM DE VENDA
-def update_order_status(order_ids: list, status: str, sell_price: float):
-    try:
-        conn = sqlite3.connect('orders.db')
-        c = conn.cursor()
-
-        total_profit = 0.0  # Inicializa o lucro total
-        updated_order_ids = []  # Para armazenar IDs das ordens atualizadas
-
-        for order_id in order_ids:
-            # Recupera o preço de compra, a quantidade e o valor de compra para calcular o lucro
-            c.execute('SELECT buy_price, quantity, value_purchased FROM orders WHERE id = ?', (order_id,))
-            result = c.fetchone()
-
-            if result:
-                buy_price, quantity, value_purchased = result
-
-                # Verifica se buy_price e quantity são números válidos
-                try:
-                    buy_price = float(buy_price) if buy_price is not None else 0.0
-                    quantity = float(quantity) if quantity is not None else 0.0
-                    value_purchased = float(value_purchased) if value_purchased is not None else 0.0
-                except ValueError as ve:
-                    logger.error(f"Erro ao converter valores numéricos para ID {order_id}: {ve}")
-                    continue
-
-                # Calcula o valor final da venda e o lucro
-                try:
-                    value_end = sell_price * quantity
-                    profit = value_end - value_purchased
-                except TypeError as te:
-                    logger.error(f"Erro ao calcular lucro para ID {order_id}: {te}")
-                    continue
-
-                total_profit += profit  # Acumula o lucro total
-
-                # Atualiza a ordem no banco de dados
-                c.execute('''
-                    UPDATE orders
-                    SET status = ?, sell_price = ?, value_end = ?, profit = ?, date_sell = ?
-                    WHERE id = ?
-                ''', (status, sell_price, value_end, profit, time.strftime('%Y-%m-%d %H:%M:%S'), order_id))
-                
-                updated_order_ids.append(order_id)
-                
-                # Log para cada ordem atualizada
-                logger.info(f"Ordem atualizada: ID {order_id}, Status: {status}, Preço de venda: {sell_price}, Valor final: {value_end:.2f}, Lucro: {profit:.2f}")
-
-        conn.commit()
-        conn.close()
-
-        # Log do lucro total após a atualização de todas as ordens
-        logger.info(f"Lucro total das ordens vendidas: R${total_profit:.2f}")
-        logger.info(f"Ordens atualizadas: IDs {updated_order_ids}, Status: {status}, Preço de venda: {sell_price}")
-
-    except sqlite3.Error as e:
-        logger.error(f"Erro ao atualizar ordens no banco de dados: {e}")
-        raise
-    except Exception as ex:
-        logger.error(f"Erro inesperado: {ex}")
-        raise
-## OBTÉM O PREÇO MAIS RECENTE E CALCULA OS NÍVEIS DE FIBONACCI
-def get_fibonacci_levels(current_price: float):
-    levels = [current_price - (current_price * level) for level in FIBONACCI_LEVELS]
-    return levels
-## OBTÉM O PREÇO ATUAL DO BTC/BRL
-def get_btc_brl_price() -> float:
-    try:
-        ticker = client.get_symbol_ticker(symbol=SYMBOL)
-        return float(ticker['price'])
-    except BinanceAPIException as e:
-        logger.error(f"Erro ao obter preço do BTC/BRL: {e}")
-        return 0.0
-client = initialize_client(API_KEY, API_SECRET)
-conn, c = initialize_database()
-
-
-###################### IMPLATANÇÕES ######################
-
-
-## OBTÉM AS TAXAS DE NEGOCIAÇÃO
-def get_trading_fees() -> Tuple[float, float]:
-    try:
-        account_info = client.get_account()
-        # Corrigir as taxas para valores decimais corretos
-        maker_fee = float(account_info['makerCommission']) / 10000  # Dividir por 10000 para obter 0.001 (0,1%)
-        taker_fee = float(account_info['takerCommission']) / 10000  # Dividir por 10000 para obter 0.001 (0,1%)
-        logger.info(f"Taxas obtidas - Maker: {maker_fee * 100}%, Taker: {taker_fee * 100}%")
-        return maker_fee, taker_fee
-    except BinanceAPIException as e:
-        logger.error(f"Erro ao obter taxas de negociação: {e}")
-        return 0.0, 0.0
-## HISTORICO
-def get_historical_data(client, SYMBOL, INTERVAL, LOOKBACK):
-    try:
-        df = pd.DataFrame(client.get_historical_klines(SYMBOL, INTERVAL, LOOKBACK))
-        df.columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time', 
-                      'quote_asset_volume', 'number_of_trades', 'taker_buy_base_asset_volume', 
-                      'taker_buy_quote_asset_volume', 'ignore']
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df.set_index('timestamp', inplace=True)
-        df = df.astype(float)
-        logger.info("Dados históricos obtidos com sucesso.")
-        return df
-    except BinanceAPIException as e:
-        logger.error(f"Erro ao obter dados históricos: {e}")
-        return pd.DataFrame()  # Retorna um DataFrame vazio em caso de erro
-## CALCULO DO PROFIT
-def calcular_lucro_liquido(preco_compra, preco_venda, quantidade, maker_fee, taker_fee):
-    # Calcula as taxas
-    taxa_compra = preco_compra * quantidade * maker_fee
-    taxa_venda = preco_venda * quantidade * taker_fee
-    taxas_totais = taxa_compra + taxa_venda
-
-    # Calcula o lucro líquido
-    lucro_liquido = (preco_venda * quantidade) - (preco_compra * quantidade) - taxas_totais
-    return lucro_liquido
-## VERIFICA LUCRO
-def verificar_lucro(preco_compra, preco_venda, quantidade):
-    maker_fee, taker_fee = get_trading_fees(client)  # Obtém as taxas da Binance
-    lucro_liquido = calcular_lucro_liquido(preco_compra, preco_venda, quantidade, maker_fee, taker_fee)
-
-    if lucro_liquido > 0:
-        logger.info(f"Lucro líquido esperado: R${lucro_liquido:.2f}. Venda é lucrativa.")
-        return True
-    else:
-        logger.info(f"Lucro líquido esperado: R${lucro_liquido:.2f}. Venda não é lucrativa.")
-        return False
-## Função para exibir e atualizar o gráfico em um processo separado
-def plot_strategy_process(queue, stop_event):
-    plt.ion()  # Ativa o modo interativo
-    fig, ax = plt.subplots(figsize=(12, 8))
-    last_df = None  # Armazena o último DataFrame recebido
-
-    while not stop_event.is_set():  # Verifica se o evento de parada foi acionado
-        try:
-            if not queue.empty():
-                df = queue.get_nowait()  # Obtém o DataFrame atualizado sem bloquear
-                if df is None:  # Sinal para encerrar o processo
-                    break
-                if not df.empty and 'close' in df.columns and 'SMA_50' in df.columns and 'SMA_200' in df.columns:
-                    last_df = df  # Atualiza o último DataFrame válido recebido
-
-            if last_df is not None:  # Se houver dados válidos, atualiza o gráfico
-                ax.clear()  # Limpa o gráfico para atualizar
-                ax.plot(last_df.index, last_df['close'], label='Close Price', alpha=0.5)
-                ax.plot(last_df.index, last_df['SMA_50'], label='SMA 50', alpha=0.75)
-                ax.plot(last_df.index, last_df['SMA_200'], label='SMA 200', alpha=0.75)
-
-                # Adiciona os sinais de compra e venda
-                buy_signals = last_df[last_df['position'] == 1]
-                sell_signals = last_df[last_df['position'] == -1]
-
-                # Plota os sinais de compra
-                ax.plot(buy_signals.index, buy_signals['close'], '^', markersize=10, color='g', lw=0, label='Buy Signal')
-                for idx, row in buy_signals.iterrows():
-                    ax.text(idx, row['close'], f"{row['close']:.2f}", color='green', fontsize=8)
-
-                # Plota os sinais de venda
-                ax.plot(sell_signals.index, sell_signals['close'], 'v', markersize=10, color='r', lw=0, label='Sell Signal')
-                for idx, row in sell_signals.iterrows():
-                    ax.text(idx, row['close'], f"{row['close']:.2f}", color='red', fontsize=8)
-
-                ax.set_title('Trading Strategy')
-                ax.legend()
-                plt.draw()
-                plt.pause(0.5)  # Atualiza o gráfico com menor frequência
-        except Exception as e:
-            logger.error(f"Erro no processo do gráfico: {e}")
-            break
-
-    plt.close(fig)  # Fecha o gráfico ao encerrar o processo
-
-## ESTRATEGIA
-def strategy(df):
-    if df.empty:
-        logger.error("O DataFrame de dados históricos está vazio.")
-        return df
-
-    # Calcular as médias móveis
-    df['SMA_50'] = df['close'].rolling(window=50).mean()
-    df['SMA_200'] = df['close'].rolling(window=200).mean()
-    
-    # Inicializar a coluna 'signal' com 0
-    df['signal'] = 0
-    
-    # Definir sinais usando .iloc para evitar problemas com o índice
-    if len(df) > 200:  # Garante que há dados suficientes
-        df.iloc[200:, df.columns.get_loc('signal')] = np.where(
-            df['SMA_50'].iloc[200:] > df['SMA_200'].iloc[200:], 1, 0
-        )
-    
-    # Calcular a coluna 'position' para detectar mudanças de sinal
-    df['position'] = df['signal'].diff()
-    
-    return df
-
-# Execução das funções
-
-###################### METRICAS TRADING ######################
-
-
-## CALCULA SUPORTE E RESISTÊNCIA
-def calculate_support_resistance(prices: list) -> Tuple[float, float]:
-    """Calcula o suporte e resistência com base nos preços."""
-    if not prices:
-        logger.error("Nenhum preço disponível para calcular suporte e resistência.")
-        return 0.0, 0.0
-
-    suporte = min(prices)  # Suporte é o menor preço do período
-    resistencia = max(prices)  # Resistência é o maior preço do período
-
-    logger.info(f"Suporte calculado: R${suporte:.2f}, Resistência calculada: R${resistencia:.2f}")
-    return suporte, resistencia
-## CÁLCULO DO RSI
-def calculate_rsi(prices: list, period: int = 14) -> float:
-    if len(prices) < period:
-        logger.error("Não há preços suficientes para calcular o RSI.")
-        return 0.0
-
-    # Cálculo das variações de preço
-    gains = [prices[i] - prices[i-1] for i in range(1, len(prices)) if prices[i] > prices[i-1]]
-    losses = [prices[i-1] - prices[i] for i in range(1, len(prices)) if prices[i] < prices[i-1]]
-
-    average_gain = sum(gains) / period
-    average_loss = sum(losses) / period
-
-    if average_loss == 0:
-        return 100
-
-    rs = average_gain / average_loss
-    rsi = 100 - (100 / (1 + rs))
-    logger.info(f"RSI calculado: {rsi:.2f}")
-    return rsi
-## DETECTA PADRÃO DE VELA
-def detect_hammer_candle(open_price, close_price, low_price, high_price):
-    """Detecta padrão de martelo nas velas."""
-    if close_price > open_price and (high_price - close_price) < (close_price - low_price) * 0.2:
-        logger.info("Padrão de Martelo identificado - Possível reversão de tendência.")
-        return True
-    return False
-
-
-
-###################### LOOP ######################
-
-
-## FUNÇÃO PRINCIPAL DE NEGOCIAÇÃO
-def trade():
-    try: 
-        # Obter o preço atual e saldo
-        if SIMULATION_MODE:
-            price = SIMULATION_PRICE
-            current_price = price
-            balance = SIMULATION_BALANCE
-            logger.info(f"Preço simulado do {SYMBOL}: R${current_price:.2f}")
-            logger.info(f"Saldo simulado disponível: R${balance:.2f}")
-        else:
-            current_price = get_btc_brl_price()
-            logger.info(f"Preço atual do {SYMBOL}: R${current_price:.2f}")
-            asset_balance = client.get_asset_balance(asset='BRL')
-            balance = float(asset_balance['free'])
-            logger.info(f"Saldo disponível: R${balance:.2f}")
-
-        # Obter dados históricos para calcular suporte e resistência
-        df = get_historical_data(client, SYMBOL, INTERVAL, LOOKBACK)
-        if df.empty:
-            logger.error("Não foi possível obter dados históricos para calcular suporte e resistência.")
-            return
-
-        # Calcular suporte e resistência
-        suporte, resistencia = calculate_support_resistance(df['close'].tolist())
-        logger.info(f"Suporte: R${suporte:.2f}, Resistência: R${resistencia:.2f}")
-
-        # Calcular níveis de Fibonacci
-        fibonacci_levels = get_fibonacci_levels(current_price)
-        logger.info(f"Níveis de Fibonacci: {fibonacci_levels}")
-
-        # Definir o valor a ser usado na compra
-        if balance < BALANCE_SAFE:
-            amount_to_use = balance
-        else:
-            amount_to_use = balance * PERCENTAGE_TO_USE
-
-        # Verificar se o valor a ser usado é suficiente para a compra mínima
-        if amount_to_use < BUY_MIN:
-            logger.info(f"Ignorando a compra R${amount_to_use:.2f} abaixo do mínimo R${BUY_MIN:.2f}.")
-            logger.info("-----------------------------------------------------------------------------------")
-        else:
-            # Calcular a quantidade a ser comprada e o preço alvo
-            quantity_to_buy = amount_to_use / current_price
-            buy_price = current_price
-            target_price = buy_price * (1 + ORDER_MARGIN)
-
-            logger.info(f"Valor da compra: R${amount_to_use:.2f}")
-            logger.info(f"Quantidade de BTC a ser comprada: {quantity_to_buy}")
-            logger.info(f"Preço alvo calculado: {target_price:.2f}")
-
-            # Escolher o critério de trade
-            if TRADE_CRITERIA == "fibonacci":
-                logger.info("Usando critério de Fibonacci para trade.")
-                if current_price <= BUY_PRICE and current_price >= fibonacci_levels[0]:
-                    logger.info(f"Preço atual ({current_price:.2f}) atende ao critério de Fibonacci ({fibonacci_levels[0]}).")
-                    logger.info("-----------------------------------------------------------------------------------")
-                    if SIMULATION_MODE:
-                        logger.info("Modo de simulação ativado. Comprando Bitcoin...")
-                        insert_order(time.strftime('%Y-%m-%d %H:%M:%S'), quantity_to_buy, buy_price, target_price)
-                        logger.info(f"[SIMULATED BUY] Compra simulada registrada: Quantidade: {quantity_to_buy} BTC a R${buy_price}")
-                        logger.info("-----------------------------------------------------------------------------------")
-                    else:
-                        logger.info("Comprando Bitcoin...")
-                        order = client.order_market_buy(symbol=SYMBOL, quantity=quantity_to_buy)
-                        insert_order(time.strftime('%Y-%m-%d %H:%M:%S'), quantity_to_buy, buy_price, target_price)
-                        logger.info(f"[BUY] Compra realizada: {order}")
-                        logger.info("-----------------------------------------------------------------------------------")
-                else:
-                    logger.info(f"Preço atual ({current_price:.2f}) não atende aos critérios de Fibonacci.")
-                    logger.info("-----------------------------------------------------------------------------------")
-            elif TRADE_CRITERIA == "support_resistance":
-                logger.info("Usando critério de suporte/resistência para trade.")
-                if current_price <= suporte * (1 + FIBONACCI_TOLERANCE):
-                    logger.info(f"Preço atual ({current_price}) está próximo do suporte ({suporte}).")
-                    logger.info("-----------------------------------------------------------------------------------")
-                    if SIMULATION_MODE:
-                        logger.info("Modo de simulação ativado. Comprando Bitcoin...")
-                        insert_order(time.strftime('%Y-%m-%d %H:%M:%S'), quantity_to_buy, buy_price, resistencia)
-                        logger.info(f"[SIMULATED BUY] Compra simulada registrada: Quantidade: {quantity_to_buy} BTC a R${buy_price:.2f}")
-                        logger.info("-----------------------------------------------------------------------------------")
-                    else:
-                        logger.info("Comprando Bitcoin...")
-                        order = client.order_market_buy(symbol=SYMBOL, quantity=quantity_to_buy)
-                        insert_order(time.strftime('%Y-%m-%d %H:%M:%S'), quantity_to_buy, buy_price, resistencia)
-                        logger.info(f"[BUY] Compra realizada: {order}")
-                        logger.info("-----------------------------------------------------------------------------------")
-                else:
-                    logger.info(f"Preço atual ({current_price}) não está próximo do suporte ({suporte}).")
-                    logger.info("-----------------------------------------------------------------------------------")
-            else:
-                logger.error(f"Critério de trade inválido: {TRADE_CRITERIA}")
-                return
-        
-        # Consolidar ordens para venda
-        conn = sqlite3.connect('orders.db')
-        c = conn.cursor()
-        c.execute('SELECT * FROM orders WHERE status = "open"')
-        open_orders = c.fetchall()
-
-        if open_orders:
-            total_quantity = sum(order[2] for order in open_orders)  # Quantidade total de ordens abertas
-            sell_orders = [order for order in open_orders if current_price >= order[4]]  # Filtra ordens para venda
-
-            if sell_orders:
-                order_ids = []
-                for order in sell_orders:
-                    if verificar_lucro(preco_compra=order[3], preco_venda=current_price, quantidade=order[2]):
-                        logger.info(f"Venda será realizada para a ordem ID {order[0]}, pois é lucrativa.")
-                        if SIMULATION_MODE:
-                            logger.info(f"[SIMULATED SELL] Ordem ID {order[0]}: Vendendo {order[2]} BTC a R${current_price:.2f}.")
-                        else:
-                            client.order_market_sell(symbol=SYMBOL, quantity=order[2])
-                        order_ids.append(order[0])
-                    else:
-                        logger.info(f"Venda não será realizada para a ordem ID {order[0]}, pois não é lucrativa.")
-
-                if order_ids:
-                    update_order_status(order_ids, 'closed', current_price)
-                    logger.info("Ordens lucrativas foram fechadas.")
-                    logger.info("-----------------------------------------------------------------------------------")
-
-    except BinanceAPIException as e:
-        logger.error(f"Erro na API Binance: {e}")
-    except Exception as e:
-        logger.error(f"Erro inesperado: {e}")
-## VERIFICA SE A TECLA ESC FOI PRESSIONADA E RETORNA O ESTADO
-def check_pause_condition():
-    return keyboard.is_pressed('esc')
-## FUNÇÃO PRINCIPAL
-def main():
-    # Inicializa a fila para comunicação entre processos
-    queue = Queue()
-    stop_event = Event()
-
-    # Inicia o processo do gráfico
-    plot_process = Process(target=plot_strategy_process, args=(queue, stop_event))
-    plot_process.start()
-
-    paused = False
-    last_run_time = time.time()  # Guarda o tempo da última execução
-    first_run = True  # Flag para verificar a primeira execução
-    try:    
-        while True:
-            current_time = time.time()
-
-            # Verifica se a tecla ESC foi pressionada
-            if keyboard.is_pressed('esc'):
-                paused = not paused
-                if paused:
-                    logger.info("Programa pausado. Pressione ESC novamente para retomar.")
-                else:
-                    logger.info("Programa retomado.")
-                time.sleep(1)  # Adiciona um atraso para evitar múltiplas detecções
-
-            if not paused:
-                if first_run or current_time - last_run_time >= TIME_CHECK:
-                    try:
-                        # Executa o bot
-                        trade()
-
-                        # Atualiza o DataFrame e envia para o processo do gráfico
-                        df = get_historical_data(client, SYMBOL, INTERVAL, LOOKBACK)
-                        df = strategy(df)
-                        if not df.empty:
-                            if queue.qsize() < 5:  # Limita o tamanho da fila para evitar sobrecarga
-                                queue.put(df)  # Envia o DataFrame atualizado para o gráfico
-                            else:
-                                logger.warning("Fila cheia. Ignorando envio de dados para o gráfico.")
-                        else:
-                            logger.error("DataFrame vazio, não enviado para o gráfico.")
-                    except Exception as e:
-                        logger.error(f"Erro na função trade: {e}")
-                    last_run_time = current_time
-                    first_run = False
-                else:
-                    time.sleep(1)
-            else:
-                time.sleep(1)
-    except KeyboardInterrupt:
-        logger.info("Encerrando o programa...")
-    finally:
-        stop_event.set()  # Sinaliza para o processo do gráfico encerrar
-        queue.put(None)  # Envia sinal para encerrar o processo do gráfico
-        plot_process.join()  # Aguarda o término do processo do gráfico
-
-client = initialize_client(API_KEY, API_SECRET)
-conn, c = initialize_database()
-
-## VALIDAÇÃO DE MARGEM DE ORDEM
-maker_fee, taker_fee = get_trading_fees()
-total_fees = maker_fee + taker_fee
-
-
-if ORDER_MARGIN <= total_fees:
-    logger.warning(f"ORDER_MARGIN ({ORDER_MARGIN * 100:.2f}%) é menor ou igual às taxas totais ({total_fees * 100:.4f}%). Ajustando para garantir lucro.")
-    ORDER_MARGIN = total_fees + 0.01  # Adiciona 1% acima das taxas para garantir lucro
-    logger.info(f"ORDER_MARGIN ajustado para: {ORDER_MARGIN * 100:.2f}%")
-
-if __name__ == "__main__":
-    try:
-        main()
-    except Exception as e:
-        logger.error(f"Erro inesperado: {e}")
-        input("Pressione qualquer tecla para sair...")  # Mantém a janela aberta para ver o erro
+from __future__ import annotations  # Anotações com pd.DataFrame não importam o pandas
+import time
+_IMPORT_STARTED = time.perf_counter()  # Início do import, para medir o tempo de inicialização
+import requests
+import json
+import copy
+import logging
+import logging.handlers
+import atexit
+import os
+import sys
+import asyncio
+import argparse
+import heapq
+import bisect
+import itertools
+import random
+import sqlite3
+import shutil
+import threading
+import math
+import hmac
+import signal
+import mmap
+import platform
+import tempfile
+import uuid
+from collections import deque, Counter
+from contextlib import contextmanager, nullcontext
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from queue import SimpleQueue, Empty
+from typing import Dict, Any, Tuple, TYPE_CHECKING
+import numpy as np
+from multiprocessing import Process, Queue, Event, Pool, shared_memory
+if TYPE_CHECKING:  # pandas e python-binance são importados só nas funções que os usam
+    import pandas as pd
+    from binance.exceptions import BinanceAPIException
+
+###################### HANDLERS ######################
+
+## CARREGA JSON
+def load_config(filepath: str) -> Dict[str, Any]:
+    try:
+        with open(filepath, "r") as file:
+            config = json.load(file)
+    except FileNotFoundError:
+        logger.error("Arquivo de configuração '%s' não encontrado.", filepath)
+        raise
+    except json.JSONDecodeError:
+        logger.error("Erro ao decodificar o arquivo de configuração '%s'.", filepath)
+        raise
+    return config
+## CONFIGURAÇÕES DE LOG
+logger = logging.getLogger()
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_DATEFMT = '%Y-%m-%d %H:%M:%S'
+## FORMATADOR JSON LINES (UM OBJETO POR LINHA)
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+## HANDLER DE FILA QUE NÃO FORMATA NA THREAD DE QUEM LOGA
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """O QueueHandler padrão formata o registro inteiro antes de enfileirar; aqui só a mensagem é
+    interpolada (congelando argumentos mutáveis, como os dicts das ordens, no valor do momento do
+    log) e o Formatter (data, JSON, traceback) roda na thread do QueueListener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+## CONFIGURA OS HANDLERS DE ARQUIVO (COM ROTAÇÃO) E TERMINAL
+def setup_logging(config: Dict[str, Any]):
+    """Com LOG_ASYNC, o logger só enfileira os registros e um QueueListener escreve no disco e
+    no terminal, então a latência das decisões não depende da velocidade de I/O."""
+    log_folder = 'logs'
+    if not os.path.exists(log_folder):
+        os.makedirs(log_folder)
+    level = logging.getLevelName(str(config.get("LOG_LEVEL", "INFO")).upper())
+    logger.setLevel(level if isinstance(level, int) else logging.INFO)
+    log_path = os.path.join(log_folder, 'trading_bot.log')
+    backup_count = int(config.get("LOG_BACKUP_COUNT", "5"))
+    ## HANDLER PARA O ARQUIVO DE LOG (ROTAÇÃO POR HORÁRIO SE LOG_ROTATE_WHEN, SENÃO POR TAMANHO)
+    if config.get("LOG_ROTATE_WHEN"):
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            log_path, when=config["LOG_ROTATE_WHEN"], backupCount=backup_count, encoding='utf-8')
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=int(config.get("LOG_MAX_BYTES", "10485760")), backupCount=backup_count, encoding='utf-8')
+    ## HANDLER PARA O TERMINAL
+    stream_handler = logging.StreamHandler()
+    ## FORMATADOR PARA OS HANDLERS (O ARQUIVO PODE SER JSON LINES)
+    formatter = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATEFMT)
+    file_handler.setFormatter(JsonFormatter(datefmt=LOG_DATEFMT) if config.get("LOG_JSON", False) else formatter)
+    stream_handler.setFormatter(formatter)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    if not config.get("LOG_ASYNC", False):
+        logger.addHandler(file_handler)
+        logger.addHandler(stream_handler)
+        return None
+    log_queue = SimpleQueue()
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)  # Esvazia a fila ao encerrar
+    return listener
+
+## CONFIGURAÇÕES
+FIBONACCI_LEVELS = [0.236, 0.382, 0.5, 0.618, 0.764]  # Níveis de Fibonacci
+def load_settings(cfg: Dict[str, Any]):
+    """Aplica o config.json às configurações do módulo (sem rede nem banco)."""
+    global config, FIBONACCI_LEVELS, API_KEY, API_SECRET, INTERVAL, LOOKBACK, SYMBOL, BUY_MIN, BUY_PRICE, ORDER_MARGIN, \
+        FIBONACCI_TOLERANCE, PERCENTAGE_TO_USE, BALANCE_SAFE, TIME_CHECK, \
+        SIMULATION_MODE, SIMULATION_BALANCE, SIMULATION_PRICE, TRADE_CRITERIA, STREAM_MODE, \
+        STREAM_SOURCE, STREAM_REPLAY_SPEED, STREAM_REPLAY_WARMUP, FEE_CACHE_TTL, \
+        REQUEST_WEIGHT_LIMIT, API_MAX_RETRIES, API_BACKOFF_BASE, API_BASE_URL, METRICS_PORT, \
+        METRICS_HOST, PROFILER_INTERVAL, BACKTEST_BALANCE, BACKTEST_WINDOW, BACKTEST_MAKER_FEE, \
+        BACKTEST_TAKER_FEE, STARTUP_TIME_BUDGET, CANDLE_ARCHIVE_DIR, EXECUTION_MODE, EXECUTION_MAX_SLIPPAGE, \
+        EXECUTION_LIMIT_TIMEOUT, EXECUTION_BOOK_DEPTH, EXECUTION_BOOK_MAX_AGE, CONTROL_PORT, CONTROL_HOST, \
+        CONTROL_TOKEN, CONTROL_HOTKEY, RISK_MAX_EXPOSURE, RISK_MAX_DAILY_LOSS, RISK_MAX_ORDERS_PER_MINUTE
+    config = cfg
+    API_KEY = config.get("API_KEY", "")
+    API_SECRET = config.get("API_SECRET", "")
+    INTERVAL = config.get("INTERVAL", "")
+    LOOKBACK = config.get("LOOKBACK", "")
+    SYMBOL = config.get("SYMBOL")
+    BUY_MIN = float(config["BUY_MIN"])
+    BUY_PRICE = float(config["BUY_PRICE"])
+    ORDER_MARGIN = float(config["ORDER_MARGIN"]) / 100
+    FIBONACCI_TOLERANCE = float(config["FIBONACCI_TOLERANCE"]) / 100
+    PERCENTAGE_TO_USE = float(config["PERCENTAGE_TO_USE"]) / 100
+    BALANCE_SAFE = float(config["BALANCE_SAFE"])
+    TIME_CHECK = int(config["TIME_CHECK"])
+    FIBONACCI_LEVELS = [float(level) for level in config.get("FIBONACCI_LEVELS", FIBONACCI_LEVELS)]
+    SIMULATION_MODE = config.get("SIMULATION_MODE", False)  # Modo de simulação
+    SIMULATION_BALANCE = float(config["SIMULATION_BALANCE"])
+    SIMULATION_PRICE = float(config["SIMULATION_PRICE"])
+    TRADE_CRITERIA = config.get("TRADE_CRITERIA", "fibonacci")  # Critério de trade: "fibonacci" ou "support_resistance"
+    STREAM_MODE = config.get("STREAM_MODE", False)  # Dados de mercado por push (WebSocket) em vez de polling
+    STREAM_SOURCE = config.get("STREAM_SOURCE", "binance")  # "binance" ou "replay" (candles do candles.db)
+    STREAM_REPLAY_SPEED = float(config.get("STREAM_REPLAY_SPEED", "0"))  # Candles por segundo no replay (0 = sem espera)
+    STREAM_REPLAY_WARMUP = int(config.get("STREAM_REPLAY_WARMUP", "200"))  # Candles usados como janela inicial do replay
+    FEE_CACHE_TTL = float(config.get("FEE_CACHE_TTL", "3600"))  # Segundos até renovar as taxas de negociação
+    REQUEST_WEIGHT_LIMIT = int(config.get("REQUEST_WEIGHT_LIMIT", "1200"))  # Peso de requisições por minuto compartilhado entre os pares
+    API_MAX_RETRIES = int(config.get("API_MAX_RETRIES", "5"))  # Tentativas extras em 429/418 e erros transitórios
+    API_BACKOFF_BASE = float(config.get("API_BACKOFF_BASE", "0.5"))  # Base em segundos do backoff exponencial
+    API_BASE_URL = config.get("API_BASE_URL", "")  # URL alternativa da API REST (ex.: exchange falsa local)
+    METRICS_PORT = int(config.get("METRICS_PORT", "0"))  # Porta do endpoint /metrics (0 = desativado)
+    METRICS_HOST = config.get("METRICS_HOST", "127.0.0.1")
+    PROFILER_INTERVAL = float(config.get("PROFILER_INTERVAL", "0"))  # Segundos entre amostras do profiler (0 = desativado)
+    BACKTEST_BALANCE = float(config.get("BACKTEST_BALANCE", "1000"))  # Saldo inicial do backtest
+    BACKTEST_WINDOW = int(config.get("BACKTEST_WINDOW", "1440"))  # Candles usados para suporte/resistência no backtest
+    BACKTEST_MAKER_FEE = float(config.get("BACKTEST_MAKER_FEE", "0.1")) / 100
+    BACKTEST_TAKER_FEE = float(config.get("BACKTEST_TAKER_FEE", "0.1")) / 100
+    STARTUP_TIME_BUDGET = float(config.get("STARTUP_TIME_BUDGET", "3"))  # Segundos do import até o bot estar pronto
+    CANDLE_ARCHIVE_DIR = config.get("CANDLE_ARCHIVE_DIR", "candles")  # Pasta do arquivo colunar de candles (.npy)
+    EXECUTION_MODE = config.get("EXECUTION_MODE", "market")  # "market", "limit" (LIMIT_MAKER) ou "auto" (pelo slippage)
+    EXECUTION_MAX_SLIPPAGE = float(config.get("EXECUTION_MAX_SLIPPAGE", "0.05")) / 100  # Custo extra aceito a mercado no modo auto
+    EXECUTION_LIMIT_TIMEOUT = float(config.get("EXECUTION_LIMIT_TIMEOUT", "10"))  # Segundos até cancelar uma ordem maker
+    EXECUTION_BOOK_DEPTH = int(config.get("EXECUTION_BOOK_DEPTH", "100"))  # Níveis do snapshot do livro de ofertas
+    EXECUTION_BOOK_MAX_AGE = float(config.get("EXECUTION_BOOK_MAX_AGE", "2"))  # Segundos até renovar o snapshot (sem stream)
+    CONTROL_PORT = int(config.get("CONTROL_PORT", "0"))  # Porta da API local de controle (0 = desativada)
+    CONTROL_HOST = config.get("CONTROL_HOST", "127.0.0.1")
+    CONTROL_TOKEN = config.get("CONTROL_TOKEN", "")  # Exigido no cabeçalho X-Control-Token (vazio = sem token)
+    CONTROL_HOTKEY = config.get("CONTROL_HOTKEY", True)  # Tecla ESC pausa/retoma (módulo keyboard)
+    RISK_MAX_EXPOSURE = float(config.get("RISK_MAX_EXPOSURE", "0"))  # Valor máximo em posições abertas, todos os pares (0 = sem limite)
+    RISK_MAX_DAILY_LOSS = float(config.get("RISK_MAX_DAILY_LOSS", "0"))  # Prejuízo realizado no dia que suspende as compras (0 = sem limite)
+    RISK_MAX_ORDERS_PER_MINUTE = int(config.get("RISK_MAX_ORDERS_PER_MINUTE", "0"))  # Compras por minuto, todos os pares (0 = sem limite)
+
+## VALIDAÇÃO DE DADOS
+def validate_settings():
+    if not API_KEY or not API_SECRET:
+        logger.error("Chaves de API não fornecidas.")
+        raise ValueError("Chaves de API não fornecidas.")
+    if not SYMBOL or PERCENTAGE_TO_USE <= 0:
+        logger.error("Configuração inválida detectada.")
+        raise ValueError("Configuração inválida detectada.")
+    if STREAM_MODE and len(config.get("SYMBOLS") or []) > 1:
+        # O escalonador de vários pares só funciona por polling; o stream acompanha um único símbolo
+        logger.error("STREAM_MODE não é suportado com mais de um par em SYMBOLS; desative um dos dois.")
+        raise ValueError("STREAM_MODE não é suportado com mais de um par em SYMBOLS.")
+
+
+
+
+
+
+
+
+###################### INSTRUMENTAÇÃO ######################
+
+
+## LIMITES DOS BUCKETS DOS HISTOGRAMAS DE LATÊNCIA (SEGUNDOS)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+## HISTOGRAMA NO FORMATO DO PROMETHEUS
+class Histogram:
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # O último é o bucket +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+## REGISTRO DE MÉTRICAS EM MEMÓRIA
+class Metrics:
+    """Contadores, gauges e histogramas com labels, exportados em texto do Prometheus.
+
+    Os coletores registrados com add_collector() são chamados a cada leitura e servem para
+    gauges calculados sob demanda (ordens abertas, lucro realizado)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[tuple, float] = {}
+        self.gauges: Dict[tuple, float] = {}
+        self.histograms: Dict[tuple, Histogram] = {}
+        self.collectors = []
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            try:
+                collector(self)
+            except Exception as e:
+                logger.error("Erro no coletor de métricas: %s", e)
+        lines = []
+        with self.lock:
+            for kind, values in (('counter', self.counters), ('gauge', self.gauges)):
+                declared = set()
+                for (name, labels), value in sorted(values.items()):
+                    if name not in declared:
+                        lines.append(f"# TYPE {name} {kind}")
+                        declared.add(name)
+                    lines.append(f"{name}{_format_labels(labels)} {value!r}")
+            declared = set()
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                if name not in declared:
+                    lines.append(f"# TYPE {name} histogram")
+                    declared.add(name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum!r}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+## FORMATA OS LABELS DE UMA SÉRIE ({a="1",b="2"})
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+metrics = Metrics()
+STAGE_METRIC = 'tradingbot_trade_stage_seconds'  # Latência de cada etapa de trade(), label stage
+## PROFILER POR AMOSTRAGEM DAS PILHAS DE TODAS AS THREADS
+class SamplingProfiler:
+    """Amostra sys._current_frames() a cada `interval` segundos e conta as pilhas no formato
+    "folded" (arquivo:função;arquivo:função N), aceito por flamegraph.pl e speedscope."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = Counter()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+## ENDPOINT HTTP LOCAL: /metrics (PROMETHEUS) E /profile (PILHAS DO PROFILER)
+class MetricsHandler(BaseHTTPRequestHandler):
+    profiler: SamplingProfiler = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] == '/metrics':
+            body = metrics.render()
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path.split('?')[0] == '/profile' and self.profiler is not None:
+            body = self.profiler.folded()
+            content_type = 'text/plain; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # Não polui o log do bot com cada leitura do Prometheus
+## INICIA O ENDPOINT DE MÉTRICAS NUMA THREAD DAEMON
+def start_metrics_server(host: str, port: int, profiler: SamplingProfiler = None) -> ThreadingHTTPServer:
+    handler = type('BoundMetricsHandler', (MetricsHandler,), {'profiler': profiler})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Métricas disponíveis em http://%s:%s/metrics", host, server.server_port)
+    return server
+
+
+###################### CONECCTIONS ######################
+
+
+## INICIALIZA O CLIENTE BINANCE
+def initialize_client(api_key, api_secret):
+    from binance.client import Client
+    # Sem ping no construtor: a primeira chamada real já revela falhas de conexão
+    raw_client = Client(api_key, api_secret, ping=False)
+    if API_BASE_URL:
+        # Exchange local (ex.: servidor falso para testes)
+        raw_client.API_URL = API_BASE_URL.rstrip('/') + '/api'
+    return RateLimitedClient(raw_client, REQUEST_WEIGHT_LIMIT, API_MAX_RETRIES, API_BACKOFF_BASE)
+## ORÇAMENTO COMPARTILHADO DE PESO DE REQUISIÇÕES (TOKEN BUCKET)
+class RequestBudget:
+    """Peso de requisições por minuto compartilhado por todas as chamadas à API."""
+
+    def __init__(self, weight_per_minute: int):
+        self.capacity = float(weight_per_minute)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self, weight: float) -> float:
+        """Consome o peso e retorna 0, ou retorna quantos segundos faltam para haver saldo."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= weight:
+                self.tokens -= weight
+                return 0.0
+            return (weight - self.tokens) / self.rate
+
+    def acquire(self, weight: float):
+        while True:
+            wait = self.try_acquire(weight)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def sync(self, used_weight: int):
+        """Ajusta o saldo pelo peso já usado informado pela Binance (X-MBX-USED-WEIGHT-1M)."""
+        with self.lock:
+            self.tokens = max(0.0, self.capacity - used_weight)
+            self.updated = time.monotonic()
+## PESO DE UMA REQUISIÇÃO /api/v3/klines
+KLINES_REQUEST_WEIGHT = 2
+## PESO DE get_historical_klines: A BIBLIOTECA PAGINA INTERNAMENTE, UMA REQUISIÇÃO A CADA `limit` CANDLES
+def historical_klines_weight(symbol, interval, start_str=None, end_str=None, limit=1000, **params) -> int:
+    """Estimado pelo período pedido: uma página por `limit` candles (a última volta incompleta) e,
+    com data inicial, a consulta do primeiro candle disponível feita pela biblioteca."""
+    from binance.helpers import convert_ts_str, interval_to_milliseconds
+    try:
+        start = convert_ts_str(start_str)
+        end = convert_ts_str(end_str) or int(time.time() * 1000)
+        step = interval_to_milliseconds(interval)
+    except (ValueError, TypeError):
+        return KLINES_REQUEST_WEIGHT
+    if start is None or not step:
+        return KLINES_REQUEST_WEIGHT
+    candles = max(0, end - start) // step + 1
+    return KLINES_REQUEST_WEIGHT * (candles // (limit or 1000) + 2)
+## PESO DE CADA ENDPOINT NA API SPOT (DESCONTADO ANTES DA CHAMADA); FUNÇÕES RECEBEM OS ARGUMENTOS DA CHAMADA
+ENDPOINT_WEIGHTS = {
+    'get_symbol_ticker': 2,
+    'get_klines': KLINES_REQUEST_WEIGHT,
+    'get_historical_klines': historical_klines_weight,
+    'get_order_book': 5,
+    'get_account': 20,
+    'get_asset_balance': 20,
+    'get_exchange_info': 20,
+    'get_symbol_info': 20,
+    'get_my_trades': 20,
+    'get_all_orders': 20,
+    'get_open_orders': 6,
+    'get_order': 4,
+}
+RETRY_STATUS_CODES = (429, 418)  # Limite excedido / IP banido: a requisição não foi processada
+TRANSIENT_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)  # Com o BinanceRequestException, em _request
+## CHAMADA EM ANDAMENTO COMPARTILHADA ENTRE LEITURAS IDÊNTICAS
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+## CLIENTE COM LIMITE DE PESO, RETRY COM BACKOFF E COALESCÊNCIA DE LEITURAS
+class RateLimitedClient:
+    """Envolve o Client da Binance (ou qualquer objeto com a mesma interface).
+
+    Antes de cada chamada desconta o peso do endpoint do RequestBudget e, depois dela, sincroniza
+    o saldo com o cabeçalho X-MBX-USED-WEIGHT-1M. Respostas 429/418 bloqueiam todas as chamadas
+    pelo Retry-After e são repetidas com backoff exponencial com jitter; erros transitórios só são
+    repetidos em leituras, nunca em ordens. Leituras get_* idênticas feitas ao mesmo tempo por
+    threads diferentes compartilham uma única requisição."""
+
+    def __init__(self, client, weight_per_minute: int = 1200, max_retries: int = 5,
+                 backoff_base: float = 0.5, backoff_max: float = 30.0):
+        self.client = client
+        self.budget = RequestBudget(weight_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.blocked_until = 0.0
+        self._inflight: Dict[tuple, _Flight] = {}
+        self._inflight_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+        return call
+
+    def call(self, name: str, *args, **kwargs):
+        if not name.startswith('get_'):
+            return self._request(name, args, kwargs, idempotent=False)
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return self._request(name, args, kwargs, idempotent=True)
+        return self._coalesce(key, lambda: self._request(name, args, kwargs, idempotent=True))
+
+    def _coalesce(self, key: tuple, fetch):
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fetch()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+            flight.done.set()
+        return flight.result
+
+    def _request(self, name: str, args: tuple, kwargs: dict, idempotent: bool):
+        from binance.exceptions import BinanceAPIException, BinanceRequestException
+        method = getattr(self.client, name)
+        weight = ENDPOINT_WEIGHTS.get(name, 1)
+        if callable(weight):
+            weight = weight(*args, **kwargs)
+        attempt = 0
+        while True:
+            blocked = self.blocked_until - time.monotonic()
+            if blocked > 0:
+                time.sleep(blocked)
+            # Um peso acima da capacidade nunca caberia no balde; a biblioteca já espaça as páginas (1s a cada 3)
+            self.budget.acquire(min(weight, self.budget.capacity))
+            metrics.inc('tradingbot_api_requests_total', endpoint=name)
+            metrics.inc('tradingbot_api_weight_total', weight)
+            try:
+                result = method(*args, **kwargs)
+                self._sync_used_weight()
+                return result
+            except BinanceAPIException as e:
+                self._sync_used_weight()
+                if e.status_code in RETRY_STATUS_CODES:
+                    retry_after = self._retry_after(e)
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+                    logger.warning("Limite da API atingido em %s (HTTP %s). Aguardando %.1fs.", name, e.status_code, retry_after)
+                elif not (idempotent and e.status_code >= 500):
+                    raise
+                error = e
+            except (BinanceRequestException,) + TRANSIENT_ERRORS as e:
+                if not idempotent:
+                    raise
+                error = e
+            attempt += 1
+            if attempt > self.max_retries:
+                raise error
+            metrics.inc('tradingbot_api_retries_total', endpoint=name)
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            logger.warning("Falha em %s: %s. Nova tentativa %s/%s em %.2fs.", name, error, attempt, self.max_retries, delay)
+            time.sleep(delay)
+
+    def _sync_used_weight(self):
+        response = getattr(self.client, 'response', None)
+        used = response.headers.get('x-mbx-used-weight-1m') if response is not None else None
+        if used is not None:
+            self.budget.sync(int(used))
+            metrics.set('tradingbot_api_used_weight_1m', int(used))
+
+    def _retry_after(self, e: BinanceAPIException) -> float:
+        headers = getattr(getattr(e, 'response', None), 'headers', None) or {}
+        retry_after = headers.get('Retry-After') or headers.get('retry-after')
+        if retry_after is not None:
+            return float(retry_after)
+        return 60.0 if e.status_code == 418 else self.backoff_base
+## ESQUEMA DA TABELA DE ORDENS
+ORDERS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date_buy TEXT,
+        quantity REAL,
+        buy_price REAL,
+        target_price REAL,
+        sell_price REAL,
+        value_purchased REAL,
+        value_end REAL,
+        profit REAL,
+        date_sell TEXT,
+        status TEXT
+    )
+'''
+## MIGRAÇÕES DO orders.db (A POSIÇÃO NA LISTA É A VERSÃO EM PRAGMA user_version)
+ORDERS_MIGRATIONS = [
+    [ORDERS_TABLE_SQL],
+    [
+        "CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_open_target ON orders (target_price) WHERE status = 'open'",
+    ],
+    [
+        "ALTER TABLE orders ADD COLUMN symbol TEXT",
+        "UPDATE orders SET symbol = :default_symbol WHERE symbol IS NULL",
+        "CREATE INDEX IF NOT EXISTS idx_orders_symbol_status ON orders (symbol, status)",
+    ],
+    [
+        # Diário de intenções: gravado antes de cada ordem enviada à exchange
+        '''
+            CREATE TABLE IF NOT EXISTS order_intents (
+                client_order_id TEXT PRIMARY KEY,
+                side TEXT,
+                symbol TEXT,
+                quantity REAL,
+                price REAL,
+                target_price REAL,
+                order_ids TEXT,
+                status TEXT,
+                created_at INTEGER
+            )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_intents_pending ON order_intents (symbol, created_at) WHERE status = 'pending'",
+        # Até quando (ms) o histórico da exchange já foi conferido com o orders.db, por símbolo
+        "CREATE TABLE IF NOT EXISTS sync_checkpoints (symbol TEXT PRIMARY KEY, synced_until INTEGER)",
+        "ALTER TABLE orders ADD COLUMN client_order_id TEXT",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_client_order_id ON orders (client_order_id) WHERE client_order_id IS NOT NULL",
+    ],
+    [
+        # Agregados materializados: atualizados na mesma transação de cada compra e fechamento
+        '''
+            CREATE TABLE IF NOT EXISTS pnl_daily (
+                day TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                buys INTEGER NOT NULL DEFAULT 0,
+                buy_value REAL NOT NULL DEFAULT 0,
+                sells INTEGER NOT NULL DEFAULT 0,
+                sell_value REAL NOT NULL DEFAULT 0,
+                realized_pnl REAL NOT NULL DEFAULT 0,
+                wins INTEGER NOT NULL DEFAULT 0,
+                losses INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, symbol)
+            ) WITHOUT ROWID
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS pnl_symbol (
+                symbol TEXT PRIMARY KEY,
+                open_orders INTEGER NOT NULL DEFAULT 0,
+                open_quantity REAL NOT NULL DEFAULT 0,
+                open_cost REAL NOT NULL DEFAULT 0,
+                closed_orders INTEGER NOT NULL DEFAULT 0,
+                realized_pnl REAL NOT NULL DEFAULT 0,
+                wins INTEGER NOT NULL DEFAULT 0,
+                losses INTEGER NOT NULL DEFAULT 0,
+                peak_pnl REAL NOT NULL DEFAULT 0,
+                max_drawdown REAL NOT NULL DEFAULT 0
+            )
+        ''',
+        # Carga inicial a partir das ordens já existentes (única varredura completa da tabela orders)
+        '''
+            INSERT INTO pnl_daily (day, symbol, buys, buy_value)
+            SELECT substr(date_buy, 1, 10), symbol, COUNT(*), COALESCE(SUM(value_purchased), 0)
+            FROM orders WHERE date_buy IS NOT NULL GROUP BY 1, 2
+        ''',
+        '''
+            INSERT INTO pnl_daily (day, symbol, sells, sell_value, realized_pnl, wins, losses)
+            SELECT substr(date_sell, 1, 10), symbol, COUNT(*), COALESCE(SUM(value_end), 0), COALESCE(SUM(profit), 0),
+                   SUM(profit > 0), SUM(profit <= 0)
+            FROM orders WHERE status = 'closed' AND date_sell IS NOT NULL GROUP BY 1, 2
+            ON CONFLICT (day, symbol) DO UPDATE SET sells = excluded.sells, sell_value = excluded.sell_value,
+                realized_pnl = excluded.realized_pnl, wins = excluded.wins, losses = excluded.losses
+        ''',
+        '''
+            INSERT INTO pnl_symbol (symbol, open_orders, open_quantity, open_cost, closed_orders, realized_pnl, wins, losses)
+            SELECT symbol, SUM(status = 'open'),
+                   COALESCE(SUM(CASE WHEN status = 'open' THEN quantity END), 0),
+                   COALESCE(SUM(CASE WHEN status = 'open' THEN value_purchased END), 0),
+                   SUM(status = 'closed'), COALESCE(SUM(CASE WHEN status = 'closed' THEN profit END), 0),
+                   SUM(status = 'closed' AND profit > 0), SUM(status = 'closed' AND profit <= 0)
+            FROM orders WHERE symbol IS NOT NULL GROUP BY symbol
+        ''',
+        # Pico e drawdown máximo do lucro realizado acumulado, na ordem dos fechamentos
+        '''
+            UPDATE pnl_symbol SET peak_pnl = curve.peak, max_drawdown = curve.drawdown
+            FROM (
+                SELECT symbol, MAX(peak) AS peak, MAX(peak - cumulative) AS drawdown FROM (
+                    SELECT symbol, cumulative, MAX(MAX(cumulative, 0)) OVER (PARTITION BY symbol ORDER BY date_sell, id) AS peak
+                    FROM (
+                        SELECT symbol, id, date_sell,
+                               SUM(profit) OVER (PARTITION BY symbol ORDER BY date_sell, id) AS cumulative
+                        FROM orders WHERE status = 'closed'
+                    )
+                ) GROUP BY symbol
+            ) AS curve
+            WHERE pnl_symbol.symbol = curve.symbol
+        ''',
+    ],
+]
+## INICIALIZA O BANCO DE DADOS SQLITE
+def initialize_database(db_path: str = 'orders.db'):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute(ORDERS_TABLE_SQL)
+    conn.commit()
+    return conn, c
+## ÍNDICE EM MEMÓRIA DAS ORDENS ABERTAS ORDENADO PELO PREÇO ALVO
+class OpenOrderIndex:
+    """Listas paralelas mantidas ordenadas com bisect: a busca das ordens vendáveis
+    é uma consulta de intervalo (target_price <= preço) em O(log n + k)."""
+
+    def __init__(self, rows: list = ()):
+        rows = sorted(rows, key=lambda row: row[4])
+        self.targets = [row[4] for row in rows]
+        self.rows = list(rows)
+        self.ids = {row[0]: row[4] for row in rows}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, row: tuple):
+        position = bisect.bisect_right(self.targets, row[4])
+        self.targets.insert(position, row[4])
+        self.rows.insert(position, row)
+        self.ids[row[0]] = row[4]
+
+    def remove(self, order_id: int):
+        target_price = self.ids.pop(order_id, None)
+        if target_price is None:
+            return
+        position = bisect.bisect_left(self.targets, target_price)
+        while self.rows[position][0] != order_id:  # Ordens com o mesmo preço alvo
+            position += 1
+        del self.targets[position]
+        del self.rows[position]
+
+    def sellable(self, current_price: float) -> list:
+        return self.rows[:bisect.bisect_right(self.targets, current_price)]
+## REPOSITÓRIO DE ORDENS (CONEXÃO ÚNICA E PERSISTENTE)
+class OrderRepository:
+    """Dono da única conexão com o orders.db (modo WAL), aplica as migrações pendentes
+    e agrupa as atualizações de ordens em executemany. As ordens abertas são carregadas
+    uma vez num OpenOrderIndex por símbolo, atualizado a cada inserção e fechamento.
+    `default_symbol` é atribuído às ordens antigas, gravadas antes da coluna symbol.
+
+    Cada ordem real passa antes pelo diário order_intents (begin_intent); a intenção só é
+    concluída na mesma transação que grava a compra ou fecha as ordens vendidas, então uma
+    intenção pendente na inicialização indica uma ordem cujo resultado precisa ser conferido
+    na exchange (ver reconcile_orders).
+
+    Os `listeners` (ex.: RiskEngine) são chamados a cada compra gravada e a cada ordem aberta
+    fechada, com (lado, símbolo, quantidade, custo, lucro realizado, data). Eles, as posições, o
+    lucro realizado e os índices das ordens abertas só mudam depois do commit (ver _transaction)."""
+
+    def __init__(self, db_path: str = 'orders.db', default_symbol: str = None):
+        self.db_path = db_path
+        self.default_symbol = default_symbol
+        self.listeners = []
+        self._effects = None  # Mudanças em memória da transação em andamento, aplicadas após o commit
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256)
+        self.lock = threading.RLock()
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')  # Seguro com WAL e evita fsync a cada commit
+        self.migrate()
+        rows_by_symbol = {}
+        for row in self.open_orders():
+            rows_by_symbol.setdefault(row[11], []).append(row)
+        self.open_indexes = {symbol: OpenOrderIndex(rows) for symbol, rows in rows_by_symbol.items()}
+        # Lucro realizado e posição aberta (quantidade, custo) por símbolo, espelhando a tabela pnl_symbol
+        self.realized_pnl: Dict[str, float] = {}
+        self.open_positions: Dict[str, list] = {}
+        for symbol, realized, quantity, cost in self.conn.execute(
+                'SELECT symbol, realized_pnl, open_quantity, open_cost FROM pnl_symbol').fetchall():
+            self.realized_pnl[symbol] = realized
+            self.open_positions[symbol] = [quantity, cost]
+
+    def migrate(self):
+        with self.lock:
+            version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+            for number, statements in enumerate(ORDERS_MIGRATIONS[version:], start=version + 1):
+                with self.conn:
+                    for statement in statements:
+                        if ':default_symbol' in statement:
+                            self.conn.execute(statement, {'default_symbol': self.default_symbol})
+                        else:
+                            self.conn.execute(statement)
+                    self.conn.execute(f'PRAGMA user_version = {number}')
+                logger.info("Migração %s aplicada em %s.", number, self.db_path)
+
+    @contextmanager
+    def _transaction(self):
+        """Transação do orders.db em que _insert_row e _close_rows só acumulam as mudanças em memória.
+
+        Elas são aplicadas (e os listeners avisados) depois do commit; se um comando ou o próprio
+        commit falhar, o rollback deixa o banco como estava e a memória também."""
+        with self.lock:
+            self._effects = []
+            try:
+                with self.conn:
+                    yield
+                effects = self._effects
+            finally:
+                self._effects = None
+            for apply, args in effects:
+                apply(*args)
+
+    def insert(self, date_buy: str, quantity: float, buy_price: float, target_price: float, symbol: str,
+               client_order_id: str = None) -> int:
+        with self._transaction():
+            order_id = self._insert_row(date_buy, quantity, buy_price, target_price, symbol, client_order_id)
+            if client_order_id is not None:
+                self._finish_intents([client_order_id], 'done')
+        return order_id
+
+    def _insert_row(self, date_buy: str, quantity: float, buy_price: float, target_price: float, symbol: str,
+                    client_order_id: str = None) -> int:
+        cursor = self.conn.execute('''
+            INSERT INTO orders (date_buy, quantity, buy_price, target_price, sell_price, value_purchased, value_end, profit, date_sell, status, symbol, client_order_id)
+            VALUES (?, ?, ?, ?, NULL, ?, NULL, NULL, NULL, 'open', ?, ?)
+        ''', (date_buy, quantity, buy_price, target_price, quantity * buy_price, symbol, client_order_id))
+        order_id = cursor.lastrowid
+        self.conn.execute('''
+            INSERT INTO pnl_daily (day, symbol, buys, buy_value) VALUES (?, ?, 1, ?)
+            ON CONFLICT (day, symbol) DO UPDATE SET buys = buys + 1, buy_value = buy_value + excluded.buy_value
+        ''', (date_buy[:10], symbol, quantity * buy_price))
+        self.conn.execute('''
+            INSERT INTO pnl_symbol (symbol, open_orders, open_quantity, open_cost) VALUES (?, 1, ?, ?)
+            ON CONFLICT (symbol) DO UPDATE SET open_orders = open_orders + 1,
+                open_quantity = open_quantity + excluded.open_quantity, open_cost = open_cost + excluded.open_cost
+        ''', (symbol, quantity, quantity * buy_price))
+        self._effects.append((self._apply_buy, ((order_id, date_buy, quantity, buy_price, target_price, None,
+                                                 quantity * buy_price, None, None, None, 'open', symbol,
+                                                 client_order_id), True)))
+        return order_id
+
+    def _apply_buy(self, row: tuple, notify: bool):
+        """Ordem aberta gravada: entra no índice e, se for uma compra (notify), na posição e nos listeners."""
+        symbol, quantity, cost = row[11], row[2], row[6]
+        if symbol not in self.open_indexes:
+            self.open_indexes[symbol] = OpenOrderIndex()
+        self.open_indexes[symbol].add(row)
+        if notify:
+            position = self.open_positions.setdefault(symbol, [0.0, 0.0])
+            position[0] += quantity
+            position[1] += cost
+            for listener in self.listeners:
+                listener('BUY', symbol, quantity, cost, 0.0, row[1])
+
+    def _apply_close(self, order_id: int, symbol: str, quantity: float, cost: float, profit: float, realized: bool,
+                     date_sell: str):
+        """Ordem fechada: sai do índice, reduz a posição e soma o lucro realizado."""
+        index = self.open_indexes.get(symbol)
+        if index is not None:
+            index.remove(order_id)
+        position = self.open_positions.setdefault(symbol, [0.0, 0.0])
+        position[0] -= quantity
+        position[1] -= cost
+        if realized:
+            self.realized_pnl[symbol] = self.realized_pnl.get(symbol, 0.0) + profit
+        for listener in self.listeners:
+            listener('SELL', symbol, quantity, cost, profit if realized else 0.0, date_sell)
+
+    def open_orders(self, symbol: str = None) -> list:
+        with self.lock:
+            if symbol is None:
+                return self.conn.execute(
+                    "SELECT * FROM orders INDEXED BY idx_orders_open_target WHERE status = 'open' ORDER BY target_price"
+                ).fetchall()
+            return self.conn.execute(
+                "SELECT * FROM orders INDEXED BY idx_orders_open_target "
+                "WHERE status = 'open' AND symbol = ? ORDER BY target_price", (symbol,)).fetchall()
+
+    def realized_on(self, day: str) -> float:
+        """Lucro realizado de todos os símbolos no dia (AAAA-MM-DD), pelo agregado pnl_daily."""
+        with self.lock:
+            return self.conn.execute('SELECT COALESCE(SUM(realized_pnl), 0) FROM pnl_daily WHERE day = ?',
+                                     (day,)).fetchone()[0]
+
+    def sellable_orders(self, current_price: float, symbol: str) -> list:
+        """Ordens abertas do símbolo com preço alvo atingido, sem consultar o banco."""
+        with self.lock:
+            index = self.open_indexes.get(symbol)
+            return index.sellable(current_price) if index is not None else []
+
+    def close_orders(self, order_ids: list, status: str, sell_price: float, date_sell: str,
+                     client_order_ids: list = (), sell_prices: Dict[int, float] = None,
+                     fills: Dict[int, Tuple[float, float]] = None) -> list:
+        """Fecha as ordens numa única transação. Retorna [(id, preço de venda, valor final, lucro)].
+
+        `sell_prices` (id -> preço executado) tem precedência sobre `sell_price` e `fills` limita o
+        fechamento ao que foi executado (ver _close_rows). Ordens que já não estão abertas são
+        ignoradas, então fechar duas vezes não altera a ordem nem os agregados."""
+        if not order_ids:
+            return []
+        with self._transaction():
+            closed = self._close_rows(order_ids, status, sell_price, date_sell, sell_prices, fills)
+            self._finish_intents(client_order_ids, 'done')
+        return closed
+
+    def _close_rows(self, order_ids: list, status: str, sell_price: float, date_sell: str,
+                    sell_prices: Dict[int, float] = None, fills: Dict[int, Tuple[float, float]] = None) -> list:
+        """`fills` (id -> (quantidade executada, quantidade que continua aberta)) vem das vendas reais.
+
+        Só a parte vendida é fechada: o restante vira uma nova ordem aberta com o mesmo preço de
+        compra e alvo, e o valor final usa a quantidade executada (a sobra abaixo do stepSize,
+        que fica na conta sem poder ser vendida, entra como custo da parte fechada)."""
+        updates = []
+        aggregates = []  # (ordens abertas, quantidade, custo, fechadas, lucro, ganhos, perdas, símbolo)
+        daily = []
+        remainders = []
+        placeholders = ','.join('?' * len(order_ids))
+        rows = self.conn.execute(
+            f"SELECT id, quantity, value_purchased, symbol, date_buy, buy_price, target_price FROM orders "
+            f"WHERE id IN ({placeholders}) AND status = 'open'", list(order_ids)).fetchall()
+        for order_id, quantity, value_purchased, symbol, date_buy, buy_price, target_price in rows:
+            price = sell_prices.get(order_id, sell_price) if sell_prices else sell_price
+            quantity, value_purchased = float(quantity or 0.0), float(value_purchased or 0.0)
+            executed, remaining = fills.get(order_id, (quantity, 0.0)) if fills else (quantity, 0.0)
+            remaining = min(max(remaining, 0.0), quantity)
+            if status == 'open' or remaining >= quantity:
+                continue  # Sem transição (ou nada vendido): os agregados e a ordem ficam como estão
+            closed_quantity = quantity - remaining
+            closed_cost = value_purchased * closed_quantity / quantity if quantity else value_purchased
+            value_end = price * executed
+            profit = value_end - closed_cost
+            updates.append((status, price, value_end, profit, date_sell, closed_quantity, closed_cost, order_id))
+            realized = status == 'closed'
+            aggregates.append((0 if remaining else 1, closed_quantity, closed_cost, int(realized),
+                               profit if realized else 0.0, int(realized and profit > 0),
+                               int(realized and profit <= 0), symbol))
+            if remaining:
+                remainders.append((date_buy, remaining, buy_price, target_price, value_purchased - closed_cost, symbol))
+            if realized:
+                daily.append((date_sell[:10], symbol, value_end, profit, int(profit > 0), int(profit <= 0)))
+            self._effects.append((self._apply_close, (order_id, symbol, closed_quantity, closed_cost, profit, realized,
+                                                      date_sell)))
+        self.conn.executemany('''
+            UPDATE orders
+            SET status = ?, sell_price = ?, value_end = ?, profit = ?, date_sell = ?, quantity = ?, value_purchased = ?
+            WHERE id = ?
+        ''', updates)
+        # Uma linha por ordem, na ordem dos fechamentos, para o pico e o drawdown do lucro acumulado
+        self.conn.executemany('''
+            UPDATE pnl_symbol SET open_orders = open_orders - ?1, open_quantity = open_quantity - ?2,
+                open_cost = open_cost - ?3, closed_orders = closed_orders + ?4, realized_pnl = realized_pnl + ?5,
+                wins = wins + ?6, losses = losses + ?7, peak_pnl = MAX(peak_pnl, realized_pnl + ?5),
+                max_drawdown = MAX(max_drawdown, MAX(peak_pnl, realized_pnl + ?5) - (realized_pnl + ?5))
+            WHERE symbol = ?8
+        ''', aggregates)
+        self.conn.executemany('''
+            INSERT INTO pnl_daily (day, symbol, sells, sell_value, realized_pnl, wins, losses) VALUES (?, ?, 1, ?, ?, ?, ?)
+            ON CONFLICT (day, symbol) DO UPDATE SET sells = sells + 1, sell_value = sell_value + excluded.sell_value,
+                realized_pnl = realized_pnl + excluded.realized_pnl, wins = wins + excluded.wins,
+                losses = losses + excluded.losses
+        ''', daily)
+        for date_buy, remaining, buy_price, target_price, cost, symbol in remainders:
+            cursor = self.conn.execute('''
+                INSERT INTO orders (date_buy, quantity, buy_price, target_price, sell_price, value_purchased, value_end, profit, date_sell, status, symbol, client_order_id)
+                VALUES (?, ?, ?, ?, NULL, ?, NULL, NULL, NULL, 'open', ?, NULL)
+            ''', (date_buy, remaining, buy_price, target_price, cost, symbol))
+            # Cada linha de orders conta como uma compra no dia, como na carga inicial dos agregados
+            self.conn.execute('UPDATE pnl_daily SET buys = buys + 1 WHERE day = ? AND symbol = ?', (date_buy[:10], symbol))
+            # O restante continua na posição: só entra no índice das ordens abertas
+            self._effects.append((self._apply_buy, ((cursor.lastrowid, date_buy, remaining, buy_price, target_price,
+                                                     None, cost, None, None, None, 'open', symbol, None), False)))
+        return [(order_id, price, value_end, profit) for _, price, value_end, profit, *_, order_id in updates]
+
+    def begin_intent(self, side: str, symbol: str, quantity: float, price: float, target_price: float = None,
+                     order_ids: list = None) -> str:
+        """Grava a intenção antes de enviar a ordem e retorna o newClientOrderId a usar nela."""
+        client_order_id = f"tb-{uuid.uuid4().hex[:24]}"
+        with self.lock:
+            with self.conn:
+                self.conn.execute('''
+                    INSERT INTO order_intents (client_order_id, side, symbol, quantity, price, target_price, order_ids, status, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?)
+                ''', (client_order_id, side, symbol, quantity, price, target_price,
+                      json.dumps(order_ids) if order_ids else None, int(time.time() * 1000)))
+        return client_order_id
+
+    def fail_intent(self, client_order_id: str):
+        """A exchange recusou a ordem: nada foi executado."""
+        with self.lock:
+            with self.conn:
+                self._finish_intents([client_order_id], 'failed')
+
+    def pending_intents(self) -> list:
+        with self.lock:
+            return self.conn.execute(
+                "SELECT client_order_id, side, symbol, quantity, price, target_price, order_ids, created_at "
+                "FROM order_intents INDEXED BY idx_intents_pending WHERE status = 'pending' ORDER BY symbol, created_at"
+            ).fetchall()
+
+    def checkpoint(self, symbol: str) -> int:
+        with self.lock:
+            row = self.conn.execute('SELECT synced_until FROM sync_checkpoints WHERE symbol = ?', (symbol,)).fetchone()
+            return row[0] if row else None
+
+    def apply_reconciliation(self, buys: list, sells: list, failed: list):
+        """Aplica o resultado da reconciliação numa única transação.
+
+        buys: [(client_order_id, data, quantidade, preço médio, preço alvo, símbolo)]
+        sells: [(client_order_id, ids das ordens, preço médio, data, quantidade executada, quantidade enviada)]
+        failed: [client_order_id]"""
+        with self._transaction():
+            placeholders = ','.join('?' * len(buys))
+            known = {row[0] for row in self.conn.execute(
+                f'SELECT client_order_id FROM orders WHERE client_order_id IN ({placeholders})',
+                [buy[0] for buy in buys]).fetchall()} if buys else set()
+            for client_order_id, date_buy, quantity, buy_price, target_price, symbol in buys:
+                if client_order_id not in known:
+                    self._insert_row(date_buy, quantity, buy_price, target_price, symbol, client_order_id)
+            for client_order_id, order_ids, sell_price, date_sell, executed, quantity in sells:
+                self._close_rows(order_ids, 'closed', sell_price, date_sell,
+                                 fills=self._allocate_fill(order_ids, executed, quantity))
+            self._finish_intents([buy[0] for buy in buys] + [sell[0] for sell in sells], 'done')
+            self._finish_intents(failed, 'failed')
+
+    def _allocate_fill(self, order_ids: list, executed: float, quantity: float) -> Dict[int, Tuple[float, float]]:
+        """Divide uma venda entre as ordens dela: o que não foi executado fica aberto nas últimas."""
+        placeholders = ','.join('?' * len(order_ids))
+        rows = self.conn.execute(f"SELECT id, quantity FROM orders WHERE id IN ({placeholders}) AND status = 'open' "
+                                 "ORDER BY id DESC", list(order_ids)).fetchall()
+        unsold = max(quantity - executed, 0.0)
+        kept = {}
+        for order_id, row_quantity in rows:
+            kept[order_id] = min(row_quantity, unsold)
+            unsold -= kept[order_id]
+        closed = sum(row_quantity - kept[order_id] for order_id, row_quantity in rows)
+        return {order_id: ((row_quantity - kept[order_id]) * executed / closed if closed else 0.0, kept[order_id])
+                for order_id, row_quantity in rows}
+
+    def _finish_intents(self, client_order_ids: list, status: str):
+        """Conclui as intenções e avança o checkpoint do símbolo até a intenção pendente mais antiga."""
+        if not client_order_ids:
+            return
+        placeholders = ','.join('?' * len(client_order_ids))
+        symbols = [row[0] for row in self.conn.execute(
+            f'SELECT DISTINCT symbol FROM order_intents WHERE client_order_id IN ({placeholders})',
+            list(client_order_ids)).fetchall()]
+        self.conn.executemany('UPDATE order_intents SET status = ? WHERE client_order_id = ?',
+                              [(status, client_order_id) for client_order_id in client_order_ids])
+        now = int(time.time() * 1000)
+        self.conn.executemany('''
+            INSERT INTO sync_checkpoints (symbol, synced_until)
+            VALUES (?, COALESCE((SELECT MIN(created_at) FROM order_intents WHERE status = 'pending' AND symbol = ?), ?))
+            ON CONFLICT(symbol) DO UPDATE SET synced_until = excluded.synced_until
+        ''', [(symbol, symbol, now) for symbol in symbols])
+
+    def collect_metrics(self, registry: Metrics):
+        with self.lock:
+            for symbol, index in self.open_indexes.items():
+                registry.set('tradingbot_open_orders', len(index), symbol=symbol)
+            for symbol, pnl in self.realized_pnl.items():
+                registry.set('tradingbot_realized_pnl', pnl, symbol=symbol)
+            for symbol, (quantity, cost) in self.open_positions.items():
+                registry.set('tradingbot_open_exposure', cost, symbol=symbol)
+                if symbol in last_prices:
+                    registry.set('tradingbot_unrealized_pnl', quantity * last_prices[symbol] - cost, symbol=symbol)
+
+    def flush(self):
+        """Transfere o WAL para o arquivo principal (usado no encerramento gracioso)."""
+        with self.lock:
+            self.conn.commit()
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+## INSERE ORDEM DE COMPRA
+def insert_order(date_buy: str, quantity: float, buy_price: float, target_price: float, symbol: str = None,
+                 client_order_id: str = None) -> int:
+    try:
+        symbol = symbol or SYMBOL
+        order_id = order_repository.insert(date_buy, quantity, buy_price, target_price, symbol, client_order_id)
+        value_purchased = quantity * buy_price
+        logger.info("Ordem de compra: ID %s, Símbolo: %s, Data: %s, Quantidade: %s, Valor de Compra: %s, Preço de Compra: %s, Preço alvo: %s", order_id, symbol, date_buy, quantity, value_purchased, buy_price, target_price)
+        return order_id
+    except sqlite3.Error as e:
+        logger.error("Erro ao inserir ordem no banco de dados: %s", e)
+        raise
+## ATUALIZA ORDEM DE VENDA
+def update_order_status(order_ids: list, status: str, sell_price: float, client_order_ids: list = (),
+                        sell_prices: Dict[int, float] = None, fills: Dict[int, Tuple[float, float]] = None):
+    try:
+        updated = order_repository.close_orders(order_ids, status, sell_price, time.strftime('%Y-%m-%d %H:%M:%S'),
+                                                client_order_ids, sell_prices, fills)
+        total_profit = 0.0  # Inicializa o lucro total
+        for order_id, price, value_end, profit in updated:
+            total_profit += profit  # Acumula o lucro total
+            logger.info("Ordem atualizada: ID %s, Status: %s, Preço de venda: %s, Valor final: %.2f, Lucro: %.2f", order_id, status, price, value_end, profit)
+
+        # Log do lucro total após a atualização de todas as ordens
+        logger.info("Lucro total das ordens vendidas: R$%.2f", total_profit)
+        logger.info("Ordens atualizadas: IDs %s, Status: %s, Preço de venda: %s", [order_id for order_id, _, _, _ in updated], status, sell_price)
+
+    except sqlite3.Error as e:
+        logger.error("Erro ao atualizar ordens no banco de dados: %s", e)
+        raise
+    except Exception as ex:
+        logger.error("Erro inesperado: %s", ex)
+        raise
+## ENVIA UMA ORDEM À EXCHANGE COM O client_order_id DA INTENÇÃO NO DIÁRIO
+def place_order(send, client_order_id: str, **params):
+    from binance.exceptions import BinanceAPIException
+    try:
+        return send(newClientOrderId=client_order_id, **params)
+    except BinanceAPIException as e:
+        if e.status_code < 500:
+            order_repository.fail_intent(client_order_id)  # Recusada pela exchange: nada foi executado
+        raise  # Em 5xx o resultado é incerto: a intenção fica pendente para a reconciliação
+## MARGEM (ms) NA BUSCA DO HISTÓRICO, PARA DIFERENÇAS ENTRE O RELÓGIO LOCAL E O DA EXCHANGE
+RECONCILE_MARGIN_MS = 60_000
+## BUSCA AS ORDENS DO SÍMBOLO NA EXCHANGE DESDE since_ms (PAGINADO POR orderId)
+def fetch_order_history(client, symbol: str, since_ms: int) -> list:
+    orders = client.get_all_orders(symbol=symbol, startTime=since_ms, limit=1000)
+    page = orders
+    while len(page) == 1000:
+        page = client.get_all_orders(symbol=symbol, orderId=page[-1]['orderId'] + 1, limit=1000)
+        orders.extend(page)
+    return orders
+## RECONCILIA AS INTENÇÕES PENDENTES COM O HISTÓRICO DA EXCHANGE (NA INICIALIZAÇÃO)
+def reconcile_orders(client, repository: OrderRepository) -> int:
+    """Confere as ordens que ficaram sem registro (queda entre o envio e a gravação) e corrige o
+    orders.db numa única transação. Só o histórico a partir do checkpoint de cada símbolo é
+    buscado, então o custo depende das mudanças desde a última execução e não do histórico todo."""
+    pending = repository.pending_intents()
+    if not pending:
+        return 0
+    buys, sells, failed = [], [], []
+    for symbol, intents in itertools.groupby(pending, key=lambda intent: intent[2]):
+        intents = list(intents)
+        since = min(repository.checkpoint(symbol) or intents[0][7], intents[0][7]) - RECONCILE_MARGIN_MS
+        history = {}
+        for order in fetch_order_history(client, symbol, since):
+            # A sobra a mercado de uma ordem maker usa o client_order_id da intenção + '-m'
+            history.setdefault(order['clientOrderId'].removesuffix('-m'), []).append(order)
+        for client_order_id, side, _, quantity, _, target_price, order_ids, _ in intents:
+            orders = history.get(client_order_id, [])
+            if any(order['status'] in ('NEW', 'PARTIALLY_FILLED') for order in orders):
+                continue  # Ainda em execução na exchange: fica pendente
+            executed = sum(float(order['executedQty']) for order in orders)
+            if executed <= 0:
+                failed.append(client_order_id)  # Recusada, cancelada ou nunca chegou à exchange
+                continue
+            price = sum(float(order['cummulativeQuoteQty']) for order in orders) / executed
+            date = time.strftime('%Y-%m-%d %H:%M:%S',
+                                 time.localtime(max(order['updateTime'] for order in orders) / 1000))
+            if side == 'BUY':
+                buys.append((client_order_id, date, executed, price, target_price, symbol))
+            else:
+                sells.append((client_order_id, json.loads(order_ids or '[]'), price, date, executed, quantity))
+    repository.apply_reconciliation(buys, sells, failed)
+    logger.info("Reconciliação com a exchange: %s compras registradas, %s vendas fechadas, %s intenções sem execução.",
+                len(buys), len(sells), len(failed))
+    return len(buys) + len(sells) + len(failed)
+## CALCULA OS NÍVEIS DE RETRAÇÃO DE FIBONACCI ENTRE O SUPORTE E A RESISTÊNCIA
+def get_fibonacci_levels(suporte, resistencia, levels=None) -> np.ndarray:
+    """Um nível por item de FIBONACCI_LEVELS (última dimensão); aceita escalares ou arrays."""
+    suporte = np.asarray(suporte, dtype=float)[..., None]
+    resistencia = np.asarray(resistencia, dtype=float)[..., None]
+    return resistencia - (resistencia - suporte) * np.asarray(FIBONACCI_LEVELS if levels is None else levels)
+## OBTÉM O PREÇO ATUAL DE UM SÍMBOLO
+def get_symbol_price(symbol: str) -> float:
+    from binance.exceptions import BinanceAPIException
+    try:
+        ticker = client.get_symbol_ticker(symbol=symbol)
+        return float(ticker['price'])
+    except BinanceAPIException as e:
+        logger.error("Erro ao obter preço do %s: %s", symbol, e)
+        return 0.0
+## OBTÉM O PREÇO ATUAL DO BTC/BRL
+def get_btc_brl_price() -> float:
+    return get_symbol_price(SYMBOL)
+## OBTÉM O SALDO DISPONÍVEL (COM CACHE OPCIONAL)
+_balance_cache = {}  # Moeda -> (saldo livre, momento da consulta)
+def get_available_balance(max_age: float = 0.0, asset: str = 'BRL') -> float:
+    cached = _balance_cache.get(asset)
+    if max_age <= 0 or cached is None or time.time() - cached[1] > max_age:
+        asset_balance = client.get_asset_balance(asset=asset)
+        cached = (float(asset_balance['free']) if asset_balance else 0.0, time.time())
+        _balance_cache[asset] = cached
+        quote_budget.reset(asset)
+    return cached[0]
+## ATUALIZA O SALDO DE TODAS AS MOEDAS COM UMA ÚNICA CONSULTA À CONTA
+def refresh_balances():
+    now = time.time()
+    for item in client.get_account()['balances']:
+        _balance_cache[item['asset']] = (float(item['free']), now)
+    quote_budget.reset()
+## INVALIDA O CACHE DE SALDO APÓS UMA ORDEM
+def invalidate_balance_cache():
+    _balance_cache.clear()
+## ORÇAMENTO DO SALDO DE CADA MOEDA COTADA, COMPARTILHADO PELOS PARES QUE COMPRAM EM PARALELO
+class QuoteBudget:
+    """Valor de cada moeda cotada já comprometido por compras que a leitura do saldo ainda não reflete.
+
+    Os pares do escalonador leem o mesmo saldo (refresh_balances) e compram em paralelo; sem o
+    orçamento cada um usaria PERCENTAGE_TO_USE do saldo inteiro. reserve() dimensiona a compra,
+    sob um lock, sobre o saldo menos as reservas em andamento e os gastos desde a última leitura."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending: Dict[str, float] = {}  # Moeda -> reservas das compras em andamento
+        self.spent: Dict[str, float] = {}  # Moeda -> gasto desde a última leitura do saldo
+
+    def reset(self, asset: str = None):
+        """Nova leitura do saldo (de `asset` ou de todas as moedas): os gastos anteriores já estão nela."""
+        with self.lock:
+            if asset is None:
+                self.spent.clear()
+            else:
+                self.spent.pop(asset, None)
+
+    def spend(self, asset: str, value: float):
+        with self.lock:
+            self.spent[asset] = self.spent.get(asset, 0.0) + value
+
+    @contextmanager
+    def reserve(self, asset: str, balance: float, balance_safe: float, percentage_to_use: float):
+        """Produz o valor da compra (get_amount_to_use) sobre o saldo ainda livre de `asset`.
+
+        O valor fica reservado até o fim do bloco; o que for de fato comprado é informado em spend()."""
+        with self.lock:
+            available = max(balance - self.pending.get(asset, 0.0) - self.spent.get(asset, 0.0), 0.0)
+            amount = get_amount_to_use(available, balance_safe, percentage_to_use)
+            self.pending[asset] = self.pending.get(asset, 0.0) + amount
+        try:
+            yield amount
+        finally:
+            with self.lock:
+                self.pending[asset] -= amount
+quote_budget = QuoteBudget()
+
+
+###################### EXECUÇÃO ######################
+
+
+## FILTROS DO SÍMBOLO (LOT_SIZE, PRICE_FILTER E NOTIONAL/MIN_NOTIONAL)
+class SymbolFilters:
+    """Regras de quantidade e preço de um símbolo, a partir de um item de get_exchange_info()."""
+
+    def __init__(self, info: Dict[str, Any]):
+        filters = {item['filterType']: item for item in info.get('filters', [])}
+        lot = filters.get('LOT_SIZE', {})
+        self.step_size = float(lot.get('stepSize', 0))
+        self.min_qty = float(lot.get('minQty', 0))
+        self.max_qty = float(lot.get('maxQty', 0)) or math.inf
+        self.tick_size = float(filters.get('PRICE_FILTER', {}).get('tickSize', 0))
+        notional = filters.get('NOTIONAL') or filters.get('MIN_NOTIONAL') or {}
+        self.min_notional = float(notional.get('minNotional', 0))
+
+    @staticmethod
+    def _decimals(step: float) -> int:
+        return max(0, -int(math.floor(math.log10(step)))) if step > 0 else 8
+
+    @classmethod
+    def _to_step(cls, value: float, step: float, rounding) -> float:
+        if step <= 0:
+            return value
+        # A folga de 1e-9 evita que 0.3 / 0.1 = 2.9999... perca um passo inteiro
+        units = rounding(value / step + 1e-9) if rounding is math.floor else rounding(value / step - 1e-9)
+        return round(units * step, cls._decimals(step))
+
+    def round_quantity(self, quantity: float) -> float:
+        return min(self._to_step(quantity, self.step_size, math.floor), self.max_qty)
+
+    def round_price(self, price: float, side: str) -> float:
+        """Compra arredonda para baixo e venda para cima: a ordem maker nunca cruza o livro."""
+        return self._to_step(price, self.tick_size, math.floor if side == 'BUY' else math.ceil)
+
+    def format_quantity(self, quantity: float) -> str:
+        return f"{quantity:.{self._decimals(self.step_size)}f}"
+
+    def format_price(self, price: float) -> str:
+        return f"{price:.{self._decimals(self.tick_size)}f}"
+
+    def rejection(self, quantity: float, price: float) -> str:
+        """Motivo pelo qual a exchange recusaria a ordem, ou None."""
+        if quantity <= 0 or quantity < self.min_qty:
+            return f"quantidade {quantity} abaixo do mínimo {self.min_qty} (LOT_SIZE)"
+        if quantity * price < self.min_notional:
+            return f"valor {quantity * price:.2f} abaixo do mínimo {self.min_notional} (NOTIONAL)"
+        return None
+## LIVRO DE OFERTAS LOCAL (SNAPSHOT REST + ATUALIZAÇÕES INCREMENTAIS DO STREAM)
+class OrderBook:
+    """Níveis de preço -> quantidade de um símbolo.
+
+    Sem stream, o snapshot de get_order_book é renovado quando fica velho. Com o stream de
+    profundidade (depthUpdate), as diferenças são aplicadas sobre o snapshot seguindo as regras
+    de sequência da Binance: eventos já contidos no snapshot são ignorados e uma lacuna entre
+    updateIds descarta o livro até o próximo snapshot."""
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids: Dict[float, float] = {}
+        self.asks: Dict[float, float] = {}
+        self.last_update_id = None
+        self.updated_at = 0.0
+        self.streaming = False
+        self._buffer = []
+        self.lock = threading.Lock()
+
+    def stale(self, max_age: float) -> bool:
+        with self.lock:
+            if self.last_update_id is None:
+                return True
+            return not self.streaming and time.monotonic() - self.updated_at > max_age
+
+    def load_snapshot(self, snapshot: Dict[str, Any]):
+        with self.lock:
+            self.bids = {float(price): float(quantity) for price, quantity in snapshot['bids']}
+            self.asks = {float(price): float(quantity) for price, quantity in snapshot['asks']}
+            self.last_update_id = snapshot['lastUpdateId']
+            self.updated_at = time.monotonic()
+            buffered, self._buffer = self._buffer, []
+            for event in buffered:
+                self._apply(event)
+
+    def apply_diff(self, event: Dict[str, Any]) -> bool:
+        """Aplica um evento depthUpdate; False se houve lacuna e o livro precisa de novo snapshot."""
+        with self.lock:
+            self.streaming = True
+            if self.last_update_id is None:
+                self._buffer.append(event)  # Aguardando o snapshot
+                return True
+            return self._apply(event)
+
+    def _apply(self, event: Dict[str, Any]) -> bool:
+        if event['u'] <= self.last_update_id:
+            return True
+        if event['U'] > self.last_update_id + 1:
+            logger.warning("Lacuna no livro de ofertas de %s (%s -> %s), aguardando novo snapshot.",
+                           self.symbol, self.last_update_id, event['U'])
+            self.last_update_id = None
+            self._buffer = [event]
+            return False
+        for levels, changes in ((self.bids, event['b']), (self.asks, event['a'])):
+            for price, quantity in changes:
+                price, quantity = float(price), float(quantity)
+                if quantity == 0:
+                    levels.pop(price, None)
+                else:
+                    levels[price] = quantity
+        self.last_update_id = event['u']
+        self.updated_at = time.monotonic()
+        return True
+
+    def best(self) -> Tuple[float, float]:
+        with self.lock:
+            return max(self.bids, default=0.0), min(self.asks, default=0.0)
+
+    def estimate(self, side: str, quantity: float) -> Tuple[float, float]:
+        """(preço médio, slippage relativo ao melhor preço) de uma ordem a mercado de `quantity`.
+
+        Se o livro não tiver profundidade suficiente o slippage é infinito."""
+        with self.lock:
+            levels = self.asks if side == 'BUY' else self.bids
+            prices = sorted(levels, reverse=side != 'BUY')
+            remaining, quote = quantity, 0.0
+            for price in prices:
+                filled = min(remaining, levels[price])
+                quote += filled * price
+                remaining -= filled
+                if remaining <= 0:
+                    break
+        if not prices or remaining > 1e-12:
+            return (prices[-1] if prices else 0.0), math.inf
+        average = quote / quantity
+        return average, abs(average / prices[0] - 1)
+## INTERVALO (s) ENTRE CONSULTAS DE UMA ORDEM LIMITADA À ESPERA DE EXECUÇÃO
+EXECUTION_POLL_INTERVAL = 1.0
+## MOTOR DE EXECUÇÃO: FILTROS EM CACHE, LIVRO LOCAL E ESCOLHA ENTRE MAKER E MERCADO
+class ExecutionEngine:
+    """Envia as ordens do trade() e devolve o que foi de fato executado.
+
+    Os filtros dos símbolos são buscados uma única vez (um get_exchange_info para todos os pares)
+    e a quantidade é arredondada ao stepSize antes do envio, então ordens que a exchange recusaria
+    nem chegam a ser enviadas. O tipo da ordem depende de `mode`:
+
+    * market: sempre a mercado (taker);
+    * limit: LIMIT_MAKER no melhor preço do próprio lado do livro (taxa maker);
+    * auto: estima no livro local o slippage da ordem a mercado e usa LIMIT_MAKER quando
+      slippage + taker_fee - maker_fee passa de `max_slippage`.
+
+    Uma ordem maker não executada em `limit_timeout` segundos é cancelada; o restante de uma
+    venda segue a mercado (com o client_order_id da intenção + '-m'), o de uma compra é abandonado.
+    Se a exchange recusar o restante a mercado, o retorno é só o que a LIMIT_MAKER executou."""
+
+    def __init__(self, client, symbols: list = (), mode: str = 'market', max_slippage: float = 0.0005,
+                 limit_timeout: float = 10.0, book_depth: int = 100, book_max_age: float = 2.0):
+        self.client = client
+        self.symbols = set(symbols)
+        self.configure(mode, max_slippage, limit_timeout, book_depth, book_max_age)
+        self._filters: Dict[str, SymbolFilters] = {}
+        self._books: Dict[str, OrderBook] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, mode: str, max_slippage: float, limit_timeout: float, book_depth: int, book_max_age: float):
+        if mode not in ('market', 'limit', 'auto'):
+            raise ValueError(f"Modo de execução inválido: {mode}")
+        self.mode = mode
+        self.max_slippage = max_slippage
+        self.limit_timeout = limit_timeout
+        self.book_depth = book_depth
+        self.book_max_age = book_max_age
+
+    def filters(self, symbol: str) -> SymbolFilters:
+        with self._lock:
+            if symbol not in self._filters:
+                self.symbols.add(symbol)
+                for info in self.client.get_exchange_info()['symbols']:
+                    if info['symbol'] in self.symbols:
+                        self._filters[info['symbol']] = SymbolFilters(info)
+                if symbol not in self._filters:
+                    raise ValueError(f"Símbolo {symbol} não encontrado na exchange.")
+            return self._filters[symbol]
+
+    def book(self, symbol: str) -> OrderBook:
+        with self._lock:
+            book = self._books.setdefault(symbol, OrderBook(symbol))
+        if book.stale(self.book_max_age):
+            book.load_snapshot(self.client.get_order_book(symbol=symbol, limit=self.book_depth))
+        return book
+
+    def follow(self, symbol: str):
+        """Callback para o stream de profundidade: mantém o livro do símbolo atualizado por push."""
+        with self._lock:
+            book = self._books.setdefault(symbol, OrderBook(symbol))
+        return book.apply_diff
+
+    def prepare(self, symbol: str, quantity: float, price: float) -> float:
+        """Quantidade arredondada ao stepSize, ou 0 se a exchange recusaria a ordem."""
+        filters = self.filters(symbol)
+        quantity = filters.round_quantity(quantity)
+        reason = filters.rejection(quantity, price)
+        if reason:
+            logger.info("Ordem de %s ignorada: %s.", symbol, reason)
+            return 0.0
+        return quantity
+
+    def choose(self, side: str, symbol: str, quantity: float) -> Tuple[str, float]:
+        """(tipo da ordem, preço limite) para a quantidade; o preço é None a mercado."""
+        if self.mode == 'market':
+            return 'MARKET', None
+        book = self.book(symbol)
+        best_bid, best_ask = book.best()
+        maker_price = best_bid if side == 'BUY' else best_ask
+        if not maker_price:
+            return 'MARKET', None
+        if self.mode == 'auto':
+            _, slippage = book.estimate(side, quantity)
+            maker_fee, taker_fee = fee_provider.get()
+            excess = slippage + taker_fee - maker_fee
+            logger.info("Slippage estimado de %s %s %s: %.4f%% (custo extra a mercado: %.4f%%).",
+                        side, quantity, symbol, slippage * 100, excess * 100)
+            if excess <= self.max_slippage:
+                return 'MARKET', None
+        return 'LIMIT_MAKER', self.filters(symbol).round_price(maker_price, side)
+
+    def execute(self, side: str, symbol: str, quantity: float, client_order_id: str) -> Tuple[float, float, dict]:
+        """Envia a ordem e retorna (quantidade executada, preço médio executado, última resposta)."""
+        from binance.exceptions import BinanceAPIException
+        filters = self.filters(symbol)
+        quantity = filters.round_quantity(quantity)
+        if quantity <= 0:
+            return 0.0, 0.0, None
+        order_type, price = self.choose(side, symbol, quantity)
+        executed, quote, order = 0.0, 0.0, None
+        market_id = client_order_id
+        if order_type == 'LIMIT_MAKER':
+            try:
+                order = self.client.create_order(symbol=symbol, side=side, type='LIMIT_MAKER',
+                                                 quantity=filters.format_quantity(quantity),
+                                                 price=filters.format_price(price),
+                                                 newClientOrderId=client_order_id)
+            except BinanceAPIException as e:
+                if e.status_code >= 500:
+                    raise  # Resultado incerto: a intenção fica pendente para a reconciliação
+                logger.info("LIMIT_MAKER de %s recusada (%s), enviando a mercado.", symbol, e.message)
+            else:
+                order = self._await_fill(symbol, order)
+                executed = float(order['executedQty'])
+                quote = float(order['cummulativeQuoteQty'])
+                metrics.inc('tradingbot_executions_total', type='LIMIT_MAKER', side=side, symbol=symbol)
+                if side == 'BUY':
+                    return executed, (quote / executed if executed else 0.0), order
+            market_id = client_order_id + '-m' if order is not None else client_order_id
+        remaining = filters.round_quantity(quantity - executed)
+        if remaining > 0 and (order is None or not filters.rejection(remaining, price)):
+            send = self.client.order_market_buy if side == 'BUY' else self.client.order_market_sell
+            try:
+                market = place_order(send, market_id, symbol=symbol, quantity=filters.format_quantity(remaining))
+            except BinanceAPIException as e:
+                if e.status_code >= 500 or market_id == client_order_id:
+                    raise
+                if not executed:
+                    order_repository.fail_intent(client_order_id)  # Nem a LIMIT_MAKER nem o restante executaram
+                    raise
+                # O restante foi recusado (ex.: NOTIONAL, saldo): vale só o que a LIMIT_MAKER executou
+                logger.warning("Restante de %s %s recusado a mercado (%s); executado só %s na LIMIT_MAKER.",
+                               remaining, symbol, e.message, executed)
+                return executed, quote / executed, order
+            order = market
+            executed += float(order['executedQty'])
+            quote += float(order['cummulativeQuoteQty'])
+            metrics.inc('tradingbot_executions_total', type='MARKET', side=side, symbol=symbol)
+        return executed, (quote / executed if executed else 0.0), order
+
+    def _await_fill(self, symbol: str, order: Dict[str, Any]) -> Dict[str, Any]:
+        """Espera a ordem maker até limit_timeout e cancela o que não foi executado."""
+        from binance.exceptions import BinanceAPIException
+        deadline = time.monotonic() + self.limit_timeout
+        while order['status'] in ('NEW', 'PARTIALLY_FILLED') and time.monotonic() < deadline:
+            time.sleep(min(EXECUTION_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+            order = self.client.get_order(symbol=symbol, orderId=order['orderId'])
+        if order['status'] in ('NEW', 'PARTIALLY_FILLED'):
+            try:
+                order = self.client.cancel_order(symbol=symbol, orderId=order['orderId'])
+            except BinanceAPIException as e:
+                if e.status_code >= 500:
+                    raise
+                # Executada entre a última consulta e o cancelamento
+                order = self.client.get_order(symbol=symbol, orderId=order['orderId'])
+        return order
+
+
+###################### RISCO ######################
+
+
+## LIMITES DE CADA PAR (RISK_MAX_POSITION EM VALOR E RISK_MAX_QUANTITY NO ATIVO; 0 = SEM LIMITE)
+def build_risk_limits(config: Dict[str, Any]) -> Dict[str, Tuple[float, float]]:
+    return {pair_config["SYMBOL"]: (float(pair_config.get("RISK_MAX_POSITION", "0")),
+                                    float(pair_config.get("RISK_MAX_QUANTITY", "0")))
+            for pair_config in build_pair_configs(config)}
+## CONTROLE DE RISCO PRÉ-ORDEM COM CONTADORES EM MEMÓRIA
+class RiskEngine:
+    """Exposição aberta (a custo) por símbolo e total, lucro realizado do dia e ordens do último minuto.
+
+    Os contadores são carregados uma vez do OrderRepository (open_positions e pnl_daily) e depois
+    atualizados pelo próprio repositório a cada compra e fechamento (on_fill), inclusive os vindos
+    da reconciliação, então blocked() e reserve() não consultam o banco e custam microssegundos.
+
+    * RISK_MAX_POSITION / RISK_MAX_QUANTITY: posição aberta máxima por símbolo;
+    * RISK_MAX_EXPOSURE: soma máxima das posições abertas de todos os símbolos;
+    * RISK_MAX_DAILY_LOSS: prejuízo realizado no dia que desarma novas compras até a meia-noite;
+    * RISK_MAX_ORDERS_PER_MINUTE: compras enviadas por minuto, somando todos os pares.
+
+    As vendas nunca são bloqueadas: elas só reduzem a exposição."""
+
+    def __init__(self, repository: OrderRepository, limits: Dict[str, Tuple[float, float]] = None,
+                 max_exposure: float = 0.0, max_daily_loss: float = 0.0, max_orders_per_minute: int = 0):
+        self.lock = threading.RLock()
+        self.configure(limits, max_exposure, max_daily_loss, max_orders_per_minute)
+        self.pending: Dict[str, list] = {}  # Reservas das compras em andamento (quantidade, valor)
+        self.pending_cost = 0.0
+        self.order_times = deque()
+        self.tripped = False
+        self.day_end = 0.0
+        with repository.lock:
+            self.positions = {symbol: list(position) for symbol, position in repository.open_positions.items()}
+            self.total_cost = sum(cost for _, cost in self.positions.values())
+            self._roll_day(time.time())
+            self.daily_pnl = repository.realized_on(self.day)
+            self._check_daily_loss()
+            repository.listeners.append(self.on_fill)
+
+    def configure(self, limits: Dict[str, Tuple[float, float]], max_exposure: float, max_daily_loss: float,
+                  max_orders_per_minute: int):
+        with self.lock:
+            self.limits = dict(limits or {})
+            self.max_exposure = max_exposure
+            self.max_daily_loss = max_daily_loss
+            self.max_orders_per_minute = max_orders_per_minute
+
+    def _roll_day(self, now: float):
+        """Na virada do dia (horário local, como as datas do orders.db) zera o lucro do dia e rearma."""
+        if now < self.day_end:
+            return
+        today = time.localtime(now)
+        self.day = time.strftime('%Y-%m-%d', today)
+        self.day_end = time.mktime((today.tm_year, today.tm_mon, today.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+        self.daily_pnl = 0.0
+        if self.tripped:
+            logger.info("Novo dia: compras liberadas pelo limite de prejuízo diário.")
+        self.tripped = False
+
+    def _check_daily_loss(self):
+        if self.max_daily_loss and not self.tripped and self.daily_pnl <= -self.max_daily_loss:
+            self.tripped = True
+            logger.warning("Prejuízo realizado no dia de R$%.2f atingiu o limite de R$%.2f: compras suspensas até amanhã.",
+                           -self.daily_pnl, self.max_daily_loss)
+
+    def on_fill(self, side: str, symbol: str, quantity: float, cost: float, profit: float, date: str):
+        with self.lock:
+            sign = 1.0 if side == 'BUY' else -1.0
+            position = self.positions.setdefault(symbol, [0.0, 0.0])
+            position[0] += sign * quantity
+            position[1] += sign * cost
+            self.total_cost += sign * cost
+            if profit:
+                self._roll_day(time.time())
+                if date and date[:10] == self.day:
+                    self.daily_pnl += profit
+                    self._check_daily_loss()
+
+    def _room(self, symbol: str, price: float) -> Tuple[float, str]:
+        """Quantidade que ainda cabe nos limites ao `price` e o limite que a restringe."""
+        quantity, cost = self.positions.get(symbol, (0.0, 0.0))
+        pending_quantity, pending_cost = self.pending.get(symbol, (0.0, 0.0))
+        max_position, max_quantity = self.limits.get(symbol, (0.0, 0.0))
+        room, reason = math.inf, None
+        for limit, available, name in (
+                (max_position, (max_position - cost - pending_cost) / price, 'position'),
+                (max_quantity, max_quantity - quantity - pending_quantity, 'quantity'),
+                (self.max_exposure, (self.max_exposure - self.total_cost - self.pending_cost) / price, 'exposure')):
+            if limit and available < room:
+                room, reason = max(available, 0.0), name
+        return room, reason
+
+    def _rate_limited(self, now: float) -> bool:
+        if not self.max_orders_per_minute:
+            return False
+        while self.order_times and self.order_times[0] <= now - 60:
+            self.order_times.popleft()
+        return len(self.order_times) >= self.max_orders_per_minute
+
+    def blocked(self, symbol: str, price: float) -> str:
+        """Motivo pelo qual nenhuma compra do símbolo cabe agora (None se cabe); pode ser checado a cada tick."""
+        now = time.time()
+        with self.lock:
+            self._roll_day(now)
+            if self.tripped:
+                return 'daily_loss'
+            if self._rate_limited(now):
+                return 'order_rate'
+            room, reason = self._room(symbol, price)
+            return reason if room <= 0 else None
+
+    @contextmanager
+    def reserve(self, symbol: str, quantity: float, price: float, min_value: float = 0.0):
+        """Reserva a quantidade liberada (até `quantity`) enquanto a compra é enviada e gravada.
+
+        Produz 0 se a compra não cabe ou ficaria abaixo de `min_value`. A reserva conta na exposição
+        até o fim do bloco, então pares comprando em paralelo não ultrapassam juntos o limite global."""
+        now = time.time()
+        with self.lock:
+            self._roll_day(now)
+            reason = 'daily_loss' if self.tripped else 'order_rate' if self._rate_limited(now) else None
+            allowed = 0.0
+            if reason is None:
+                room, reason = self._room(symbol, price)
+                allowed = min(quantity, room)
+                if allowed * price < max(min_value, 1e-12):
+                    allowed = 0.0
+                elif allowed == quantity:
+                    reason = None
+            if reason is not None:
+                metrics.inc('tradingbot_risk_rejections_total', reason=reason, symbol=symbol)
+                logger.info("Controle de risco (%s): compra de %s %s limitada a %s.", reason, quantity, symbol, allowed)
+            if allowed > 0:
+                self.order_times.append(now)
+                pending = self.pending.setdefault(symbol, [0.0, 0.0])
+                pending[0] += allowed
+                pending[1] += allowed * price
+                self.pending_cost += allowed * price
+        try:
+            yield allowed
+        finally:
+            if allowed > 0:
+                with self.lock:
+                    pending = self.pending[symbol]
+                    pending[0] -= allowed
+                    pending[1] -= allowed * price
+                    self.pending_cost -= allowed * price
+
+    def collect_metrics(self, registry: Metrics):
+        with self.lock:
+            for symbol, (quantity, cost) in self.positions.items():
+                registry.set('tradingbot_risk_position', cost, symbol=symbol)
+            registry.set('tradingbot_risk_exposure', self.total_cost)
+            registry.set('tradingbot_risk_daily_pnl', self.daily_pnl)
+            registry.set('tradingbot_risk_circuit_open', 1.0 if self.tripped else 0.0)
+
+
+###################### IMPLATANÇÕES ######################
+
+
+## OBTÉM AS TAXAS DE NEGOCIAÇÃO
+def get_trading_fees() -> Tuple[float, float]:
+    from binance.exceptions import BinanceAPIException
+    try:
+        account_info = client.get_account()
+        # Corrigir as taxas para valores decimais corretos
+        maker_fee = float(account_info['makerCommission']) / 10000  # Dividir por 10000 para obter 0.001 (0,1%)
+        taker_fee = float(account_info['takerCommission']) / 10000  # Dividir por 10000 para obter 0.001 (0,1%)
+        logger.info("Taxas obtidas - Maker: %s%%, Taker: %s%%", maker_fee * 100, taker_fee * 100)
+        return maker_fee, taker_fee
+    except BinanceAPIException as e:
+        logger.error("Erro ao obter taxas de negociação: %s", e)
+        return 0.0, 0.0
+## CACHE DAS TAXAS DE NEGOCIAÇÃO
+class FeeProvider:
+    """Mantém (maker_fee, taker_fee) em cache por `ttl` segundos.
+
+    Com start(), uma thread renova o cache antes de expirar, então get() não faz
+    chamadas à API no caminho de venda. Uma primeira consulta que falhou não entra no cache:
+    o próximo get() tenta de novo em vez de usar taxas zeradas por `ttl` segundos."""
+
+    def __init__(self, fetch, ttl: float = 3600):
+        self.fetch = fetch
+        self.ttl = ttl
+        self._fees = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self) -> Tuple[float, float]:
+        fees = self.fetch()
+        with self._lock:
+            if fees == (0.0, 0.0):
+                # get_trading_fees() devolve zeros em caso de erro: nada vai para o cache
+                if self._fees is None:
+                    logger.warning("Falha ao obter as taxas de negociação; nova tentativa na próxima consulta.")
+                    return fees
+                logger.warning("Falha ao renovar as taxas de negociação, mantendo as anteriores.")
+            else:
+                self._fees = fees
+            self._fetched_at = time.time()
+            return self._fees
+
+    def get(self) -> Tuple[float, float]:
+        with self._lock:
+            fees, fetched_at = self._fees, self._fetched_at
+        if fees is None or time.time() - fetched_at > self.ttl:
+            return self.refresh()
+        return fees
+
+    def start(self):
+        def run():
+            while not self._stop.wait(self.ttl * 0.8):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error("Erro ao renovar as taxas de negociação: %s", e)
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+## HISTORICO
+## TIPO DE CADA COLUNA DOS KLINES (NA ORDEM DA API; A COLUNA 'ignore' É DESCARTADA)
+KLINE_DTYPES = {
+    'open_time': np.int64,
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64,
+    'close_time': np.int64,
+    'quote_asset_volume': np.float64,
+    'number_of_trades': np.int64,
+    'taker_buy_base_asset_volume': np.float64,
+    'taker_buy_quote_asset_volume': np.float64,
+}
+## CONVERTE KLINES DA API EM ARRAYS TIPADOS POR COLUNA
+def parse_klines(klines: list) -> Dict[str, np.ndarray]:
+    return {name: np.array([kline[i] for kline in klines], dtype=dtype)
+            for i, (name, dtype) in enumerate(KLINE_DTYPES.items())}
+## CONVERTE KLINES DA API EM DATAFRAME
+def klines_to_dataframe(klines: list) -> pd.DataFrame:
+    import pandas as pd
+    if not klines:
+        return pd.DataFrame()
+    columns = parse_klines(klines)
+    index = pd.DatetimeIndex(columns.pop('open_time').astype('datetime64[ms]'), name='timestamp')
+    return pd.DataFrame(columns, index=index)
+def get_historical_data(client, SYMBOL, INTERVAL, LOOKBACK):
+    import pandas as pd
+    from binance.exceptions import BinanceAPIException
+    try:
+        df = klines_to_dataframe(client.get_historical_klines(SYMBOL, INTERVAL, LOOKBACK))
+        logger.info("Dados históricos obtidos com sucesso.")
+        return df
+    except BinanceAPIException as e:
+        logger.error("Erro ao obter dados históricos: %s", e)
+        return pd.DataFrame()  # Retorna um DataFrame vazio em caso de erro
+## CACHE INCREMENTAL DE CANDLES POR (SÍMBOLO, INTERVALO)
+class CandleStore:
+    """Cache append-only de candles: backfill único e depois só os candles novos.
+
+    Os candles fechados também vão para o CandleArchive, então o backtest enxerga o histórico ao vivo."""
+
+    def __init__(self, symbol: str, interval: str, db_path: str = 'candles.db', archive_root: str = 'candles',
+                 lookback: str = None):
+        import pandas as pd
+        self.symbol = symbol
+        self.interval = interval
+        self.lookback = lookback  # LOOKBACK do par (sem ele, o do config principal)
+        self.db_path = db_path
+        self.archive = CandleArchive(symbol, interval, archive_root)
+        self.window = 0  # Quantidade de candles da janela do LOOKBACK
+        self.df = pd.DataFrame()
+        self.last_open_time = None  # Em ms, como retornado pela API
+        self.last_close_time = None
+        self.last_candle_open = False  # O último candle ainda estava em aberto quando foi gravado
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS klines (
+                symbol TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                open_time INTEGER NOT NULL,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume REAL,
+                close_time INTEGER,
+                quote_asset_volume REAL,
+                number_of_trades INTEGER,
+                taker_buy_base_asset_volume REAL,
+                taker_buy_quote_asset_volume REAL,
+                PRIMARY KEY (symbol, interval, open_time)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+
+    def _persist(self, klines: list):
+        # O último candle pode estar em aberto, por isso INSERT OR REPLACE
+        self.conn.executemany('''
+            INSERT OR REPLACE INTO klines VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(self.symbol, self.interval, int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]),
+               float(k[5]), int(k[6]), float(k[7]), int(k[8]), float(k[9]), float(k[10])) for k in klines])
+        self.conn.commit()
+        self.last_open_time = int(klines[-1][0])
+        self.last_close_time = int(klines[-1][6])
+        now_ms = int(time.time() * 1000)
+        self.last_candle_open = self.last_close_time >= now_ms
+        # Só os candles fechados vão para o arquivo colunar do backtest, que acompanha o cache ao vivo
+        closed = [kline for kline in klines if int(kline[6]) < now_ms]
+        if closed:
+            try:
+                self.archive.write(parse_klines(closed))
+            except OSError as e:
+                logger.warning("Erro ao gravar os candles de %s no arquivo colunar: %s", self.symbol, e)
+
+    def prime(self, klines: list) -> pd.DataFrame:
+        """Define a janela inicial a partir de candles já disponíveis localmente."""
+        self.df = klines_to_dataframe(klines)
+        self.window = len(self.df)
+        if klines:
+            self.last_open_time = int(klines[-1][0])
+            self.last_close_time = int(klines[-1][6])
+        return self.df
+
+    def backfill(self, client, lookback: str = None) -> pd.DataFrame:
+        """Baixa a janela completa do LOOKBACK uma única vez (na inicialização)."""
+        klines = client.get_historical_klines(self.symbol, self.interval, lookback or self.lookback or LOOKBACK)
+        if not klines:
+            logger.error("Nenhum candle retornado no backfill de %s (%s).", self.symbol, self.interval)
+            return self.df
+        self._persist(klines)
+        self.df = klines_to_dataframe(klines)
+        self.window = len(self.df)
+        logger.info("Backfill de %s concluído: %s candles.", self.symbol, self.window)
+        return self.df
+
+    def update(self, client) -> int:
+        """Busca apenas os candles mais novos que o último close_time do cache."""
+        import pandas as pd
+        if self.last_open_time is None:
+            self.backfill(client)
+            return len(self.df)
+        # Se o último candle estava aberto ao ser gravado, busca-o de novo para ter o fechamento final
+        # (mesmo que ele já tenha fechado desde então)
+        if self.last_candle_open:
+            start = self.last_open_time
+        else:
+            start = self.last_close_time + 1
+        klines = client.get_historical_klines(self.symbol, self.interval, start)
+        if not klines:
+            return 0
+        self._persist(klines)
+        new_df = klines_to_dataframe(klines)
+        self.df = pd.concat([self.df[self.df.index < new_df.index[0]], new_df]).iloc[-self.window:]
+        return len(new_df)
+
+    def apply_kline(self, kline: list, closed: bool = True):
+        """Aplica na janela um candle recebido por push; só persiste candles fechados."""
+        import pandas as pd
+        if self.last_open_time is not None and int(kline[0]) < self.last_open_time:
+            return  # Candle atrasado, já está no cache
+        if closed:
+            self._persist([kline])
+        else:
+            self.last_open_time = int(kline[0])
+            self.last_close_time = int(kline[6])
+            self.last_candle_open = True
+        row = klines_to_dataframe([kline])
+        if not self.df.empty and self.df.index[-1] == row.index[0]:
+            self.df.iloc[-1] = row.iloc[0]
+        else:
+            self.df = pd.concat([self.df, row]).iloc[-self.window:]
+
+    def download(self, client, start_str, end_str=None) -> int:
+        """Persiste um período histórico (ex.: para backtests) sem alterar a janela em memória.
+
+        Além do candles.db, os candles vão para o arquivo colunar usado pelo backtest."""
+        klines = client.get_historical_klines(self.symbol, self.interval, start_str, end_str)
+        if klines:
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO klines VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(self.symbol, self.interval, int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]),
+                   float(k[5]), int(k[6]), float(k[7]), int(k[8]), float(k[9]), float(k[10])) for k in klines])
+            self.conn.commit()
+            self.archive.write(parse_klines(klines))
+        logger.info("%s candles de %s (%s) salvos em %s.", len(klines), self.symbol, self.interval, self.db_path)
+        return len(klines)
+
+    def load_arrays(self, start_ms: int = None, end_ms: int = None) -> Dict[str, np.ndarray]:
+        """Candles persistidos no intervalo [start_ms, end_ms] como arrays NumPy por coluna."""
+        rows = self.conn.execute('''
+            SELECT open_time, open, high, low, close, volume, close_time FROM klines
+            WHERE symbol = ? AND interval = ? AND open_time >= ? AND open_time <= ?
+            ORDER BY open_time
+        ''', (self.symbol, self.interval, start_ms or 0, end_ms or 2 ** 62)).fetchall()
+        columns = ['open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time']
+        if not rows:
+            return {name: np.empty(0) for name in columns}
+        data = np.array(rows, dtype=float)
+        arrays = {name: np.ascontiguousarray(data[:, i]) for i, name in enumerate(columns)}
+        arrays['open_time'] = arrays['open_time'].astype(np.int64)
+        arrays['close_time'] = arrays['close_time'].astype(np.int64)
+        return arrays
+
+    def load_klines(self) -> list:
+        """Candles persistidos no formato da API (usado pelo replay)."""
+        rows = self.conn.execute('''
+            SELECT open_time, open, high, low, close, volume, close_time, quote_asset_volume,
+                   number_of_trades, taker_buy_base_asset_volume, taker_buy_quote_asset_volume
+            FROM klines WHERE symbol = ? AND interval = ? ORDER BY open_time
+        ''', (self.symbol, self.interval)).fetchall()
+        return [list(row) + [0] for row in rows]
+
+    def get_dataframe(self) -> pd.DataFrame:
+        """Cópia da janela atual (strategy() adiciona colunas ao DataFrame)."""
+        return self.df.copy()
+## ARQUIVO COLUNAR DE CANDLES: <root>/<SYMBOL>/<INTERVAL>/<AAAA-MM-DD>/<coluna>.npy
+class CandleArchive:
+    """Um .npy tipado por coluna e por dia (UTC), lido com mmap.
+
+    Abrir o arquivo só lista os dias do intervalo pedido e busca os limites em open_time; a
+    memória usada é a das páginas realmente lidas, mesmo com anos de candles de 1m."""
+
+    DAY_MS = 86_400_000
+
+    def __init__(self, symbol: str, interval: str, root: str = 'candles'):
+        self.path = os.path.join(root, symbol, interval)
+
+    @classmethod
+    def day_name(cls, ms: int) -> str:
+        return str(np.datetime64(int(ms) // cls.DAY_MS, 'D'))
+
+    def days(self) -> list:
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(entry.name for entry in os.scandir(self.path) if entry.is_dir() and len(entry.name) == 10)
+
+    def _read(self, day: str, columns, mapped: bool = False) -> Dict[str, np.ndarray]:
+        folder = os.path.join(self.path, day)
+        part = {}
+        for name in columns:
+            path = os.path.join(folder, name + '.npy')
+            try:
+                part[name] = self._map_column(path, KLINE_DTYPES[name]) if mapped else np.load(path)
+            except FileNotFoundError:
+                pass
+        return part
+
+    @staticmethod
+    def _map_column(path: str, dtype) -> np.ndarray:
+        """Mapeia um .npy 1.0 gravado por write() sem interpretar o cabeçalho (o np.load com
+        mmap_mode faz um literal_eval por arquivo, o que domina a abertura de milhares de dias)."""
+        with open(path, 'rb') as file:
+            prefix = file.read(10)  # Magic (6 bytes), versão (2) e tamanho do cabeçalho (2, little-endian)
+            if prefix[:8] != b'\x93NUMPY\x01\x00':
+                return np.load(path, mmap_mode='r')
+            offset = 10 + int.from_bytes(prefix[8:10], 'little')
+            count = (os.fstat(file.fileno()).st_size - offset) // np.dtype(dtype).itemsize
+            if count <= 0:
+                return np.empty(0, dtype=dtype)
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+
+    def write(self, arrays: Dict[str, np.ndarray]):
+        """Grava (ou mescla, o candle mais novo prevalece) os candles nas partições de cada dia."""
+        columns = [name for name in KLINE_DTYPES if name in arrays]
+        open_time = np.asarray(arrays['open_time'], dtype=np.int64)
+        days = open_time // self.DAY_MS
+        for day_number in np.unique(days):
+            mask = days == day_number
+            part = {name: np.asarray(arrays[name])[mask] for name in columns}
+            day = self.day_name(int(day_number) * self.DAY_MS)
+            existing = self._read(day, columns) if os.path.isdir(os.path.join(self.path, day)) else {}
+            if existing:
+                part = {name: np.concatenate([existing[name], part[name]]) for name in columns if name in existing}
+                # np.unique sobre a ordem invertida mantém a última ocorrência de cada open_time
+                _, last = np.unique(part['open_time'][::-1], return_index=True)
+                keep = len(part['open_time']) - 1 - last
+                part = {name: values[keep] for name, values in part.items()}
+            else:
+                order = np.argsort(part['open_time'], kind='stable')
+                part = {name: values[order] for name, values in part.items()}
+            self._write_partition(day, part)
+
+    def _write_partition(self, day: str, part: Dict[str, np.ndarray]):
+        # Grava num diretório temporário e troca de uma vez: uma queda não deixa colunas desencontradas
+        final = os.path.join(self.path, day)
+        temporary = final + '.tmp'
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        for name, values in part.items():
+            np.save(os.path.join(temporary, name + '.npy'), np.ascontiguousarray(values, dtype=KLINE_DTYPES[name]))
+        if os.path.exists(final):
+            previous = final + '.old'
+            shutil.rmtree(previous, ignore_errors=True)
+            os.replace(final, previous)
+            os.replace(temporary, final)
+            shutil.rmtree(previous, ignore_errors=True)
+        else:
+            os.replace(temporary, final)
+
+    def views(self, start_ms: int = None, end_ms: int = None, columns=('open_time', 'open', 'high', 'low', 'close',
+                                                                         'volume', 'close_time')) -> list:
+        """Uma visão sem cópia (memmap fatiado) por dia com candles em [start_ms, end_ms].
+
+        Dias sem alguma das colunas (ex.: gravados antes de ela existir) são ignorados com um aviso."""
+        first = self.day_name(start_ms) if start_ms is not None else ''
+        last = self.day_name(end_ms) if end_ms is not None else '9999-12-31'
+        views = []
+        for day in self.days():
+            if not first <= day <= last:
+                continue
+            needed = set(columns) | {'open_time'}
+            part = self._read(day, needed, mapped=True)
+            missing = sorted(needed - set(part))
+            if missing:
+                logger.warning("Partição %s de %s sem as colunas %s, ignorada.", day, self.path, missing)
+                continue
+            times = part['open_time']
+            low = int(np.searchsorted(times, start_ms, 'left')) if start_ms is not None else 0
+            high = int(np.searchsorted(times, end_ms, 'right')) if end_ms is not None else len(times)
+            if high > low:
+                views.append({name: part[name][low:high] for name in columns})
+        return views
+
+    def load(self, start_ms: int = None, end_ms: int = None, columns=('open_time', 'open', 'high', 'low', 'close',
+                                                                        'volume', 'close_time')) -> Dict[str, np.ndarray]:
+        """Candles de [start_ms, end_ms] por coluna; dentro de um único dia não há cópia."""
+        views = self.views(start_ms, end_ms, columns)
+        if not views:
+            return {name: np.empty(0, dtype=KLINE_DTYPES[name]) for name in columns}
+        if len(views) == 1:
+            return views[0]
+        return {name: np.concatenate([view[name] for view in views]) for name in columns}
+## CALCULO DO PROFIT
+def calcular_lucro_liquido(preco_compra, preco_venda, quantidade, maker_fee, taker_fee):
+    # Calcula as taxas
+    taxa_compra = preco_compra * quantidade * maker_fee
+    taxa_venda = preco_venda * quantidade * taker_fee
+    taxas_totais = taxa_compra + taxa_venda
+
+    # Calcula o lucro líquido
+    lucro_liquido = (preco_venda * quantidade) - (preco_compra * quantidade) - taxas_totais
+    return lucro_liquido
+## VERIFICA LUCRO
+def verificar_lucro(preco_compra, preco_venda, quantidade):
+    maker_fee, taker_fee = fee_provider.get()  # Taxas da Binance em cache
+    lucro_liquido = calcular_lucro_liquido(preco_compra, preco_venda, quantidade, maker_fee, taker_fee)
+
+    if lucro_liquido > 0:
+        logger.info("Lucro líquido esperado: R$%.2f. Venda é lucrativa.", lucro_liquido)
+        return True
+    else:
+        logger.info("Lucro líquido esperado: R$%.2f. Venda não é lucrativa.", lucro_liquido)
+        return False
+## CALCULA O LUCRO LÍQUIDO DE VÁRIAS ORDENS EM UMA ÚNICA PASSADA
+def calcular_lucro_lote(precos_compra, preco_venda: float, quantidades) -> np.ndarray:
+    maker_fee, taker_fee = fee_provider.get()
+    return calcular_lucro_liquido(np.asarray(precos_compra, dtype=float), preco_venda,
+                                  np.asarray(quantidades, dtype=float), maker_fee, taker_fee)
+## VALOR A SER USADO NA COMPRA
+def get_amount_to_use(balance: float, balance_safe: float, percentage_to_use: float) -> float:
+    if balance < balance_safe:
+        return balance
+    return balance * percentage_to_use
+## PERÍODOS DAS MÉDIAS MÓVEIS EXIBIDAS NO GRÁFICO
+CHART_SMA_PERIODS = (50, 200)
+## LINHAS DO GRÁFICO A PARTIR DA POSIÇÃO start: [TEMPO (ms), FECHAMENTO, SMA 50, SMA 200]
+def chart_rows(df: pd.DataFrame, start: int) -> np.ndarray:
+    """As SMAs das linhas novas usam só os fechamentos anteriores necessários, não a janela toda."""
+    lead = max(0, start - (CHART_SMA_PERIODS[-1] - 1))
+    closes = df['close'].to_numpy()[lead:]
+    rows = np.empty((len(df) - start, 2 + len(CHART_SMA_PERIODS)))
+    rows[:, 0] = df.index.values[start:].astype('datetime64[ms]').astype(np.int64)
+    rows[:, 1] = closes[start - lead:]
+    for col, period in enumerate(CHART_SMA_PERIODS, 2):
+        rows[:, col] = sma_batch(closes, period)[start - lead:]
+    return rows
+## APLICA UMA MENSAGEM DO GRÁFICO AOS DADOS DO PROCESSO FILHO
+def merge_chart_rows(data: np.ndarray, first_time: float, rows: np.ndarray) -> np.ndarray:
+    """Substitui o que veio de rows[0] em diante (o último candle pode ter mudado) e descarta o
+    que saiu da janela do processo principal."""
+    if len(rows):
+        data = np.concatenate([data[data[:, 0] < rows[0, 0]], rows])
+    return data[data[:, 0] >= first_time]
+## REDUZ UMA SÉRIE A UM PAR MÍNIMO/MÁXIMO POR PIXEL
+def downsample_minmax(x: np.ndarray, y: np.ndarray, buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    if buckets <= 0 or len(x) <= 2 * buckets:
+        return x, y
+    starts = np.linspace(0, len(x), buckets, endpoint=False).astype(np.int64)
+    ends = np.append(starts[1:], len(x))
+    xs = np.column_stack([x[starts], x[(starts + ends - 1) // 2]]).ravel()
+    ys = np.column_stack([np.fmin.reduceat(y, starts), np.fmax.reduceat(y, starts)]).ravel()
+    return xs, ys
+## Função para exibir e atualizar o gráfico em um processo separado
+def plot_strategy_process(queue, stop_event):
+    """Recebe só os candles novos (ver send_chart_update), atualiza as linhas existentes e
+    redesenha por blitting; o fundo e os eixos só são redesenhados quando os dados saem dos limites."""
+    import matplotlib.pyplot as plt  # Só o processo do gráfico paga o import do matplotlib
+    plt.ion()  # Ativa o modo interativo
+    fig, ax = plt.subplots(figsize=(12, 8))
+    ax.set_title('Trading Strategy')
+    ax.xaxis_date()
+    close_line, = ax.plot([], [], label='Close Price', alpha=0.5, animated=True)
+    sma_lines = [ax.plot([], [], label=f'SMA {period}', alpha=0.75, animated=True)[0] for period in CHART_SMA_PERIODS]
+    buy_line, = ax.plot([], [], '^', markersize=10, color='g', lw=0, label='Buy Signal', animated=True)
+    sell_line, = ax.plot([], [], 'v', markersize=10, color='r', lw=0, label='Sell Signal', animated=True)
+    # Só o último sinal de compra e de venda recebe o preço escrito
+    buy_text = ax.text(0, 0, '', color='green', fontsize=8, animated=True)
+    sell_text = ax.text(0, 0, '', color='red', fontsize=8, animated=True)
+    ax.legend(loc='upper left')
+    artists = [close_line, *sma_lines, buy_line, sell_line, buy_text, sell_text]
+    state = {'background': None}
+
+    def on_draw(event):
+        state['background'] = fig.canvas.copy_from_bbox(fig.bbox)
+        for artist in artists:
+            ax.draw_artist(artist)
+
+    if fig.canvas.supports_blit:
+        fig.canvas.mpl_connect('draw_event', on_draw)
+    plt.show(block=False)
+
+    data = np.empty((0, 2 + len(CHART_SMA_PERIODS)))
+    symbol = None
+    running = True
+    while running and not stop_event.is_set():  # Verifica se o evento de parada foi acionado
+        try:
+            updated = False
+            try:
+                message = queue.get(timeout=0.2)  # Espera bloqueado em vez de girar a CPU
+                while True:
+                    if message is None:  # Sinal para encerrar o processo
+                        running = False
+                        break
+                    message_symbol, first_time, rows = message
+                    if message_symbol != symbol:
+                        symbol = message_symbol
+                        data = data[:0]
+                        ax.set_title(f'Trading Strategy - {symbol}')
+                    data = merge_chart_rows(data, first_time, rows)
+                    updated = True
+                    message = queue.get_nowait()  # Junta as mensagens acumuladas num único desenho
+            except Empty:
+                pass
+
+            if updated and len(data):
+                x = data[:, 0] / 86_400_000  # ms -> dias (datas do matplotlib)
+                buckets = int(ax.bbox.width)
+                close_line.set_data(*downsample_minmax(x, data[:, 1], buckets))
+                for col, line in enumerate(sma_lines, 2):
+                    line.set_data(*downsample_minmax(x, data[:, col], buckets))
+
+                # Sinal 1 quando a SMA curta está acima da longa; compra/venda nas mudanças
+                with np.errstate(invalid='ignore'):
+                    signal = (data[:, 2] > data[:, -1]).astype(np.int8)
+                position = np.diff(signal, prepend=signal[:1])
+                for line, text, mask in ((buy_line, buy_text, position == 1), (sell_line, sell_text, position == -1)):
+                    line.set_data(x[mask], data[mask, 1])
+                    if mask.any():
+                        last = np.flatnonzero(mask)[-1]
+                        text.set_position((x[last], data[last, 1]))
+                        text.set_text(f"{data[last, 1]:.2f}")
+                    else:
+                        text.set_text('')
+
+                # Redesenho completo só quando os dados saem dos limites (com folga de 10% / 5%)
+                span = max(x[-1] - x[0], 1e-9)
+                low, high = np.nanmin(data[:, 1:]), np.nanmax(data[:, 1:])
+                (x_min, x_max), (y_min, y_max) = ax.get_xlim(), ax.get_ylim()
+                if (state['background'] is None or x[-1] > x_max or x[0] - x_min > span * 0.1
+                        or low < y_min or high > y_max):
+                    pad = max(high - low, abs(high) * 1e-6) * 0.05
+                    ax.set_xlim(x[0], x[-1] + span * 0.1)
+                    ax.set_ylim(low - pad, high + pad)
+                    fig.canvas.draw()
+                elif fig.canvas.supports_blit:
+                    fig.canvas.restore_region(state['background'])
+                    for artist in artists:
+                        ax.draw_artist(artist)
+                    fig.canvas.blit(fig.bbox)
+                else:
+                    fig.canvas.draw_idle()
+            fig.canvas.flush_events()
+        except Exception as e:
+            logger.error("Erro no processo do gráfico: %s", e)
+            break
+
+    plt.close(fig)  # Fecha o gráfico ao encerrar o processo
+
+## ESTRATEGIA
+def strategy(df):
+    if df.empty:
+        logger.error("O DataFrame de dados históricos está vazio.")
+        return df
+
+    # Calcular as médias móveis
+    closes = df['close'].to_numpy()
+    df['SMA_50'] = sma_batch(closes, 50)
+    df['SMA_200'] = sma_batch(closes, 200)
+    
+    # Inicializar a coluna 'signal' com 0
+    df['signal'] = 0
+    
+    # Definir sinais usando .iloc para evitar problemas com o índice
+    if len(df) > 200:  # Garante que há dados suficientes
+        df.iloc[200:, df.columns.get_loc('signal')] = np.where(
+            df['SMA_50'].iloc[200:] > df['SMA_200'].iloc[200:], 1, 0
+        )
+    
+    # Calcular a coluna 'position' para detectar mudanças de sinal
+    df['position'] = df['signal'].diff()
+    
+    return df
+
+# Execução das funções
+
+###################### METRICAS TRADING ######################
+
+
+## CALCULA SUPORTE E RESISTÊNCIA
+def calculate_support_resistance(prices) -> Tuple[float, float]:
+    """Calcula o suporte e resistência com base nos preços."""
+    prices = np.asarray(prices, dtype=float)
+    if not len(prices):
+        logger.error("Nenhum preço disponível para calcular suporte e resistência.")
+        return 0.0, 0.0
+
+    suporte = float(prices.min())  # Suporte é o menor preço do período
+    resistencia = float(prices.max())  # Resistência é o maior preço do período
+
+    logger.info("Suporte calculado: R$%.2f, Resistência calculada: R$%.2f", suporte, resistencia)
+    return suporte, resistencia
+## CÁLCULO DO RSI
+def calculate_rsi(prices, period: int = 14) -> float:
+    """RSI de Wilder do último preço da série."""
+    if len(prices) <= period:
+        logger.error("Não há preços suficientes para calcular o RSI.")
+        return 0.0
+
+    rsi = float(rsi_batch(prices, period)[-1])
+    logger.info("RSI calculado: %.2f", rsi)
+    return rsi
+## MÉDIA MÓVEL SIMPLES VETORIZADA
+def sma_batch(values, period: int) -> np.ndarray:
+    """Equivalente a pd.Series(values).rolling(period).mean()."""
+    x = np.asarray(values, dtype=float)
+    out = np.full(len(x), np.nan)
+    if len(x) >= period:
+        base = x[0]  # Centraliza a série para reduzir o erro de arredondamento da soma acumulada
+        csum = np.concatenate(([0.0], np.cumsum(x - base)))
+        out[period - 1:] = (csum[period:] - csum[:-period]) / period + base
+    return out
+## MÉDIA EXPONENCIAL VETORIZADA
+def ewm_batch(values, alpha: float) -> np.ndarray:
+    """Equivalente a pd.Series(values).ewm(alpha=alpha, adjust=False).mean().
+
+    A recursão y[t] = y[t-1] + alpha * (x[t] - y[t-1]) é resolvida em blocos com soma
+    acumulada; o tamanho do bloco limita (1 - alpha) ** -k para não perder precisão."""
+    x = np.asarray(values, dtype=float)
+    decay = 1.0 - alpha
+    if not len(x) or decay <= 0:
+        return x.copy()
+    block = max(1, int(math.log(1e3) / -math.log(decay)))
+    powers = decay ** np.arange(1, block + 1)
+    out = np.empty(len(x))
+    out[0] = previous = x[0]
+    for start in range(1, len(x), block):
+        chunk = x[start:start + block]
+        factors = powers[:len(chunk)]
+        # y[k] = decay^(k+1) * (y[-1] + alpha * sum(x[j] / decay^(j+1) para j <= k))
+        out[start:start + len(chunk)] = factors * (previous + alpha * np.cumsum(chunk / factors))
+        previous = out[start + len(chunk) - 1]
+    return out
+## RSI DE WILDER VETORIZADO
+def rsi_batch(closes, period: int = 14) -> np.ndarray:
+    """RSI de Wilder para a série inteira (NaN até haver `period` variações).
+
+    Referência pandas: ewm(alpha=1/period, min_periods=period, adjust=False) sobre ganhos
+    e perdas. Sem perdas na janela o RSI é 100."""
+    x = np.asarray(closes, dtype=float)
+    out = np.full(len(x), np.nan)
+    if len(x) <= period:
+        return out
+    delta = np.diff(x)
+    average_gain = ewm_batch(np.clip(delta, 0.0, None), 1.0 / period)
+    average_loss = ewm_batch(np.clip(-delta, 0.0, None), 1.0 / period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100.0 - 100.0 / (1.0 + average_gain / average_loss)
+    rsi[average_loss == 0] = 100.0
+    out[period:] = rsi[period - 1:]
+    return out
+## MÍNIMO E MÁXIMO MÓVEIS VETORIZADOS
+def rolling_min_max_batch(values, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Equivalente a rolling(window).min() e rolling(window).max()."""
+    x = np.asarray(values, dtype=float)
+    lows = np.full(len(x), np.nan)
+    highs = np.full(len(x), np.nan)
+    if len(x) >= window:
+        view = np.lib.stride_tricks.sliding_window_view(x, window)
+        lows[window - 1:] = view.min(axis=1)
+        highs[window - 1:] = view.max(axis=1)
+    return lows, highs
+## MÉDIA MÓVEL SIMPLES INCREMENTAL
+class RollingSMA:
+    def __init__(self, period: int):
+        self.period = period
+        self.window = deque()
+        self.total = 0.0
+        self._evictions = 0
+
+    def update(self, value: float):
+        self.window.append(value)
+        self.total += value
+        if len(self.window) > self.period:
+            self.total -= self.window.popleft()
+            self._evictions += 1
+            if self._evictions >= 100 * self.period:  # Recalcula a soma para não acumular erro
+                self.total = math.fsum(self.window)
+                self._evictions = 0
+
+    def value(self, peek: float = None) -> float:
+        """Média atual; com `peek`, a média caso esse valor fosse o próximo da série."""
+        total, count = self.total, len(self.window)
+        if peek is not None:
+            total += peek
+            count += 1
+            if count > self.period:
+                total -= self.window[0]
+                count = self.period
+        return total / self.period if count == self.period else math.nan
+## MÉDIA EXPONENCIAL INCREMENTAL
+class ExponentialAverage:
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.current = None
+
+    def update(self, value: float):
+        self.current = value if self.current is None else self.current + self.alpha * (value - self.current)
+
+    def value(self, peek: float = None) -> float:
+        if peek is None:
+            return math.nan if self.current is None else self.current
+        return peek if self.current is None else self.current + self.alpha * (peek - self.current)
+## RSI DE WILDER INCREMENTAL
+class WilderRSI:
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.previous = None
+        self.count = 0  # Quantidade de variações processadas
+        self.gain = ExponentialAverage(1.0 / period)
+        self.loss = ExponentialAverage(1.0 / period)
+
+    def update(self, close: float):
+        if self.previous is not None:
+            delta = close - self.previous
+            self.gain.update(max(delta, 0.0))
+            self.loss.update(max(-delta, 0.0))
+            self.count += 1
+        self.previous = close
+
+    def value(self, peek: float = None) -> float:
+        gain, loss, count = self.gain.value(), self.loss.value(), self.count
+        if peek is not None and self.previous is not None:
+            delta = peek - self.previous
+            gain = self.gain.value(max(delta, 0.0))
+            loss = self.loss.value(max(-delta, 0.0))
+            count += 1
+        if count < self.period:
+            return math.nan
+        if loss == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + gain / loss)
+## MÍNIMO E MÁXIMO MÓVEIS INCREMENTAIS (DEQUES MONOTÔNICOS)
+class RollingMinMax:
+    def __init__(self, window: int):
+        self.window = window
+        self.index = 0
+        self.lows = deque()  # (índice, valor) com valores crescentes
+        self.highs = deque()  # (índice, valor) com valores decrescentes
+
+    def update(self, value: float):
+        while self.lows and self.lows[-1][1] >= value:
+            self.lows.pop()
+        self.lows.append((self.index, value))
+        while self.highs and self.highs[-1][1] <= value:
+            self.highs.pop()
+        self.highs.append((self.index, value))
+        expired = self.index - self.window
+        if self.lows[0][0] <= expired:
+            self.lows.popleft()
+        if self.highs[0][0] <= expired:
+            self.highs.popleft()
+        self.index += 1
+
+    def value(self, peek: float = None) -> Tuple[float, float]:
+        low = self.lows[0][1] if self.lows else math.nan
+        high = self.highs[0][1] if self.highs else math.nan
+        if peek is not None:
+            low = peek if not self.lows else min(low, peek)
+            high = peek if not self.highs else max(high, peek)
+        return low, high
+## MOTOR DE INDICADORES
+class IndicatorEngine:
+    """Mantém RSI, SMAs, EMAs, suporte e resistência com custo O(1) por candle fechado.
+
+    O último candle do DataFrame pode estar em aberto, então ele não é incorporado ao
+    estado: entra apenas como `peek` em values()."""
+
+    def __init__(self, rsi_period: int = 14, sma_periods=(50, 200), ema_periods=(12, 26), patterns=None):
+        self.rsi = WilderRSI(rsi_period)
+        self.patterns = CandlePatternScanner(patterns) if patterns else None  # Só com o sinal de padrões ativo
+        self.smas = {period: RollingSMA(period) for period in sma_periods}
+        self.emas = {period: ExponentialAverage(2.0 / (period + 1)) for period in ema_periods}
+        self.range = None  # Janela definida pelo tamanho do primeiro DataFrame sincronizado
+        self.last_timestamp = None
+
+    def update(self, close: float):
+        self.rsi.update(close)
+        for sma in self.smas.values():
+            sma.update(close)
+        for ema in self.emas.values():
+            ema.update(close)
+        self.range.update(close)
+
+    def sync(self, df: pd.DataFrame):
+        """Processa apenas os candles fechados que ainda não entraram no estado."""
+        if df.empty:
+            return
+        if self.range is None:
+            # Janela de candles fechados + o candle atual = janela do LOOKBACK
+            self.range = RollingMinMax(max(len(df) - 1, 1))
+        closed = df.iloc[:-1]
+        start = 0 if self.last_timestamp is None else closed.index.searchsorted(self.last_timestamp, side='right')
+        for close in closed['close'].to_numpy()[start:]:
+            self.update(float(close))
+        if self.patterns is not None:
+            new = closed.iloc[start:]
+            self.patterns.update(new['open'].to_numpy(), new['high'].to_numpy(), new['low'].to_numpy(),
+                                 new['close'].to_numpy())
+        if len(closed):
+            self.last_timestamp = closed.index[-1]
+
+    def values(self, last_close: float = None) -> Dict[str, float]:
+        values = {'rsi': self.rsi.value(last_close)}
+        for period, sma in self.smas.items():
+            values[f'sma_{period}'] = sma.value(last_close)
+        for period, ema in self.emas.items():
+            values[f'ema_{period}'] = ema.value(last_close)
+        if self.range is not None:
+            values['support'], values['resistance'] = self.range.value(last_close)
+        if self.patterns is not None:
+            values['pattern_signal'] = self.patterns.last_signal  # Último candle fechado
+        return values
+## PADRÕES DE VELA VETORIZADOS: CADA FUNÇÃO RECEBE ARRAYS (open, high, low, close) ALINHADOS
+## E OS MESMOS ARRAYS DESLOCADOS DE 1 E 2 CANDLES (p1, p2), RETORNANDO UMA MÁSCARA BOOLEANA
+DOJI_BODY_RATIO = 0.1  # Corpo de no máximo 10% da amplitude do candle
+def hammer_mask(open_price, close_price, low_price, high_price):
+    return (close_price > open_price) & ((high_price - close_price) < (close_price - low_price) * 0.2)
+def _inverted_hammer(c, p1, p2):
+    return (c['close'] > c['open']) & ((c['open'] - c['low']) < (c['high'] - c['open']) * 0.2)
+def _shooting_star(c, p1, p2):
+    return (c['close'] < c['open']) & ((c['close'] - c['low']) < (c['high'] - c['close']) * 0.2)
+def _doji(c, p1, p2):
+    amplitude = c['high'] - c['low']
+    return (amplitude > 0) & (np.abs(c['close'] - c['open']) <= amplitude * DOJI_BODY_RATIO)
+def _bullish_engulfing(c, p1, p2):
+    return (p1['close'] < p1['open']) & (c['close'] > c['open']) & (c['open'] <= p1['close']) & (c['close'] >= p1['open'])
+def _bearish_engulfing(c, p1, p2):
+    return (p1['close'] > p1['open']) & (c['close'] < c['open']) & (c['open'] >= p1['close']) & (c['close'] <= p1['open'])
+def _star_body(p1, p2):
+    return np.abs(p1['close'] - p1['open']) < np.abs(p2['close'] - p2['open']) * 0.3
+def _morning_star(c, p1, p2):
+    return ((p2['close'] < p2['open']) & _star_body(p1, p2) & (c['close'] > c['open'])
+            & (c['close'] > (p2['open'] + p2['close']) / 2))
+def _evening_star(c, p1, p2):
+    return ((p2['close'] > p2['open']) & _star_body(p1, p2) & (c['close'] < c['open'])
+            & (c['close'] < (p2['open'] + p2['close']) / 2))
+## PADRÃO -> (FUNÇÃO, CANDLES ANTERIORES NECESSÁRIOS, VIÉS: +1 ALTA, -1 BAIXA, 0 INDECISÃO)
+CANDLE_PATTERNS = {
+    'hammer': (lambda c, p1, p2: hammer_mask(c['open'], c['close'], c['low'], c['high']), 0, 1),
+    'inverted_hammer': (_inverted_hammer, 0, 1),
+    'shooting_star': (_shooting_star, 0, -1),
+    'doji': (_doji, 0, 0),
+    'bullish_engulfing': (_bullish_engulfing, 1, 1),
+    'bearish_engulfing': (_bearish_engulfing, 1, -1),
+    'morning_star': (_morning_star, 2, 1),
+    'evening_star': (_evening_star, 2, -1),
+}
+PATTERN_LOOKBACK = max(lookback for _, lookback, _ in CANDLE_PATTERNS.values())
+## AVALIA OS PADRÕES SOBRE ARRAYS OHLC INTEIROS (SEM LAÇO POR CANDLE)
+def scan_candle_patterns(open_price, high_price, low_price, close_price, patterns=None) -> Dict[str, np.ndarray]:
+    """Uma máscara booleana por padrão, alinhada aos candles.
+
+    Os primeiros candles de um padrão de vários candles, sem histórico suficiente, ficam False."""
+    candles = {'open': np.asarray(open_price, dtype=float), 'high': np.asarray(high_price, dtype=float),
+               'low': np.asarray(low_price, dtype=float), 'close': np.asarray(close_price, dtype=float)}
+    length = len(candles['close'])
+    # Deslocamentos por fatias (visões, sem cópia): p1[i] é o candle i-1 e p2[i] o candle i-2
+    shifted = [{column: values[PATTERN_LOOKBACK - lag:length - lag] for column, values in candles.items()}
+               for lag in range(PATTERN_LOOKBACK + 1)]
+    masks = {}
+    for name in patterns or CANDLE_PATTERNS:
+        if name not in CANDLE_PATTERNS:
+            raise ValueError(f"Padrão de vela desconhecido: {name}")
+        detect, lookback, _ = CANDLE_PATTERNS[name]
+        mask = np.zeros(length, dtype=bool)
+        if length > PATTERN_LOOKBACK:
+            mask[PATTERN_LOOKBACK:] = detect(*shifted)
+        # Padrões de um candle também valem nos primeiros candles, avaliados à parte
+        head = min(PATTERN_LOOKBACK, length)
+        if lookback == 0 and head:
+            first = {column: values[:head] for column, values in candles.items()}
+            mask[:head] = detect(first, first, first)
+        masks[name] = mask
+    return masks
+## COLUNA DE SINAL DOS PADRÕES: +1 SE PREDOMINAM PADRÕES DE ALTA, -1 SE DE BAIXA, 0 CASO CONTRÁRIO
+def pattern_signal(masks: Dict[str, np.ndarray]) -> np.ndarray:
+    bias = sum(mask.astype(np.int8) * CANDLE_PATTERNS[name][2] for name, mask in masks.items())
+    return np.sign(bias).astype(np.int8) if masks else np.zeros(0, dtype=np.int8)
+## ÍNDICES DOS CANDLES EM QUE CADA PADRÃO OCORRE
+def pattern_indices(masks: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    return {name: np.flatnonzero(mask) for name, mask in masks.items()}
+## SCANNER INCREMENTAL: AVALIA SÓ OS CANDLES NOVOS
+class CandlePatternScanner:
+    """Guarda apenas os últimos PATTERN_LOOKBACK candles fechados; update() avalia os padrões
+    somente nos candles recebidos, com o mesmo resultado de scan_candle_patterns na série toda."""
+
+    def __init__(self, patterns=None):
+        self.patterns = list(patterns or CANDLE_PATTERNS)
+        self.tail = {name: np.empty(0) for name in ('open', 'high', 'low', 'close')}
+        self.last_masks = {name: False for name in self.patterns}
+        self.last_signal = 0
+
+    def update(self, open_price, high_price, low_price, close_price) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """Retorna (máscaras, sinal) só dos candles novos."""
+        new = {'open': open_price, 'high': high_price, 'low': low_price, 'close': close_price}
+        count = len(close_price)
+        if not count:
+            return {name: np.zeros(0, dtype=bool) for name in self.patterns}, np.zeros(0, dtype=np.int8)
+        window = {name: np.concatenate([self.tail[name], np.asarray(values, dtype=float)]) for name, values in new.items()}
+        history = len(self.tail['close'])
+        full = scan_candle_patterns(window['open'], window['high'], window['low'], window['close'], self.patterns)
+        if history < PATTERN_LOOKBACK:
+            # No começo da série a janela não tem o histórico completo: mesma regra da varredura inteira
+            masks = {name: mask[history:] for name, mask in full.items()}
+        else:
+            masks = {name: mask[-count:] for name, mask in full.items()}
+        self.tail = {name: values[-PATTERN_LOOKBACK:] for name, values in window.items()}
+        signal = pattern_signal(masks)
+        self.last_masks = {name: bool(mask[-1]) for name, mask in masks.items()}
+        self.last_signal = int(signal[-1])
+        return masks, signal
+## DETECTA PADRÃO DE VELA
+def detect_hammer_candle(open_price, close_price, low_price, high_price):
+    """Detecta padrão de martelo nas velas."""
+    if hammer_mask(open_price, close_price, low_price, high_price):
+        logger.info("Padrão de Martelo identificado - Possível reversão de tendência.")
+        return True
+    return False
+
+
+
+###################### ESTRATÉGIA (SINAIS COMPONÍVEIS) ######################
+
+
+## NÓ DO GRAFO DE INDICADORES
+class IndicatorNode:
+    """Calcula `outputs` a partir de `inputs` (colunas dos candles ou outros indicadores).
+
+    `params` são as chaves dos parâmetros da estratégia usadas no cálculo. Um nó `elementwise`
+    só combina valores do mesmo candle, então serve tanto para arrays (backtest) quanto para os
+    escalares do último candle (trade()); os demais precisam da série inteira e, ao vivo, vêm do
+    estado incremental do IndicatorEngine."""
+
+    def __init__(self, outputs: tuple, inputs: tuple, compute, params: tuple = (), elementwise: bool = False):
+        self.outputs = outputs
+        self.inputs = inputs
+        self.compute = compute
+        self.params = params
+        self.elementwise = elementwise
+## INDICADORES DISPONÍVEIS PARA OS SINAIS
+INDICATOR_NODES = (
+    IndicatorNode(('support', 'resistance'), ('close',),
+                  lambda v, p: backtest_support_resistance(v['close'], p['WINDOW']), params=('WINDOW',)),
+    IndicatorNode(('rsi',), ('close',), lambda v, p: rsi_batch(v['close'], p['RSI_PERIOD']), params=('RSI_PERIOD',)),
+    IndicatorNode(('hammer',), ('open', 'high', 'low', 'close'),
+                  lambda v, p: hammer_mask(v['open'], v['close'], v['low'], v['high']), elementwise=True),
+    IndicatorNode(('pattern_signal',), ('open', 'high', 'low', 'close'),
+                  lambda v, p: pattern_signal(scan_candle_patterns(v['open'], v['high'], v['low'], v['close'],
+                                                                   p['CANDLE_PATTERNS'])),
+                  params=('CANDLE_PATTERNS',)),
+    IndicatorNode(('fibonacci_levels',), ('support', 'resistance'),
+                  lambda v, p: get_fibonacci_levels(v['support'], v['resistance'], p['FIBONACCI_LEVELS']),
+                  params=('FIBONACCI_LEVELS',), elementwise=True),
+)
+## GRAFO DE AVALIAÇÃO: CADA INDICADOR PEDIDO É CALCULADO UMA ÚNICA VEZ
+class IndicatorGraph:
+    """Resolve as dependências dos indicadores pedidos em ordem topológica.
+
+    compute() recebe o que já se tem (colunas dos candles, valores do IndicatorEngine ou
+    indicadores já calculados, como os da memória compartilhada da varredura) e calcula só o
+    que falta, uma vez por nó, não importa quantos sinais usem o mesmo indicador."""
+
+    def __init__(self, required, params: Dict[str, Any]):
+        self.params = params
+        producers = {name: node for node in INDICATOR_NODES for name in node.outputs}
+        self.nodes = []
+        self.param_deps: Dict[str, set] = {}  # Indicador -> parâmetros de que depende (transitivamente)
+
+        def visit(name, path=()):
+            node = producers.get(name)
+            if node is None or node in self.nodes:
+                return  # Coluna dos candles ou nó já resolvido
+            if node in path:
+                raise ValueError(f"Dependência circular entre indicadores: {name}")
+            deps = set(node.params)
+            for dependency in node.inputs:
+                visit(dependency, path + (node,))
+                deps |= self.param_deps.get(dependency, set())
+            for output in node.outputs:
+                self.param_deps[output] = deps
+            self.nodes.append(node)
+
+        for name in required:
+            visit(name)
+
+    def compute(self, values: Dict[str, Any], series: bool = True) -> Dict[str, Any]:
+        values = dict(values)
+        for node in self.nodes:
+            if all(name in values for name in node.outputs):
+                continue
+            if not (series or node.elementwise):
+                raise KeyError(f"{', '.join(node.outputs)} precisa da série inteira ou do IndicatorEngine")
+            result = node.compute({name: values[name] for name in node.inputs}, self.params)
+            values.update(zip(node.outputs, result if len(node.outputs) > 1 else (result,)))
+        return values
+## SINAL DE COMPRA COMPONÍVEL
+class Signal:
+    """Um componente da estratégia, ativado pela chave `flag` do config.json.
+
+    Declara em `requires` os indicadores que usa e vota em score(): +1 (comprar), 0 (neutro) ou
+    -1 (contra). O contexto traz escalares em trade() e arrays (um valor por candle) no backtest,
+    então score() só usa operações do NumPy."""
+
+    flag = None
+    requires = ()
+
+    def __init__(self, params: Dict[str, Any]):
+        self.params = params
+
+    def score(self, ctx: Dict[str, Any]):
+        raise NotImplementedError
+
+    @staticmethod
+    def vote(buy, against):
+        return np.where(buy, 1.0, np.where(against, -1.0, 0.0))
+## PREÇO ATÉ O BUY_PRICE (E, NO MODO "retracement", PRÓXIMO DE UM NÍVEL DE RETRAÇÃO DE FIBONACCI)
+class FibonacciSignal(Signal):
+    """FIBONACCI_MODE "buy_price" (padrão) é a regra original do critério fibonacci: a favor até o
+    BUY_PRICE e contra acima dele. "retracement" só vota a favor a menos de FIBONACCI_TOLERANCE de um
+    nível de FIBONACCI_LEVELS entre o suporte e a resistência (e ainda até o BUY_PRICE)."""
+
+    flag = 'FIBONACCI'
+
+    def __init__(self, params: Dict[str, Any]):
+        super().__init__(params)
+        self.retracement = params['FIBONACCI_MODE'] == 'retracement'
+        self.requires = ('fibonacci_levels',) if self.retracement else ()
+
+    def score(self, ctx):
+        price = np.asarray(ctx['price'], dtype=float)
+        below_limit = price <= self.params['BUY_PRICE']
+        if not self.retracement:
+            return self.vote(below_limit, ~below_limit)
+        distance = np.abs(ctx['fibonacci_levels'] / price[..., None] - 1).min(axis=-1)
+        return self.vote(below_limit & (distance <= self.params['FIBONACCI_TOLERANCE']), ~below_limit)
+## PREÇO NO SUPORTE (A FAVOR) OU NA RESISTÊNCIA (CONTRA)
+class SupportResistanceSignal(Signal):
+    flag = 'SUPPORT_RESISTANCE'
+    requires = ('support', 'resistance')
+
+    def score(self, ctx):
+        tolerance = self.params['FIBONACCI_TOLERANCE']
+        return self.vote(ctx['price'] <= ctx['support'] * (1 + tolerance),
+                         ctx['price'] >= ctx['resistance'] * (1 - tolerance))
+## MARTELO NO ÚLTIMO CANDLE FECHADO
+class HammerSignal(Signal):
+    flag = 'HAMMER_CANDLE'
+    requires = ('hammer',)
+
+    def score(self, ctx):
+        return self.vote(ctx['hammer'], False)
+## RSI SOBREVENDIDO (A FAVOR) OU SOBRECOMPRADO (CONTRA)
+class RSISignal(Signal):
+    flag = 'RSI'
+    requires = ('rsi',)
+
+    def score(self, ctx):
+        return self.vote(ctx['rsi'] <= self.params['RSI_OVERSOLD'], ctx['rsi'] >= self.params['RSI_OVERBOUGHT'])
+## PADRÕES DE VELA DE CANDLE_PATTERNS NO ÚLTIMO CANDLE FECHADO (ALTA A FAVOR, BAIXA CONTRA)
+class CandlePatternSignal(Signal):
+    flag = 'CANDLE_PATTERNS'
+    requires = ('pattern_signal',)
+
+    def score(self, ctx):
+        return self.vote(ctx['pattern_signal'] > 0, ctx['pattern_signal'] < 0)
+## SINAIS DISPONÍVEIS (NOVOS SINAIS SÃO SUBCLASSES DE Signal ACRESCENTADAS AQUI)
+STRATEGY_SIGNALS = (FibonacciSignal, SupportResistanceSignal, HammerSignal, RSISignal, CandlePatternSignal)
+## ESTRATÉGIA: COMBINA OS VOTOS DOS SINAIS ATIVOS
+class Strategy:
+    """Avalia os sinais sobre um único IndicatorGraph e combina os votos.
+
+    * weighted: média dos votos ponderada por STRATEGY_WEIGHTS; compra se >= STRATEGY_THRESHOLD;
+    * vote: fração dos sinais que votaram a favor; compra se >= STRATEGY_THRESHOLD.
+
+    Com o sinal FIBONACCI ativo, o BUY_PRICE é um teto: acima dele não há compra, qualquer que seja
+    a combinação dos votos. O preço alvo segue o TRADE_CRITERIA: "fibonacci" usa
+    preço * (1 + ORDER_MARGIN) e "support_resistance" usa a resistência."""
+
+    def __init__(self, signals: list, params: Dict[str, Any], window: int = None):
+        if params['TRADE_CRITERIA'] not in ('fibonacci', 'support_resistance'):
+            raise ValueError(f"Critério de trade inválido: {params['TRADE_CRITERIA']}")
+        if params['FIBONACCI_MODE'] not in ('buy_price', 'retracement'):
+            raise ValueError(f"Modo do sinal de Fibonacci inválido: {params['FIBONACCI_MODE']}")
+        if params['STRATEGY_MODE'] not in ('weighted', 'vote'):
+            raise ValueError(f"Modo de combinação de sinais inválido: {params['STRATEGY_MODE']}")
+        self.signals = signals
+        self.params = params
+        self.ceiling = any(isinstance(signal, FibonacciSignal) for signal in signals)
+        self.weights = np.array([float(params['STRATEGY_WEIGHTS'].get(signal.flag, 1.0)) for signal in signals])
+        required = [name for signal in signals for name in signal.requires]
+        if params['TRADE_CRITERIA'] == 'support_resistance':
+            required.append('resistance')
+        self.graph = IndicatorGraph(dict.fromkeys(required), dict(params, WINDOW=window))
+
+    def evaluate(self, price, values: Dict[str, Any], series: bool = False):
+        """Retorna (comprar, pontuação, preço alvo, votos por sinal, contexto).
+
+        Com series=True, `values` são as colunas dos candles e tudo vem como arrays por candle."""
+        ctx = self.graph.compute(values, series)
+        ctx['price'] = price
+        votes = {signal.flag: signal.score(ctx) for signal in self.signals}
+        stacked = np.array(list(votes.values()))
+        if self.params['STRATEGY_MODE'] == 'weighted':
+            combined = np.tensordot(self.weights, stacked, axes=1) / self.weights.sum()
+        else:
+            combined = (stacked > 0).mean(axis=0)
+        if self.params['TRADE_CRITERIA'] == 'fibonacci':
+            target = np.asarray(price, dtype=float) * (1 + self.params['ORDER_MARGIN'])
+        else:
+            target = np.asarray(ctx['resistance'], dtype=float)
+        buy = combined >= self.params['STRATEGY_THRESHOLD']
+        if self.ceiling:
+            buy = buy & (np.asarray(price, dtype=float) <= self.params['BUY_PRICE'])  # Veto, não só um voto contra
+        return buy, combined, target, votes, ctx
+## MONTA A ESTRATÉGIA COM OS SINAIS ATIVADOS NO CONFIG
+def build_strategy(params: Dict[str, Any], window: int = None) -> Strategy:
+    signals = [cls(params) for cls in STRATEGY_SIGNALS if params['SIGNALS'].get(cls.flag)]
+    if not signals:
+        # Nenhum sinal ativo (ex.: config sem as chaves): só o sinal do próprio TRADE_CRITERIA
+        flag = 'FIBONACCI' if params['TRADE_CRITERIA'] == 'fibonacci' else 'SUPPORT_RESISTANCE'
+        signals = [cls(params) for cls in STRATEGY_SIGNALS if cls.flag == flag]
+    return Strategy(signals, params, window)
+
+
+###################### MARKET DATA (STREAM) ######################
+
+
+## INTERFACE PLUGÁVEL DE FONTE DE DADOS DE MERCADO
+class MarketDataSource:
+    """Fonte de eventos por push: on_trade(price, timestamp_ms) e on_kline(kline, closed).
+
+    O kline segue o formato da API REST (lista de 12 campos). `finished` é sinalizado
+    quando a fonte não vai produzir mais eventos (ex.: fim de um replay)."""
+
+    def __init__(self):
+        self.finished = threading.Event()
+
+    def start(self, on_trade, on_kline):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+## FONTE BINANCE (WEBSOCKET)
+class BinanceStreamSource(MarketDataSource):
+    def __init__(self, api_key: str, api_secret: str, symbol: str, interval: str):
+        super().__init__()
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.symbol = symbol
+        self.interval = interval
+        self.twm = None
+        self.on_depth = None  # Com um callback, assina também o stream de profundidade (depthUpdate)
+
+    def start(self, on_trade, on_kline):
+        from binance import ThreadedWebsocketManager  # type: ignore
+
+        def handle(msg):
+            event = msg.get('e')
+            if event == 'trade':
+                on_trade(float(msg['p']), msg['T'])
+            elif event == 'kline':
+                k = msg['k']
+                on_kline([k['t'], k['o'], k['h'], k['l'], k['c'], k['v'], k['T'],
+                          k['q'], k['n'], k['V'], k['Q'], k['B']], k['x'])
+            elif event == 'depthUpdate':
+                self.on_depth(msg)
+            elif event == 'error':
+                logger.error("Erro no stream de mercado: %s", msg.get('m'))
+
+        self.twm = ThreadedWebsocketManager(api_key=self.api_key, api_secret=self.api_secret)
+        self.twm.start()
+        self.twm.start_trade_socket(callback=handle, symbol=self.symbol)
+        self.twm.start_kline_socket(callback=handle, symbol=self.symbol, interval=self.interval)
+        if self.on_depth is not None:
+            self.twm.start_depth_socket(callback=handle, symbol=self.symbol, interval=100)
+        logger.info("Stream de mercado iniciado para %s (%s).", self.symbol, self.interval)
+
+    def stop(self):
+        if self.twm is not None:
+            self.twm.stop()
+## FONTE DE REPLAY (CANDLES LOCAIS), PARA TESTES E SIMULAÇÃO
+class ReplaySource(MarketDataSource):
+    """Reproduz candles já fechados como klines + um trade no preço de fechamento."""
+
+    def __init__(self, klines: list, speed: float = 0.0):
+        super().__init__()
+        self.klines = klines
+        self.speed = speed  # Candles por segundo; 0 reproduz o mais rápido possível
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, on_trade, on_kline):
+        def run():
+            for kline in self.klines:
+                if self._stop.is_set():
+                    break
+                on_kline(kline, True)
+                on_trade(float(kline[4]), int(kline[6]))
+                if self.speed > 0:
+                    time.sleep(1 / self.speed)
+            self.finished.set()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+## CRIA A FONTE CONFIGURADA EM STREAM_SOURCE
+def create_market_source() -> MarketDataSource:
+    if STREAM_SOURCE == "replay":
+        klines = default_pair.candle_store.load_klines()
+        default_pair.candle_store.prime(klines[:STREAM_REPLAY_WARMUP])
+        return ReplaySource(klines[STREAM_REPLAY_WARMUP:], STREAM_REPLAY_SPEED)
+    return BinanceStreamSource(API_KEY, API_SECRET, default_pair.symbol, default_pair.interval)
+
+
+###################### BACKTEST ######################
+
+
+## PARÂMETROS DA ESTRATÉGIA A PARTIR DO CONFIG
+def get_strategy_params(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Mesmas conversões de unidade da seção de configurações (percentuais viram frações)."""
+    return {
+        "BUY_MIN": float(config["BUY_MIN"]),
+        "BUY_PRICE": float(config["BUY_PRICE"]),
+        "ORDER_MARGIN": float(config["ORDER_MARGIN"]) / 100,
+        "FIBONACCI_TOLERANCE": float(config["FIBONACCI_TOLERANCE"]) / 100,
+        "FIBONACCI_LEVELS": [float(level) for level in config.get("FIBONACCI_LEVELS", FIBONACCI_LEVELS)],
+        "FIBONACCI_MODE": config.get("FIBONACCI_MODE", "buy_price"),
+        "PERCENTAGE_TO_USE": float(config["PERCENTAGE_TO_USE"]) / 100,
+        "BALANCE_SAFE": float(config["BALANCE_SAFE"]),
+        "TRADE_CRITERIA": config.get("TRADE_CRITERIA", "fibonacci"),
+        "SIGNALS": {cls.flag: bool(config.get(cls.flag, False)) for cls in STRATEGY_SIGNALS},
+        "STRATEGY_MODE": config.get("STRATEGY_MODE", "weighted"),
+        "STRATEGY_WEIGHTS": {flag: float(weight) for flag, weight in config.get("STRATEGY_WEIGHTS", {}).items()},
+        "STRATEGY_THRESHOLD": float(config.get("STRATEGY_THRESHOLD", "0.5")),
+        "CANDLE_PATTERNS": list(config.get("CANDLE_PATTERNS", [])),
+        "RSI_PERIOD": int(config.get("RSI_PERIOD", "14")),
+        "RSI_OVERSOLD": float(config.get("RSI_OVERSOLD", "30")),
+        "RSI_OVERBOUGHT": float(config.get("RSI_OVERBOUGHT", "70")),
+    }
+## SUPORTE E RESISTÊNCIA DE CADA CANDLE DO BACKTEST
+def backtest_support_resistance(closes: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    import pandas as pd
+    rolling = pd.Series(closes).rolling(window, min_periods=1)
+    return rolling.min().to_numpy(), rolling.max().to_numpy()
+## SIMULA A ESTRATÉGIA SOBRE CANDLES HISTÓRICOS
+def run_backtest(candles: Dict[str, np.ndarray], params: Dict[str, Any], balance: float,
+                 maker_fee: float, taker_fee: float, window: int, step: int = 1) -> Tuple[Dict[str, float], list]:
+    """Reproduz os candles com relógio simulado usando as regras de compra/venda de trade().
+
+    Cada candle é um tick no preço de fechamento; a compra é avaliada a cada `step` candles
+    (o equivalente ao TIME_CHECK) e a venda em todo candle. Suporte e resistência usam os
+    últimos `window` fechamentos, como a janela do LOOKBACK. As taxas seguem
+    calcular_lucro_liquido e são liquidadas na venda. Retorna (estatísticas, linhas no
+    formato da tabela orders)."""
+    closes = candles['close'].tolist()  # Floats nativos são mais rápidos no laço
+    close_times = candles['close_time']
+    # Sinais de todos os candles de uma vez; indicadores já presentes em `candles` (ex.: compartilhados
+    # entre os processos da varredura) não são recalculados
+    buy_signals, _, targets, _, _ = build_strategy(params, window).evaluate(candles['close'], candles, series=True)
+    buy_signals, targets = buy_signals.tolist(), targets.tolist()
+
+    buy_min = params["BUY_MIN"]
+    balance_safe = params["BALANCE_SAFE"]
+    percentage_to_use = params["PERCENTAGE_TO_USE"]
+
+    def timestamp(ms) -> str:
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(int(ms) / 1000))
+
+    initial_balance = balance
+    open_heap = []  # (preço alvo, id, quantidade, preço de compra, data de compra)
+    waiting = []  # Ordens que atingiram o alvo mas ainda não são lucrativas após as taxas
+    rows = []
+    next_id = 1
+    open_quantity = 0.0
+    realized = 0.0
+    wins = 0
+    closed_trades = 0
+    peak = balance
+    max_drawdown = 0.0
+
+    for i, price in enumerate(closes):
+
+        # Vendas: só as ordens cujo alvo foi atingido (heap ordenado pelo preço alvo)
+        while open_heap and open_heap[0][0] <= price:
+            waiting.append(heapq.heappop(open_heap))
+        if waiting:
+            still_waiting = []
+            for order in waiting:
+                target_price, order_id, quantity, buy_price, date_buy = order
+                profit = calcular_lucro_liquido(buy_price, price, quantity, maker_fee, taker_fee)
+                if price < target_price:
+                    heapq.heappush(open_heap, order)
+                elif profit > 0:
+                    value_purchased = quantity * buy_price
+                    balance += value_purchased + profit
+                    open_quantity -= quantity
+                    realized += profit
+                    closed_trades += 1
+                    wins += 1
+                    rows.append((order_id, date_buy, quantity, buy_price, target_price, price, value_purchased,
+                                 quantity * price, profit, timestamp(close_times[i]), 'closed'))
+                else:
+                    still_waiting.append(order)
+            waiting = still_waiting
+
+        # Compras
+        if i % step == 0 and buy_signals[i]:
+            amount_to_use = get_amount_to_use(balance, balance_safe, percentage_to_use)
+            if amount_to_use >= buy_min:
+                quantity = amount_to_use / price
+                balance -= amount_to_use
+                open_quantity += quantity
+                heapq.heappush(open_heap, (targets[i], next_id, quantity, price, timestamp(close_times[i])))
+                next_id += 1
+
+        # Patrimônio marcado a mercado para o drawdown
+        equity = balance + open_quantity * price
+        if equity > peak:
+            peak = equity
+        elif peak > 0 and (peak - equity) / peak > max_drawdown:
+            max_drawdown = (peak - equity) / peak
+
+    open_quantity = 0.0
+    for target_price, order_id, quantity, buy_price, date_buy in open_heap + waiting:
+        open_quantity += quantity
+        rows.append((order_id, date_buy, quantity, buy_price, target_price, None, quantity * buy_price,
+                     None, None, None, 'open'))
+    rows.sort()
+    final_price = closes[-1] if closes else 0.0
+    stats = {
+        "candles": len(closes),
+        "trades": next_id - 1,
+        "closed_trades": closed_trades,
+        "win_rate": wins / closed_trades if closed_trades else 0.0,
+        "realized_pnl": realized,
+        "unrealized_value": open_quantity * final_price,
+        "final_balance": balance,
+        "pnl": balance + open_quantity * final_price - initial_balance,
+        "max_drawdown": max_drawdown,
+    }
+    return stats, rows
+## GRAVA AS ORDENS DO BACKTEST NO ESQUEMA DA TABELA orders
+def save_backtest_orders(rows: list, db_path: str):
+    conn, c = initialize_database(db_path)
+    c.execute('DELETE FROM orders')
+    c.executemany('''
+        INSERT INTO orders (id, date_buy, quantity, buy_price, target_price, sell_price, value_purchased, value_end, profit, date_sell, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+## CONVERTE UMA DATA (AAAA-MM-DD) EM MILISSEGUNDOS UTC
+def date_to_ms(value: str) -> int:
+    import pandas as pd
+    return int(pd.Timestamp(value, tz='UTC').timestamp() * 1000) if value else None
+## CARREGA OS CANDLES DO BACKTEST E CALCULA QUANTOS CANDLES EQUIVALEM AO TIME_CHECK
+def load_backtest_candles(args) -> Tuple[Dict[str, np.ndarray], int]:
+    store = CandleStore(SYMBOL, INTERVAL, archive_root=CANDLE_ARCHIVE_DIR)
+    if args.download:
+        store.download(initialize_client(API_KEY, API_SECRET), args.download)
+    start_ms, end_ms = date_to_ms(args.start), date_to_ms(args.end)
+    candles = store.archive.load(start_ms, end_ms)
+    if not len(candles['close']):
+        # Candles só no candles.db (baixados antes do arquivo colunar): exporta uma vez
+        candles = store.load_arrays(start_ms, end_ms)
+        if len(candles['close']):
+            store.archive.write(candles)
+    if not len(candles['close']):
+        logger.error("Nenhum candle de %s (%s) em %s para o período informado.", SYMBOL, INTERVAL, store.db_path)
+        return candles, 1
+    candle_ms = int(np.median(candles['close_time'] - candles['open_time'])) + 1
+    return candles, max(1, round(TIME_CHECK * 1000 / candle_ms))
+## EXECUTA O MODO BACKTEST (LINHA DE COMANDO)
+def backtest_main(args):
+    candles, step = load_backtest_candles(args)
+    if not len(candles['close']):
+        return
+    params = get_strategy_params(config)
+
+    started = time.perf_counter()
+    stats, rows = run_backtest(candles, params, BACKTEST_BALANCE, BACKTEST_MAKER_FEE, BACKTEST_TAKER_FEE,
+                               BACKTEST_WINDOW, step)
+    elapsed = time.perf_counter() - started
+    save_backtest_orders(rows, args.output)
+
+    logger.info("Backtest de %s: %s candles em %.2fs (%.0f candles/min).", SYMBOL, stats['candles'], elapsed,
+                stats['candles'] / max(elapsed, 1e-9) * 60)
+    logger.info("Compras: %s, vendas: %s, lucro realizado: R$%.2f, PnL total: R$%.2f, drawdown máximo: %.2f%%",
+                stats['trades'], stats['closed_trades'], stats['realized_pnl'], stats['pnl'], stats['max_drawdown'] * 100)
+    logger.info("Ordens do backtest gravadas em %s.", args.output)
+
+
+###################### VARREDURA DE PARÂMETROS ######################
+
+
+SWEEP_COLUMNS = ('open', 'high', 'low', 'close', 'close_time')
+_sweep_state = {}  # Estado de cada processo da varredura (memória compartilhada e argumentos)
+## INICIALIZA UM PROCESSO DA VARREDURA: ANEXA OS CANDLES DA MEMÓRIA COMPARTILHADA
+def _sweep_worker_init(shm_name: str, columns: tuple, length: int, backtest_args: tuple, base_config: Dict[str, Any]):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    data = np.ndarray((len(columns), length), dtype=np.float64, buffer=shm.buf)
+    _sweep_state['shm'] = shm  # Mantém a referência enquanto o processo viver
+    _sweep_state['candles'] = {name: data[i] for i, name in enumerate(columns)}
+    _sweep_state['args'] = backtest_args
+    _sweep_state['config'] = base_config  # Processos criados por spawn não carregam o config.json
+## AVALIA UMA COMBINAÇÃO DE PARÂMETROS
+def _sweep_worker(overrides: Dict[str, Any]) -> Dict[str, Any]:
+    params = get_strategy_params(dict(_sweep_state['config'], **overrides))
+    stats, _ = run_backtest(_sweep_state['candles'], params, *_sweep_state['args'])
+    return dict(overrides, **stats)
+## MONTA AS COMBINAÇÕES DA GRADE (TODAS OU UMA AMOSTRA ALEATÓRIA)
+def build_sweep_grid(grid: Dict[str, list], samples: int = 0, seed: int = None) -> list:
+    keys = list(grid)
+    sizes = [len(grid[key]) for key in keys]
+    total = math.prod(sizes)
+    if not samples or samples >= total:
+        return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+    # Amostra índices do produto cartesiano sem materializá-lo
+    combos = []
+    for index in random.Random(seed).sample(range(total), samples):
+        combo = {}
+        for key, size in zip(reversed(keys), reversed(sizes)):
+            index, position = divmod(index, size)
+            combo[key] = grid[key][position]
+        combos.append({key: combo[key] for key in keys})
+    return combos
+## INDICADORES QUE NÃO DEPENDEM DOS PARÂMETROS VARRIDOS (CALCULADOS UMA VEZ PARA TODAS AS COMBINAÇÕES)
+def shared_indicators(candles: Dict[str, np.ndarray], params: Dict[str, Any], window: int, swept: set) -> Dict[str, np.ndarray]:
+    outputs = [name for node in INDICATOR_NODES for name in node.outputs]
+    graph = IndicatorGraph(outputs, dict(params, WINDOW=window))
+    values = graph.compute({name: candles[name] for name in SWEEP_COLUMNS})
+    return {name: np.asarray(values[name], dtype=float) for name in outputs
+            if not graph.param_deps[name] & swept and np.ndim(values[name]) == 1}
+## EXECUTA A VARREDURA EM PARALELO
+def run_parameter_sweep(candles: Dict[str, np.ndarray], combos: list, balance: float, maker_fee: float,
+                        taker_fee: float, window: int, step: int = 1, processes: int = None) -> pd.DataFrame:
+    """Avalia cada combinação com run_backtest num pool de processos.
+
+    Os candles e os indicadores que não dependem dos parâmetros varridos (calculados uma única
+    vez) ficam num bloco de memória compartilhada; cada processo só recebe o nome do bloco, não
+    uma cópia serializada dos arrays. Retorna a tabela ordenada por PnL e drawdown."""
+    import pandas as pd
+    length = len(candles['close'])
+    swept = set().union(*combos) if combos else set()
+    columns = dict({name: candles[name] for name in SWEEP_COLUMNS},
+                   **shared_indicators(candles, get_strategy_params(config), window, swept))
+    shm = shared_memory.SharedMemory(create=True, size=len(columns) * length * 8)
+    try:
+        data = np.ndarray((len(columns), length), dtype=np.float64, buffer=shm.buf)
+        for row, values in enumerate(columns.values()):
+            data[row] = values
+        del data  # Libera o buffer antes de fechar o bloco
+        backtest_args = (balance, maker_fee, taker_fee, window, step)
+        initargs = (shm.name, tuple(columns), length, backtest_args, config)
+        with Pool(processes, initializer=_sweep_worker_init, initargs=initargs) as pool:
+            results = list(pool.imap_unordered(_sweep_worker, combos))
+    finally:
+        shm.close()
+        shm.unlink()
+    table = pd.DataFrame(results)
+    if not table.empty:
+        table = table.sort_values(['pnl', 'max_drawdown'], ascending=[False, True]).reset_index(drop=True)
+    return table
+## EXECUTA O MODO SWEEP (LINHA DE COMANDO)
+def sweep_main(args):
+    candles, step = load_backtest_candles(args)
+    if not len(candles['close']):
+        return
+    grid = load_config(args.grid) if args.grid else config.get("SWEEP_GRID", {})
+    if not grid:
+        logger.error("Nenhuma grade de parâmetros informada (--grid ou SWEEP_GRID no config.json).")
+        return
+    combos = build_sweep_grid(grid, args.samples, args.seed)
+
+    started = time.perf_counter()
+    table = run_parameter_sweep(candles, combos, BACKTEST_BALANCE, BACKTEST_MAKER_FEE, BACKTEST_TAKER_FEE,
+                                BACKTEST_WINDOW, step, args.processes)
+    elapsed = time.perf_counter() - started
+    table.to_csv(args.output, index=False)
+
+    logger.info("Varredura de %s combinações sobre %s candles em %.2fs.", len(combos), len(candles['close']), elapsed)
+    columns = list(grid) + ['pnl', 'max_drawdown', 'trades', 'closed_trades', 'win_rate']
+    if logger.isEnabledFor(logging.INFO):  # to_string() só é montado se a tabela for para o log
+        logger.info("Melhores combinações:\n%s", table[columns].head(args.top).to_string())
+    logger.info("Tabela completa gravada em %s.", args.output)
+
+
+###################### ANALYTICS ######################
+
+
+last_prices: Dict[str, float] = {}  # Último preço visto por símbolo (PnL não realizado nas métricas)
+## RELATÓRIOS DE CARTEIRA SOBRE OS AGREGADOS DO ORDERS.DB
+class PortfolioAnalytics:
+    """Lê os agregados pnl_daily e pnl_symbol que o OrderRepository mantém a cada compra e fechamento.
+
+    A conexão é somente leitura: com o orders.db em WAL o relatório lê um snapshot consistente
+    sem bloquear as gravações do bot, e nenhuma consulta varre a tabela orders."""
+
+    def __init__(self, db_path: str = 'orders.db'):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, check_same_thread=False)
+
+    def schema_version(self) -> int:
+        return self.conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def positions(self, symbol: str = None) -> pd.DataFrame:
+        import pandas as pd
+        query = 'SELECT * FROM pnl_symbol' + (' WHERE symbol = ?' if symbol else '') + ' ORDER BY symbol'
+        return pd.read_sql_query(query, self.conn, params=[symbol] if symbol else None)
+
+    def daily(self, start: str = None, end: str = None, symbol: str = None) -> pd.DataFrame:
+        """Agregados diários (AAAA-MM-DD) somados entre os símbolos, ou só de `symbol`."""
+        import pandas as pd
+        conditions, params = [], []
+        for clause, value in (('day >= ?', start), ('day <= ?', end), ('symbol = ?', symbol)):
+            if value:
+                conditions.append(clause)
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return pd.read_sql_query(f'''
+            SELECT day, SUM(buys) AS buys, SUM(buy_value) AS buy_value, SUM(sells) AS sells,
+                   SUM(sell_value) AS sell_value, SUM(realized_pnl) AS realized_pnl, SUM(wins) AS wins,
+                   SUM(losses) AS losses
+            FROM pnl_daily {where} GROUP BY day ORDER BY day
+        ''', self.conn, params=params)
+
+    def report(self, prices: Dict[str, float], start: str = None, end: str = None,
+               symbol: str = None) -> Tuple[Dict[str, float], pd.DataFrame, pd.DataFrame]:
+        """Resumo da carteira, posição por símbolo marcada a mercado com `prices` e série diária.
+
+        O drawdown do resumo é o da curva de lucro realizado acumulado dia a dia no período."""
+        positions = self.positions(symbol)
+        positions['price'] = positions['symbol'].map(prices)
+        positions['unrealized_pnl'] = positions['open_quantity'] * positions['price'] - positions['open_cost']
+        daily = self.daily(start, end, symbol)
+        curve = daily['realized_pnl'].to_numpy(dtype=float).cumsum()
+        peak = np.maximum.accumulate(np.maximum(curve, 0.0))
+        closed = int(positions['closed_orders'].sum())
+        summary = {
+            'realized_pnl': float(positions['realized_pnl'].sum()),
+            'unrealized_pnl': float(positions['unrealized_pnl'].sum()),
+            'exposure': float(positions['open_cost'].sum()),
+            'open_orders': int(positions['open_orders'].sum()),
+            'closed_orders': closed,
+            'win_rate': float(positions['wins'].sum()) / closed if closed else 0.0,
+            'period_pnl': float(curve[-1]) if len(curve) else 0.0,
+            'period_drawdown': float((peak - curve).max()) if len(curve) else 0.0,
+        }
+        return summary, positions, daily
+
+    def close(self):
+        self.conn.close()
+## ÚLTIMO FECHAMENTO DE CADA SÍMBOLO NO CANDLES.DB (PREÇO PARA O PNL NÃO REALIZADO DO RELATÓRIO)
+def cached_prices(symbols: list, interval: str, db_path: str = 'candles.db') -> Dict[str, float]:
+    if not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        prices = {}
+        for symbol in symbols:
+            row = conn.execute('SELECT close FROM klines WHERE symbol = ? AND interval = ? ORDER BY open_time DESC LIMIT 1',
+                               (symbol, interval)).fetchone()
+            if row:
+                prices[symbol] = row[0]
+        return prices
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+## EXECUTA O MODO REPORT (LINHA DE COMANDO)
+def report_main(args):
+    if not os.path.exists(args.db):
+        logger.error("Banco de ordens %s não encontrado.", args.db)
+        return
+    analytics = PortfolioAnalytics(args.db)
+    if analytics.schema_version() < len(ORDERS_MIGRATIONS):
+        # Banco de uma versão anterior: a migração cria e preenche os agregados uma única vez
+        analytics.close()
+        OrderRepository(args.db, default_symbol=SYMBOL).close()
+        analytics = PortfolioAnalytics(args.db)
+    try:
+        started = time.perf_counter()
+        positions = analytics.positions(args.symbol)
+        prices = cached_prices(list(positions['symbol']), INTERVAL)
+        start = time.strftime('%Y-%m-%d', time.localtime(time.time() - args.days * 86400)) if args.days else None
+        summary, positions, daily = analytics.report(prices, start=start, symbol=args.symbol)
+        elapsed = time.perf_counter() - started
+    finally:
+        analytics.close()
+
+    logger.info("Relatório de %s em %.1fms.", args.db, elapsed * 1000)
+    logger.info("Lucro realizado: R$%.2f | Não realizado: R$%.2f | Exposição: R$%.2f | Ordens abertas: %s | "
+                "Fechadas: %s | Taxa de acerto: %.1f%%", summary['realized_pnl'], summary['unrealized_pnl'],
+                summary['exposure'], summary['open_orders'], summary['closed_orders'], summary['win_rate'] * 100)
+    logger.info("Lucro no período: R$%.2f | Drawdown no período: R$%.2f", summary['period_pnl'],
+                summary['period_drawdown'])
+    if not logger.isEnabledFor(logging.INFO):  # As tabelas só são montadas se forem para o log
+        return
+    if not positions.empty:
+        logger.info("Por símbolo:\n%s", positions.to_string(index=False))
+    if not daily.empty:
+        logger.info("Por dia:\n%s", daily.to_string(index=False))
+
+
+###################### MULTI-SÍMBOLO ######################
+
+
+## PAR NEGOCIADO: PARÂMETROS E ESTADO DE UM SÍMBOLO
+class TradingPair:
+    """Parâmetros da estratégia, cache de candles e indicadores de um símbolo.
+
+    `pair_config` é o config.json com as chaves específicas do símbolo sobrepostas."""
+
+    def __init__(self, pair_config: Dict[str, Any], total_fees: float = None):
+        self.symbol = pair_config["SYMBOL"]
+        self.asset = pair_config.get("MOEDA", "BRL")
+        self.interval = pair_config.get("INTERVAL", "")
+        self.lookback = pair_config.get("LOOKBACK", "")
+        self.candle_store = CandleStore(self.symbol, self.interval, archive_root=CANDLE_ARCHIVE_DIR,
+                                        lookback=self.lookback)
+        self.params = None
+        self.indicator_engine = None
+        self.configure(pair_config, total_fees)
+
+    def configure(self, pair_config: Dict[str, Any], total_fees: float = None):
+        """Aplica os parâmetros da estratégia (também na recarga do config). O IndicatorEngine só é
+        recriado quando o período do RSI ou os padrões de vela mudam, senão mantém o estado."""
+        params = get_strategy_params(pair_config)
+        if total_fees is not None:
+            params["ORDER_MARGIN"] = adjust_order_margin(params["ORDER_MARGIN"], total_fees)
+        strategy = build_strategy(params)
+        engine_key = (params["RSI_PERIOD"], params["CANDLE_PATTERNS"])
+        if self.params is None or engine_key != (self.params["RSI_PERIOD"], self.params["CANDLE_PATTERNS"]):
+            self.indicator_engine = IndicatorEngine(rsi_period=params["RSI_PERIOD"],
+                                                    patterns=params["CANDLE_PATTERNS"] or None)
+        self.simulation_price = float(pair_config["SIMULATION_PRICE"])
+        self.params = params
+        self.strategy = strategy
+## CONFIG DE CADA PAR: A LISTA SYMBOLS DO CONFIG OU APENAS O SYMBOL, SOBRE AS CHAVES GLOBAIS
+def build_pair_configs(config: Dict[str, Any]) -> list:
+    pair_configs = []
+    for entry in config.get("SYMBOLS") or [{}]:
+        if isinstance(entry, str):
+            entry = {"SYMBOL": entry}
+        pair_configs.append(dict(config, **entry))
+    return pair_configs
+## MONTA OS PARES
+def build_trading_pairs(config: Dict[str, Any], total_fees: float) -> list:
+    return [TradingPair(pair_config, total_fees) for pair_config in build_pair_configs(config)]
+## GARANTE QUE A MARGEM DA ORDEM COBRE AS TAXAS
+def adjust_order_margin(order_margin: float, total_fees: float) -> float:
+    if order_margin <= total_fees:
+        logger.warning("ORDER_MARGIN (%.2f%%) é menor ou igual às taxas totais (%.4f%%). Ajustando para garantir lucro.", order_margin * 100, total_fees * 100)
+        order_margin = total_fees + 0.01  # Adiciona 1% acima das taxas para garantir lucro
+        logger.info("ORDER_MARGIN ajustado para: %.2f%%", order_margin * 100)
+    return order_margin
+## CICLO DE UM PAR NO ESCALONADOR
+async def run_pair_cycle(pair: TradingPair):
+    # trade() faz chamadas bloqueantes à API: roda numa thread do executor (o peso é
+    # descontado do orçamento do RateLimitedClient dentro da própria thread)
+    await asyncio.to_thread(trade, None, True, pair, TIME_CHECK)
+## ESCALONADOR MULTI-SÍMBOLO (ASYNCIO)
+async def run_symbols(pairs: list, queue):
+    """Executa trade() de todos os pares em paralelo a cada TIME_CHECK.
+
+    Os saldos são lidos numa única get_account() por ciclo e todos os pares consomem o
+    mesmo RequestBudget do cliente, então o tempo do ciclo não cresce linearmente com os pares.
+    As compras dos pares de uma mesma moeda cotada dividem o saldo pelo quote_budget."""
+    from binance.exceptions import BinanceAPIException
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=min(32, len(pairs) + 1)))
+
+    async def backfill(pair):
+        try:
+            await asyncio.to_thread(pair.candle_store.backfill, client)
+        except BinanceAPIException as e:
+            logger.error("Erro no backfill de candles de %s: %s", pair.symbol, e)
+
+    await asyncio.gather(*(backfill(pair) for pair in pairs))
+
+    # Os comandos de controle (de outras threads ou de sinais) acordam a espera entre os ciclos
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    listener = lambda: loop.call_soon_threadsafe(wake.set)
+    control.subscribe(listener)
+    try:
+        await _schedule_symbols(pairs, queue, wake)
+    finally:
+        control.unsubscribe(listener)
+## CICLOS DO ESCALONADOR ATÉ O ENCERRAMENTO
+async def _schedule_symbols(pairs: list, queue, wake: asyncio.Event):
+    from binance.exceptions import BinanceAPIException
+    next_cycle = time.monotonic()
+    while not control.draining:
+        if control.take_reload():
+            reload_config(config_file_path)
+        started = time.monotonic()
+        if not control.paused and started >= next_cycle:
+            # Novo ciclo: o saldo (real ou simulado) é lido de novo e dividido entre os pares
+            quote_budget.reset()
+            if not SIMULATION_MODE:
+                try:
+                    await asyncio.to_thread(refresh_balances)
+                except BinanceAPIException as e:
+                    logger.error("Erro ao obter saldos: %s", e)
+            results = await asyncio.gather(*(run_pair_cycle(pair) for pair in pairs), return_exceptions=True)
+            for pair, result in zip(pairs, results):
+                if isinstance(result, Exception):
+                    logger.error("Erro no ciclo de %s: %s", pair.symbol, result)
+            send_chart_update(queue, pairs[0])
+            logger.info("Ciclo de %s pares concluído em %.2fs.", len(pairs), time.monotonic() - started)
+            next_cycle = started + TIME_CHECK
+
+        # Aguarda o próximo ciclo ou um comando de controle (pausado, só o comando acorda)
+        wake.clear()
+        if control.draining or control.reload_pending:
+            continue
+        timeout = None if control.paused else next_cycle - time.monotonic()
+        if timeout is None or timeout > 0:
+            try:
+                await asyncio.wait_for(wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+###################### CONTROLE ######################
+
+
+## CONFIGURAÇÕES QUE SÓ MUDAM AO REINICIAR (CONEXÕES, STREAMS E PARES JÁ CRIADOS)
+RESTART_SETTINGS = ("API_KEY", "API_SECRET", "API_BASE_URL", "SYMBOL", "INTERVAL", "LOOKBACK", "STREAM_MODE",
+                    "STREAM_SOURCE", "REQUEST_WEIGHT_LIMIT", "API_MAX_RETRIES", "API_BACKOFF_BASE", "METRICS_PORT",
+                    "METRICS_HOST", "PROFILER_INTERVAL", "CONTROL_PORT", "CONTROL_HOST", "CONTROL_TOKEN",
+                    "CONTROL_HOTKEY", "CANDLE_ARCHIVE_DIR")
+## ESTADO DE CONTROLE DO BOT (PAUSA, RECARGA DO CONFIG E DRENAGEM)
+class BotControl:
+    """Estado compartilhado pelo loop, pela API de controle, pelos sinais e pela tecla ESC.
+
+    Os comandos só alteram o estado e acordam o loop (wake e os `listeners` registrados por
+    ele); quem aplica a recarga e encerra é o próprio loop, entre dois ciclos de trade(), então
+    uma ordem em andamento sempre termina antes."""
+
+    def __init__(self):
+        self.lock = threading.RLock()  # Reentrante: os sinais rodam na thread principal a qualquer momento
+        self.paused = False
+        self.draining = False
+        self.reload_pending = False
+        self.wake = threading.Event()
+        self.listeners = []
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def _notify(self):
+        self.wake.set()
+        for listener in list(self.listeners):
+            listener()
+
+    def pause(self) -> Dict[str, bool]:
+        with self.lock:
+            if not self.paused:
+                self.paused = True
+                logger.info("Programa pausado.")
+                self._notify()
+            return self.status()
+
+    def resume(self) -> Dict[str, bool]:
+        with self.lock:
+            if self.paused:
+                self.paused = False
+                logger.info("Programa retomado.")
+                self._notify()
+            return self.status()
+
+    def toggle(self) -> Dict[str, bool]:
+        with self.lock:
+            return self.resume() if self.paused else self.pause()
+
+    def request_reload(self) -> Dict[str, bool]:
+        with self.lock:
+            self.reload_pending = True
+            logger.info("Recarga do config solicitada.")
+            self._notify()
+            return self.status()
+
+    def drain(self) -> Dict[str, bool]:
+        with self.lock:
+            if not self.draining:
+                self.draining = True
+                logger.info("Encerramento solicitado: concluindo o ciclo em andamento.")
+                self._notify()
+            return self.status()
+
+    def take_reload(self) -> bool:
+        with self.lock:
+            pending, self.reload_pending = self.reload_pending, False
+            return pending
+
+    def wait(self, timeout: float = None):
+        """Bloqueia até um comando ou até `timeout`; o estado deve ser conferido de novo em seguida."""
+        self.wake.wait(timeout)
+        self.wake.clear()
+
+    def status(self) -> Dict[str, bool]:
+        with self.lock:
+            return {'paused': self.paused, 'draining': self.draining, 'reload_pending': self.reload_pending}
+## API LOCAL DE CONTROLE: GET /status E POST /pause, /resume, /toggle, /reload, /drain
+class ControlHandler(BaseHTTPRequestHandler):
+    control: BotControl = None
+    token: str = ''
+    actions = {'/pause': 'pause', '/resume': 'resume', '/toggle': 'toggle', '/reload': 'request_reload',
+               '/drain': 'drain'}
+
+    def _reply(self, code: int, body: Dict[str, Any]):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _authorized(self) -> bool:
+        if not self.token or hmac.compare_digest(self.headers.get('X-Control-Token', ''), self.token):
+            return True
+        self._reply(401, {'error': 'token inválido'})
+        return False
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/status':
+            self._reply(404, {'error': 'rota desconhecida'})
+        elif self._authorized():
+            self._reply(200, self.control.status())
+
+    def do_POST(self):
+        action = self.actions.get(self.path.split('?')[0])
+        if action is None:
+            self._reply(404, {'error': 'rota desconhecida'})
+        elif self._authorized():
+            self._reply(200, getattr(self.control, action)())
+
+    def log_message(self, format, *args):
+        pass  # Cada comando já é registrado pelo BotControl
+## INICIA A API DE CONTROLE NUMA THREAD DAEMON
+def start_control_server(host: str, port: int, control: BotControl, token: str = '') -> ThreadingHTTPServer:
+    handler = type('BoundControlHandler', (ControlHandler,), {'control': control, 'token': token})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="control-server", daemon=True).start()
+    logger.info("Controle disponível em http://%s:%s (/status, /pause, /resume, /reload, /drain)", host,
+                server.server_port)
+    return server
+## SINAIS: SIGHUP RECARREGA, SIGUSR1 PAUSA/RETOMA, SIGTERM E SIGINT ENCERRAM APÓS O CICLO ATUAL
+def install_signal_handlers(control: BotControl):
+    def on_stop(signum, frame):
+        if control.draining:
+            raise KeyboardInterrupt  # Segundo Ctrl+C: encerra sem esperar o ciclo
+        control.drain()
+
+    handlers = {'SIGTERM': on_stop, 'SIGINT': on_stop,
+                'SIGHUP': lambda signum, frame: control.request_reload(),
+                'SIGUSR1': lambda signum, frame: control.toggle()}
+    for name, handler in handlers.items():
+        if hasattr(signal, name):  # SIGHUP e SIGUSR1 não existem no Windows
+            signal.signal(getattr(signal, name), handler)
+## TECLA ESC (OPCIONAL): O MÓDULO keyboard PRECISA DE ROOT OU DE UM CONSOLE REAL NO LINUX
+def enable_hotkey(control: BotControl):
+    try:
+        import keyboard  # Importado só quando a tecla está habilitada
+        hotkey = keyboard.add_hotkey('esc', control.toggle)
+    except Exception as e:
+        logger.warning("Tecla ESC indisponível (%s); use a API de controle ou os sinais.", e)
+        return None
+    logger.info("Pressione ESC para pausar ou retomar.")
+    return lambda: keyboard.remove_hotkey(hotkey)
+## RECARREGA O CONFIG.JSON SEM REINICIAR (CHAMADO PELO LOOP ENTRE DOIS CICLOS)
+def reload_config(config_file: str) -> bool:
+    """Reaplica as configurações, os parâmetros de cada par e o modo de execução.
+
+    As chaves de RESTART_SETTINGS mantêm o valor em uso (com um aviso se mudaram) e um
+    config inválido é descartado inteiro, sem alterar nada."""
+    global ORDER_MARGIN
+    previous = config
+    try:
+        cfg = load_config(config_file)
+        changed = [key for key in RESTART_SETTINGS if cfg.get(key) != previous.get(key)]
+        cfg = {key: value for key, value in cfg.items() if key not in RESTART_SETTINGS}
+        cfg.update({key: previous[key] for key in RESTART_SETTINGS if key in previous})
+        load_settings(cfg)
+        validate_settings()
+        pair_configs = {pair_config["SYMBOL"]: pair_config for pair_config in build_pair_configs(cfg)}
+        for pair_config in pair_configs.values():
+            build_strategy(get_strategy_params(pair_config))  # Valida antes de alterar qualquer par
+        risk_limits = build_risk_limits(cfg)
+        execution_engine.configure(EXECUTION_MODE, EXECUTION_MAX_SLIPPAGE, EXECUTION_LIMIT_TIMEOUT,
+                                   EXECUTION_BOOK_DEPTH, EXECUTION_BOOK_MAX_AGE)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.error("Config não recarregado, mantendo o anterior: %s", e)
+        load_settings(previous)
+        ORDER_MARGIN = adjust_order_margin(ORDER_MARGIN, sum(fee_provider.get()))
+        return False
+    total_fees = sum(fee_provider.get())
+    ORDER_MARGIN = adjust_order_margin(ORDER_MARGIN, total_fees)
+    for pair in trading_pairs:
+        if pair.symbol in pair_configs:
+            pair.configure(pair_configs[pair.symbol], total_fees)
+        else:
+            changed.append(f"SYMBOLS ({pair.symbol})")
+    if risk_engine is not None:
+        risk_engine.configure(risk_limits, RISK_MAX_EXPOSURE, RISK_MAX_DAILY_LOSS, RISK_MAX_ORDERS_PER_MINUTE)
+    fee_provider.ttl = FEE_CACHE_TTL
+    level = logging.getLevelName(str(cfg.get("LOG_LEVEL", "INFO")).upper())
+    logger.setLevel(level if isinstance(level, int) else logging.INFO)
+    if changed:
+        logger.warning("Alterações que só valem após reiniciar o bot: %s", ', '.join(changed))
+    logger.info("Config recarregado de %s.", config_file)
+    return True
+
+
+###################### LOOP ######################
+
+
+## FUNÇÃO PRINCIPAL DE NEGOCIAÇÃO
+def trade(current_price: float = None, evaluate_buy: bool = True, pair: "TradingPair" = None,
+          balance_max_age: float = None):
+    """Avalia compra e venda de um par (por padrão o SYMBOL do config).
+
+    Sem current_price, busca preço e candles via REST (modo polling); com current_price
+    (modo stream) os candles já chegam por push e o saldo fica em cache por TIME_CHECK."""
+    from binance.exceptions import BinanceAPIException
+    pair = pair or default_pair
+    cycle_started = time.perf_counter()
+    try: 
+        params = pair.params
+        streamed = current_price is not None
+        if balance_max_age is None:
+            balance_max_age = TIME_CHECK if streamed else 0
+        # Obter o preço atual
+        if SIMULATION_MODE:
+            if not streamed:
+                current_price = pair.simulation_price
+            logger.info("Preço simulado do %s: R$%.2f", pair.symbol, current_price)
+        elif not streamed:
+            with metrics.timer(STAGE_METRIC, stage='price_fetch', symbol=pair.symbol):
+                current_price = get_symbol_price(pair.symbol)
+            logger.info("Preço atual do %s: R$%.2f", pair.symbol, current_price)
+        last_prices[pair.symbol] = current_price
+
+        # Sem espaço nos limites de risco a compra nem é avaliada (nenhuma chamada de saldo ou candles)
+        blocked = risk_engine.blocked(pair.symbol, current_price) if evaluate_buy and risk_engine is not None else None
+        if blocked:
+            logger.info("Compras de %s suspensas pelo controle de risco (%s).", pair.symbol, blocked)
+            evaluate_buy = False
+
+        if evaluate_buy:
+            # Obter o saldo
+            if SIMULATION_MODE:
+                balance = SIMULATION_BALANCE
+                logger.info("Saldo simulado disponível: R$%.2f", balance)
+            else:
+                with metrics.timer(STAGE_METRIC, stage='balance_fetch', symbol=pair.symbol):
+                    balance = get_available_balance(max_age=balance_max_age, asset=pair.asset)
+                logger.info("Saldo disponível: R$%.2f", balance)
+
+            # Obter dados históricos para calcular suporte e resistência (somente candles novos)
+            if not streamed:
+                try:
+                    with metrics.timer(STAGE_METRIC, stage='klines_fetch', symbol=pair.symbol):
+                        pair.candle_store.update(client)
+                except BinanceAPIException as e:
+                    logger.error("Erro ao atualizar candles, usando o cache: %s", e)
+            df = pair.candle_store.df  # Somente leitura, evita copiar a janela
+            if df.empty:
+                logger.error("Não foi possível obter dados históricos para calcular suporte e resistência.")
+                return
+
+            # Indicadores (estado incremental, só os candles novos são processados) e sinais da estratégia
+            with metrics.timer(STAGE_METRIC, stage='indicators', symbol=pair.symbol):
+                pair.indicator_engine.sync(df)
+                indicadores = pair.indicator_engine.values(float(df['close'].iloc[-1]))
+                # Padrões de vela usam o último candle fechado (o último do DataFrame pode estar em aberto)
+                last_closed = df.iloc[-2] if len(df) > 1 else df.iloc[-1]
+                indicadores.update(open=last_closed['open'], high=last_closed['high'], low=last_closed['low'],
+                                   close=last_closed['close'])
+                comprar, pontuacao, target_price, votos, contexto = pair.strategy.evaluate(current_price, indicadores)
+            suporte, resistencia = indicadores['support'], indicadores['resistance']
+            logger.info("Suporte: R$%.2f, Resistência: R$%.2f", suporte, resistencia)
+            if 'fibonacci_levels' in contexto:
+                logger.info("Níveis de Fibonacci: %s", contexto['fibonacci_levels'].round(2).tolist())
+            logger.info("Sinais: %s, pontuação %.2f (mínimo %.2f, %s).", {flag: int(vote) for flag, vote in votos.items()},
+                        pontuacao, params['STRATEGY_THRESHOLD'], params['STRATEGY_MODE'])
+
+            # Definir o valor a ser usado na compra; o saldo é dividido com os pares da mesma moeda
+            # que compram no mesmo ciclo (a reserva vale até a compra ser registrada)
+            with quote_budget.reserve(pair.asset, balance, params["BALANCE_SAFE"], params["PERCENTAGE_TO_USE"]) as amount_to_use:
+                # Verificar se o valor a ser usado é suficiente para a compra mínima
+                if amount_to_use < params["BUY_MIN"]:
+                    logger.info("Ignorando a compra R$%.2f abaixo do mínimo R$%.2f.", amount_to_use, params['BUY_MIN'])
+                    logger.info("-----------------------------------------------------------------------------------")
+                else:
+                    # Calcular a quantidade a ser comprada
+                    quantity_to_buy = amount_to_use / current_price
+                    buy_price = current_price
+
+                    logger.info("Valor da compra: R$%.2f", amount_to_use)
+                    logger.info("Quantidade de %s a ser comprada: %s", pair.symbol, quantity_to_buy)
+
+                    # Decisão da estratégia (a mesma usada pelo backtest)
+                    target_price = float(target_price)
+                    logger.info("Preço alvo calculado: %.2f", target_price)
+
+                    if comprar:
+                        logger.info("Preço atual (%.2f) atende aos sinais da estratégia (suporte: %.2f).", current_price, suporte)
+                        logger.info("-----------------------------------------------------------------------------------")
+                        # Limites de exposição checados em memória; a quantidade pode ser reduzida para caber
+                        reservation = (risk_engine.reserve(pair.symbol, quantity_to_buy, buy_price, params["BUY_MIN"])
+                                       if risk_engine is not None else nullcontext(quantity_to_buy))
+                        with reservation as quantity_to_buy:
+                            if quantity_to_buy <= 0:
+                                logger.info("Compra de %s bloqueada pelo controle de risco.", pair.symbol)
+                            elif SIMULATION_MODE:
+                                logger.info("Modo de simulação ativado. Comprando Bitcoin...")
+                                with metrics.timer(STAGE_METRIC, stage='db_write', symbol=pair.symbol):
+                                    insert_order(time.strftime('%Y-%m-%d %H:%M:%S'), quantity_to_buy, buy_price, target_price, pair.symbol)
+                                quote_budget.spend(pair.asset, quantity_to_buy * buy_price)
+                                metrics.inc('tradingbot_orders_total', side='buy', symbol=pair.symbol)
+                                logger.info("[SIMULATED BUY] Compra simulada registrada: Quantidade: %s %s a R$%.2f", quantity_to_buy, pair.symbol, buy_price)
+                                logger.info("-----------------------------------------------------------------------------------")
+                            else:
+                                logger.info("Comprando Bitcoin...")
+                                # Quantidade ajustada ao LOT_SIZE; ordens abaixo dos mínimos da exchange nem são enviadas
+                                quantity_to_buy = execution_engine.prepare(pair.symbol, quantity_to_buy, buy_price)
+                                if quantity_to_buy > 0:
+                                    # A intenção vai para o diário antes da ordem; se o processo cair depois do envio,
+                                    # a compra é recuperada por reconcile_orders() na próxima inicialização
+                                    client_order_id = order_repository.begin_intent('BUY', pair.symbol, quantity_to_buy, buy_price, target_price)
+                                    with metrics.timer(STAGE_METRIC, stage='order_placement', symbol=pair.symbol):
+                                        executed, fill_price, order = execution_engine.execute('BUY', pair.symbol, quantity_to_buy,
+                                                                                               client_order_id)
+                                    # O gasto conta no orçamento até a próxima leitura do saldo (que já o inclui)
+                                    quote_budget.spend(pair.asset, executed * fill_price)
+                                    invalidate_balance_cache()
+                                    if executed > 0:
+                                        # Registra o que foi executado de fato, não a cotação usada na decisão
+                                        with metrics.timer(STAGE_METRIC, stage='db_write', symbol=pair.symbol):
+                                            insert_order(time.strftime('%Y-%m-%d %H:%M:%S'), executed, fill_price, target_price, pair.symbol,
+                                                         client_order_id)
+                                        metrics.inc('tradingbot_orders_total', side='buy', symbol=pair.symbol)
+                                        logger.info("[BUY] Compra realizada: %s %s a R$%.2f (cotação R$%.2f): %s", executed, pair.symbol, fill_price, buy_price, order)
+                                    else:
+                                        order_repository.fail_intent(client_order_id)
+                                        logger.info("Ordem de compra não executada no prazo: %s", order)
+                                logger.info("-----------------------------------------------------------------------------------")
+                    else:
+                        logger.info("Preço atual (%.2f) não atende aos sinais da estratégia (suporte: %.2f).", current_price, suporte)
+                        logger.info("-----------------------------------------------------------------------------------")
+        
+        # Consolidar ordens para venda: só as abertas com preço alvo atingido (consulta indexada)
+        sell_orders = order_repository.sellable_orders(current_price, pair.symbol)
+        if sell_orders:
+            order_ids = []
+            client_order_ids = []
+            sell_prices = {}
+            fills = {}
+            # Lucro líquido de todas as candidatas de uma vez, com as taxas em cache
+            lucros = calcular_lucro_lote([order[3] for order in sell_orders], current_price,
+                                         [order[2] for order in sell_orders])
+            try:
+                for order, lucro_liquido in zip(sell_orders, lucros):
+                    if lucro_liquido > 0:
+                        logger.info("Venda será realizada para a ordem ID %s, pois é lucrativa (lucro líquido esperado: R$%.2f).", order[0], lucro_liquido)
+                        if SIMULATION_MODE:
+                            logger.info("[SIMULATED SELL] Ordem ID %s: Vendendo %s %s a R$%.2f.", order[0], order[2], pair.symbol, current_price)
+                        else:
+                            quantity = execution_engine.prepare(pair.symbol, order[2], current_price)
+                            if quantity <= 0:
+                                continue
+                            client_order_id = order_repository.begin_intent('SELL', pair.symbol, quantity, current_price,
+                                                                            order_ids=[order[0]])
+                            with metrics.timer(STAGE_METRIC, stage='order_placement', symbol=pair.symbol):
+                                executed, fill_price, _ = execution_engine.execute('SELL', pair.symbol, quantity, client_order_id)
+                            invalidate_balance_cache()
+                            if executed <= 0:
+                                order_repository.fail_intent(client_order_id)
+                                logger.warning("Venda da ordem ID %s não executada.", order[0])
+                                continue
+                            client_order_ids.append(client_order_id)
+                            sell_prices[order[0]] = fill_price
+                            # Só o executado é fechado; o que não foi vendido continua como ordem aberta
+                            fills[order[0]] = (executed, max(quantity - executed, 0.0))
+                            logger.info("[SELL] Ordem ID %s: vendidos %s %s a R$%.2f.", order[0], executed, pair.symbol, fill_price)
+                            if executed < quantity:
+                                logger.warning("Venda parcial da ordem ID %s: %s de %s %s continuam abertos.", order[0],
+                                               quantity - executed, quantity, pair.symbol)
+                        metrics.inc('tradingbot_orders_total', side='sell', symbol=pair.symbol)
+                        order_ids.append(order[0])
+                    else:
+                        logger.info("Venda não será realizada para a ordem ID %s, pois não é lucrativa (lucro líquido esperado: R$%.2f).", order[0], lucro_liquido)
+            finally:
+                # Fecha as vendas já executadas mesmo se uma das seguintes falhar
+                if order_ids:
+                    with metrics.timer(STAGE_METRIC, stage='db_write', symbol=pair.symbol):
+                        update_order_status(order_ids, 'closed', current_price, client_order_ids, sell_prices, fills)
+                    logger.info("Ordens lucrativas foram fechadas.")
+                    logger.info("-----------------------------------------------------------------------------------")
+
+    except BinanceAPIException as e:
+        metrics.inc('tradingbot_trade_errors_total', kind='api', symbol=pair.symbol)
+        logger.error("Erro na API Binance: %s", e)
+    except Exception as e:
+        metrics.inc('tradingbot_trade_errors_total', kind='unexpected', symbol=pair.symbol)
+        logger.error("Erro inesperado: %s", e)
+    finally:
+        metrics.observe('tradingbot_trade_cycle_seconds', time.perf_counter() - cycle_started, symbol=pair.symbol)
+## ÚLTIMO CANDLE (open_time em ms) JÁ ENVIADO AO GRÁFICO, POR SÍMBOLO
+_chart_cursors: Dict[str, int] = {}
+## ENVIA OS CANDLES NOVOS PARA O PROCESSO DO GRÁFICO
+def send_chart_update(queue, pair: "TradingPair" = None):
+    """Envia (símbolo, início da janela, linhas) só com os candles a partir do último enviado.
+
+    As linhas são um array float64 compacto (ver chart_rows); se a fila estiver cheia o cursor não
+    avança e os candles seguem na próxima mensagem."""
+    pair = pair or default_pair
+    df = pair.candle_store.df
+    if df.empty:
+        logger.error("DataFrame vazio, não enviado para o gráfico.")
+        return
+    times = df.index.values.astype('datetime64[ms]').astype(np.int64)
+    cursor = _chart_cursors.get(pair.symbol)
+    start = int(np.searchsorted(times, cursor)) if cursor is not None else 0
+    if queue.qsize() < 5:  # Limita o tamanho da fila para evitar sobrecarga
+        queue.put((pair.symbol, float(times[0]), chart_rows(df, start)))
+        _chart_cursors[pair.symbol] = int(times[-1])
+    else:
+        logger.warning("Fila cheia. Ignorando envio de dados para o gráfico.")
+## LOOP ORIENTADO A EVENTOS (MODO STREAM)
+def run_market_stream(source: MarketDataSource, queue):
+    """Cada novo preço dispara trade(); a compra é avaliada no máximo a cada TIME_CHECK."""
+    events = SimpleQueue()
+    if isinstance(source, BinanceStreamSource) and execution_engine.mode != 'market' and not SIMULATION_MODE:
+        # O livro local passa a ser atualizado por push, sem um snapshot REST a cada ordem
+        source.on_depth = execution_engine.follow(source.symbol)
+    source.start(on_trade=lambda price, ts: events.put(('trade', price)),
+                 on_kline=lambda kline, closed: events.put(('kline', (kline, closed))))
+    # Comandos de controle entram na mesma fila dos eventos de mercado
+    listener = lambda: events.put(('control', None))
+    control.subscribe(listener)
+    last_price = None
+    last_buy_check = 0.0
+    try:
+        while not control.draining:
+            if control.take_reload():
+                reload_config(config_file_path)
+            try:
+                batch = [events.get(timeout=0.1)]  # O timeout só serve para notar o fim da fonte
+            except Empty:
+                if source.finished.is_set():
+                    logger.info("Fonte de dados de mercado encerrada.")
+                    break
+                continue
+            # Agrupa os eventos acumulados: os candles são aplicados e só o último preço é avaliado
+            while True:
+                try:
+                    batch.append(events.get_nowait())
+                except Empty:
+                    break
+            price = None
+            candle_closed = False
+            for kind, payload in batch:
+                if kind == 'trade':
+                    price = payload
+                elif kind == 'kline':
+                    kline, closed = payload
+                    default_pair.candle_store.apply_kline(kline, closed)
+                    candle_closed = candle_closed or closed
+
+            if control.paused or control.draining or price is None:
+                continue
+            now = time.time()
+            evaluate_buy = now - last_buy_check >= TIME_CHECK
+            if price != last_price or evaluate_buy:
+                if evaluate_buy:
+                    quote_budget.reset()  # Novo ciclo de compra: o saldo é lido de novo
+                trade(current_price=price, evaluate_buy=evaluate_buy)
+                last_price = price
+                if evaluate_buy:
+                    last_buy_check = now
+            if candle_closed:
+                send_chart_update(queue)
+    finally:
+        control.unsubscribe(listener)
+        source.stop()
+## FUNÇÃO PRINCIPAL
+def main():
+    from binance.exceptions import BinanceAPIException
+    # Inicializa a fila para comunicação entre processos
+    queue = Queue()
+    stop_event = Event()
+
+    # Inicia o processo do gráfico
+    plot_process = Process(target=plot_strategy_process, args=(queue, stop_event))
+    plot_process.start()
+
+    # Renova as taxas em segundo plano para não consultar a conta durante as vendas
+    fee_provider.start()
+
+    # Endpoint local de métricas e profiler por amostragem (opcionais)
+    profiler = SamplingProfiler(PROFILER_INTERVAL) if PROFILER_INTERVAL > 0 else None
+    if profiler is not None:
+        profiler.start()
+    metrics_server = start_metrics_server(METRICS_HOST, METRICS_PORT, profiler) if METRICS_PORT else None
+
+    # Pausa, recarga do config e encerramento: API local, sinais e (opcional) a tecla ESC
+    install_signal_handlers(control)
+    control_server = start_control_server(CONTROL_HOST, CONTROL_PORT, control, CONTROL_TOKEN) if CONTROL_PORT else None
+    remove_hotkey = enable_hotkey(control) if CONTROL_HOTKEY else None
+
+    # Backfill único do histórico; depois disso trade() busca só os candles novos
+    if len(trading_pairs) == 1 and not (STREAM_MODE and STREAM_SOURCE == "replay"):
+        try:
+            default_pair.candle_store.backfill(client)
+        except BinanceAPIException as e:
+            logger.error("Erro no backfill de candles: %s", e)
+
+    next_run = time.monotonic()  # A primeira execução é imediata
+    try:    
+        if len(trading_pairs) > 1:
+            asyncio.run(run_symbols(trading_pairs, queue))
+            return
+        if STREAM_MODE:
+            run_market_stream(create_market_source(), queue)
+            return
+        while not control.draining:
+            if control.take_reload():
+                reload_config(config_file_path)
+            if control.paused:
+                control.wait()  # Só um comando (retomar, recarregar, encerrar) acorda o loop
+                continue
+            now = time.monotonic()
+            if now < next_run:
+                control.wait(next_run - now)
+                continue
+            try:
+                # Executa o bot (novo ciclo: o saldo é lido de novo)
+                quote_budget.reset()
+                trade()
+
+                # Reaproveita os candles do cache e envia para o processo do gráfico
+                send_chart_update(queue)
+            except Exception as e:
+                logger.error("Erro na função trade: %s", e)
+            next_run = now + TIME_CHECK
+    except KeyboardInterrupt:
+        logger.info("Encerrando o programa...")
+    finally:
+        # Encerramento gracioso: o ciclo em andamento já terminou; grava o banco e para os processos
+        order_repository.flush()
+        if remove_hotkey is not None:
+            remove_hotkey()
+        if control_server is not None:
+            control_server.shutdown()
+        fee_provider.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        if profiler is not None:
+            profiler.stop()
+        stop_event.set()  # Sinaliza para o processo do gráfico encerrar
+        queue.put(None)  # Envia sinal para encerrar o processo do gráfico
+        plot_process.join()  # Aguarda o término do processo do gráfico
+
+###################### BENCHMARK ######################
+
+
+BENCHMARK_CANDLE_SIZES = (10_000, 100_000, 1_000_000)  # Tamanhos padrão; --candles aceita até 10M
+BENCHMARK_ORDER_SIZES = (100, 10_000, 100_000)  # Tamanhos padrão; --orders aceita até 1M
+BENCHMARK_MAX_KLINES = 1_000_000  # Acima disso a lista bruta de klines (objetos Python) não é um cenário real da API
+BENCHMARK_SYMBOL = 'BTCBRL'
+## CANDLES SINTÉTICOS (PASSEIO ALEATÓRIO) COM AS COLUNAS DE parse_klines
+def synthetic_candles(count: int, seed: int = 0, price: float = 300000.0, interval_ms: int = 60000) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    close = price * np.exp(np.cumsum(rng.normal(0.0, 0.001, count)))
+    open_price = np.concatenate(([price], close[:-1]))
+    spread = np.abs(rng.normal(0.0, 0.0005, count)) * close
+    open_time = np.arange(count, dtype=np.int64) * interval_ms + 1_600_000_000_000
+    volume = rng.uniform(0.1, 10.0, count)
+    return {'open_time': open_time, 'open': open_price, 'high': np.maximum(open_price, close) + spread,
+            'low': np.minimum(open_price, close) - spread, 'close': close, 'volume': volume,
+            'close_time': open_time + interval_ms - 1, 'quote_asset_volume': volume * close,
+            'number_of_trades': rng.integers(1, 500, count), 'taker_buy_base_asset_volume': volume / 2,
+            'taker_buy_quote_asset_volume': volume * close / 2}
+## CANDLES SINTÉTICOS NO FORMATO BRUTO DA API (PREÇOS E VOLUMES COMO TEXTO)
+def synthetic_klines(candles: Dict[str, np.ndarray]) -> list:
+    columns = [candles[name].tolist() if np.issubdtype(dtype, np.integer) else candles[name].astype(str).tolist()
+               for name, dtype in KLINE_DTYPES.items()]
+    return [list(row) + ['0'] for row in zip(*columns)]
+## CLIENTE QUE SÓ DEVOLVE KLINES PRONTOS (get_historical_data SEM REDE NEM CREDENCIAIS)
+class SyntheticKlinesClient:
+    def __init__(self, klines: list):
+        self.klines = klines
+
+    def get_historical_klines(self, symbol, interval, start_str=None, end_str=None, limit=1000, **params):
+        return list(self.klines)
+## ORDERS.DB SINTÉTICO NO ESQUEMA ORIGINAL (O OrderRepository MIGRA COMO UM BANCO REAL)
+def synthetic_orders_db(db_path: str, count: int, seed: int = 0, price: float = 300000.0, open_ratio: float = 0.2):
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    buy_price = price * np.exp(rng.normal(0.0, 0.05, count))
+    quantity = rng.uniform(0.0001, 0.01, count)
+    is_open = rng.random(count) < open_ratio
+    sell_price = np.where(is_open, np.nan, buy_price * np.exp(rng.normal(0.002, 0.01, count)))
+    date_buy = np.datetime64('2024-01-01T00:00:00') + np.arange(count) * np.timedelta64(60, 's')
+    date_sell = date_buy + rng.integers(60, 86400, count).astype('timedelta64[s]')
+    orders = pd.DataFrame({
+        'date_buy': np.char.replace(date_buy.astype(str), 'T', ' '),
+        'quantity': quantity,
+        'buy_price': buy_price,
+        'target_price': buy_price * 1.01,
+        'sell_price': sell_price,
+        'value_purchased': quantity * buy_price,
+        'value_end': quantity * sell_price,
+        'profit': quantity * (sell_price - buy_price),
+        'date_sell': np.where(is_open, None, np.char.replace(date_sell.astype(str), 'T', ' ')),
+        'status': np.where(is_open, 'open', 'closed'),
+    })
+    conn, _ = initialize_database(db_path)
+    try:
+        orders.to_sql('orders', conn, if_exists='append', index=False)
+    finally:
+        conn.close()
+## MEDE UMA FUNÇÃO: `repeat` RODADAS DE `number` CHAMADAS (CADA CHAMADA RECEBE O ÍNDICE GLOBAL), SEM LOGS
+def measure(fn, repeat: int, number: int = 1) -> Dict[str, float]:
+    times = []
+    logging.disable(logging.INFO)  # Os caminhos medidos registram cada chamada no log
+    try:
+        for run in range(repeat):
+            started = time.perf_counter()
+            for call in range(run * number, (run + 1) * number):
+                fn(call)
+            times.append((time.perf_counter() - started) / number)
+    finally:
+        logging.disable(logging.NOTSET)
+    return {'min': min(times), 'median': float(np.median(times)), 'repeat': repeat, 'number': number}
+## PARÂMETROS FIXOS DO BENCHMARK: TODOS OS SINAIS E PADRÕES ATIVOS, INDEPENDENTE DO QUE ESTÁ LIGADO NO CONFIG
+def benchmark_params() -> Dict[str, Any]:
+    params = get_strategy_params(config)
+    params['SIGNALS'] = {cls.flag: True for cls in STRATEGY_SIGNALS}
+    params['CANDLE_PATTERNS'] = list(CANDLE_PATTERNS)
+    return params
+## CAMINHOS QUE DEPENDEM DA QUANTIDADE DE CANDLES (LOOKBACK / HISTÓRICO DO BACKTEST)
+def benchmark_candles(count: int, repeat: int, params: Dict[str, Any], window: int) -> Dict[str, Dict[str, float]]:
+    import pandas as pd
+    candles = synthetic_candles(count)
+    closes = candles['close']
+    index = pd.DatetimeIndex(candles['open_time'].astype('datetime64[ms]'), name='timestamp')
+    df = pd.DataFrame({name: values for name, values in candles.items() if name != 'open_time'}, index=index)
+    columns = {name: candles[name] for name in SWEEP_COLUMNS}
+    strategy_graph = build_strategy(params, window)
+    frames = [df[['close']].copy() for _ in range(repeat)]  # strategy() altera o DataFrame recebido
+
+    results = {
+        'strategy': measure(lambda run: strategy(frames[run]), repeat),
+        'calculate_rsi': measure(lambda run: calculate_rsi(closes, params['RSI_PERIOD']), repeat),
+        'calculate_support_resistance': measure(lambda run: calculate_support_resistance(closes), repeat),
+        'indicator_sync': measure(lambda run: IndicatorEngine(params['RSI_PERIOD'], patterns=params['CANDLE_PATTERNS']).sync(df),
+                                  repeat),
+        'strategy_evaluate': measure(lambda run: strategy_graph.evaluate(closes, columns, series=True), repeat),
+        'candle_patterns': measure(lambda run: scan_candle_patterns(candles['open'], candles['high'], candles['low'],
+                                                                    closes), repeat),
+        'backtest': measure(lambda run: run_backtest(columns, params, BACKTEST_BALANCE, BACKTEST_MAKER_FEE,
+                                                     BACKTEST_TAKER_FEE, window), repeat),
+    }
+    if count <= BENCHMARK_MAX_KLINES:
+        exchange = SyntheticKlinesClient(synthetic_klines(candles))
+        results['get_historical_data'] = measure(
+            lambda run: get_historical_data(exchange, BENCHMARK_SYMBOL, '1m', '1 day ago UTC'), repeat)
+    return results
+## CAMINHOS QUE DEPENDEM DA QUANTIDADE DE ORDENS NO ORDERS.DB
+def benchmark_orders(count: int, repeat: int, directory: str) -> Dict[str, Dict[str, float]]:
+    db_path = os.path.join(directory, f'orders_{count}.db')
+    synthetic_orders_db(db_path, count)
+    results = {'orders_migrate': measure(
+        lambda run: OrderRepository(db_path, default_symbol=BENCHMARK_SYMBOL).close(), 1)}
+    results['orders_load'] = measure(lambda run: OrderRepository(db_path).close(), repeat)
+
+    repository = OrderRepository(db_path)
+    try:
+        open_rows = repository.open_orders(BENCHMARK_SYMBOL)
+        # Preço que libera ~1% das ordens abertas, como um tick comum em trade()
+        price = open_rows[len(open_rows) // 100][4] if open_rows else 0.0
+        results['open_order_scan'] = measure(
+            lambda call: repository.sellable_orders(price, BENCHMARK_SYMBOL), repeat, number=1000)
+        # Lotes disjuntos de ordens abertas, um por rodada, pelo mesmo caminho de update_order_status;
+        # o tempo é por ordem, já que os bancos pequenos não têm ordens abertas para lotes de 100
+        batch = max(1, min(100, len(open_rows) // (repeat + 1)))
+        ids = [row[0] for row in open_rows[-batch * repeat:]]
+        if len(ids) >= batch * repeat:
+            timing = measure(lambda run: repository.close_orders(ids[run * batch:(run + 1) * batch], 'closed', price,
+                                                                 '2024-06-01 00:00:00'), repeat)
+            results['update_order_status'] = dict(timing, min=timing['min'] / batch,
+                                                  median=timing['median'] / batch, number=batch)
+        results['insert_order'] = measure(
+            lambda call: repository.insert('2024-06-01 00:00:00', 0.001, price, price * 1.01, BENCHMARK_SYMBOL),
+            repeat, number=100)
+    finally:
+        repository.close()
+    analytics = PortfolioAnalytics(db_path)
+    try:
+        results['portfolio_report'] = measure(lambda run: analytics.report({BENCHMARK_SYMBOL: price}), repeat)
+    finally:
+        analytics.close()
+    return results
+## EXECUTA TODOS OS BENCHMARKS NOS TAMANHOS PEDIDOS
+def run_benchmarks(candle_sizes, order_sizes, repeat: int = 5, window: int = None) -> Dict[str, Any]:
+    import pandas as pd
+    params = benchmark_params()
+    window = window or BACKTEST_WINDOW
+    results = []
+    for count in candle_sizes:
+        logger.info("Benchmark com %s candles...", count)
+        for name, timing in benchmark_candles(count, repeat, params, window).items():
+            results.append(dict(name=name, group='candles', size=count, **timing))
+    with tempfile.TemporaryDirectory() as directory:
+        for count in order_sizes:
+            logger.info("Benchmark com %s ordens...", count)
+            for name, timing in benchmark_orders(count, repeat, directory).items():
+                results.append(dict(name=name, group='orders', size=count, **timing))
+    meta = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'window': window,
+    }
+    return {'meta': meta, 'results': results}
+## TABELA (CAMINHO x TAMANHO) EM MS E EXPOENTE DE ESCALA (1 = LINEAR, 0 = CONSTANTE)
+def benchmark_table(results: list, group: str) -> pd.DataFrame:
+    import pandas as pd
+    frame = pd.DataFrame([row for row in results if row['group'] == group])
+    if frame.empty:
+        return frame
+    table = frame.pivot_table(index='name', columns='size', values='min', aggfunc='min') * 1000
+    sizes = np.log(np.array(table.columns, dtype=float))
+
+    def scaling(row):
+        valid = row.notna().to_numpy() & (row.to_numpy() > 0)
+        if valid.sum() < 2:
+            return np.nan
+        return float(np.polyfit(sizes[valid], np.log(row.to_numpy()[valid]), 1)[0])
+
+    table['escala'] = table.apply(scaling, axis=1)
+    return table
+## COMPARA DOIS RESULTADOS PELO MENOR TEMPO DE CADA CAMINHO/TAMANHO
+def compare_benchmarks(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.1) -> pd.DataFrame:
+    """Marca como regressão o caminho cujo tempo cresceu mais que `threshold` (fração) e como
+    melhora o que caiu mais que isso. Caminhos presentes em só um dos arquivos ficam de fora."""
+    import pandas as pd
+    before = {(row['name'], row['size']): row['min'] for row in baseline['results']}
+    rows = []
+    for row in current['results']:
+        key = (row['name'], row['size'])
+        if key not in before:
+            continue
+        ratio = row['min'] / before[key] if before[key] else np.inf
+        status = 'regressão' if ratio > 1 + threshold else 'melhora' if ratio < 1 - threshold else 'ok'
+        rows.append({'name': row['name'], 'size': row['size'], 'antes_ms': before[key] * 1000,
+                     'depois_ms': row['min'] * 1000, 'razao': ratio, 'status': status})
+    return pd.DataFrame(rows, columns=['name', 'size', 'antes_ms', 'depois_ms', 'razao', 'status'])
+## REGISTRA A COMPARAÇÃO NO LOG E RETORNA A QUANTIDADE DE REGRESSÕES
+def log_benchmark_comparison(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> int:
+    comparison = compare_benchmarks(baseline, current, threshold)
+    if comparison.empty:
+        logger.warning("Nenhum caminho/tamanho em comum entre os resultados comparados.")
+        return 0
+    regressions = int((comparison['status'] == 'regressão').sum())
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Comparação com %s (limite de %.0f%%):\n%s", baseline['meta'].get('created'), threshold * 100,
+                    comparison.to_string(index=False))
+    if regressions:
+        logger.warning("%s regressão(ões) de desempenho acima de %.0f%%.", regressions, threshold * 100)
+    return regressions
+## EXECUTA O MODO BENCHMARK (LINHA DE COMANDO); RETORNA A QUANTIDADE DE REGRESSÕES
+def benchmark_main(args) -> int:
+    started = time.perf_counter()
+    report = run_benchmarks(args.candles, args.orders, args.repeat, args.window)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info("Benchmark concluído em %.1fs; resultados gravados em %s.", time.perf_counter() - started, args.output)
+    for group in ('candles', 'orders'):
+        table = benchmark_table(report['results'], group)
+        if not table.empty and logger.isEnabledFor(logging.INFO):
+            logger.info("Tempos por %s (ms, menor de %s rodadas):\n%s", group, args.repeat, table.to_string())
+    if not args.baseline:
+        return 0
+    return log_benchmark_comparison(load_config(args.baseline), report, args.threshold)
+## COMPARA DOIS ARQUIVOS DE RESULTADO (LINHA DE COMANDO); RETORNA A QUANTIDADE DE REGRESSÕES
+def benchmark_compare_main(args) -> int:
+    return log_benchmark_comparison(load_config(args.baseline), load_config(args.current), args.threshold)
+
+
+###################### INICIALIZAÇÃO ######################
+
+
+## CONTEXTO DA APLICAÇÃO: O IMPORT NÃO CRIA NADA, TUDO É CRIADO POR init_app()
+client = None
+control = None
+config_file_path = "config.json"  # Relido pela recarga do config
+order_repository = None
+fee_provider = None
+execution_engine = None
+trading_pairs = []
+default_pair = None
+risk_engine = None  # Sem ele (trade() fora do init_app) as compras não passam pelo controle de risco
+log_listener = None
+startup_timings: Dict[str, float] = {}  # Etapa da inicialização -> segundos
+## INICIALIZA A APLICAÇÃO
+def init_app(config_file: str = "config.json", trading: bool = True) -> bool:
+    """Carrega o config e, para operar (trading=True), cria o cliente, o orders.db e as taxas.
+
+    Backtest e varredura usam trading=False: não precisam de credenciais, rede nem orders.db.
+    O tempo de cada etapa fica em startup_timings; retorna False se passou do STARTUP_TIME_BUDGET."""
+    from binance.exceptions import BinanceAPIException
+    global client, control, config_file_path, order_repository, fee_provider, execution_engine, trading_pairs, \
+        default_pair, risk_engine, log_listener, ORDER_MARGIN
+    startup_timings.clear()
+    startup_timings['import'] = time.perf_counter() - _IMPORT_STARTED
+    started = time.perf_counter()
+
+    def mark(stage):
+        nonlocal started
+        now = time.perf_counter()
+        startup_timings[stage] = now - started
+        started = now
+
+    config_file_path = config_file
+    cfg = load_config(config_file)
+    log_listener = setup_logging(cfg)
+    load_settings(cfg)
+    mark('config')
+    if not trading:
+        return True
+    validate_settings()
+    control = BotControl()
+    client = initialize_client(API_KEY, API_SECRET)
+    mark('client')
+
+    ## VALIDAÇÃO DE MARGEM DE ORDEM (AS TAXAS VÊM PELA REDE ENQUANTO O BANCO É ABERTO)
+    fee_provider = FeeProvider(get_trading_fees, FEE_CACHE_TTL)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        fees = pool.submit(fee_provider.get)
+        order_repository = OrderRepository('orders.db', default_symbol=SYMBOL)
+        metrics.add_collector(order_repository.collect_metrics)
+        mark('database')
+        maker_fee, taker_fee = fees.result()
+    mark('fees')
+    if not SIMULATION_MODE:
+        try:
+            reconcile_orders(client, order_repository)
+        except BinanceAPIException as e:
+            logger.error("Erro ao reconciliar as ordens com a exchange: %s", e)
+        mark('reconcile')
+    total_fees = maker_fee + taker_fee
+    ORDER_MARGIN = adjust_order_margin(ORDER_MARGIN, total_fees)
+
+    ## PARES NEGOCIADOS (O PRIMEIRO É O USADO NO MODO DE UM SÍMBOLO, NO STREAM E NO GRÁFICO)
+    trading_pairs = build_trading_pairs(config, total_fees)
+    default_pair = trading_pairs[0]
+    execution_engine = ExecutionEngine(client, [pair.symbol for pair in trading_pairs], EXECUTION_MODE,
+                                       EXECUTION_MAX_SLIPPAGE, EXECUTION_LIMIT_TIMEOUT, EXECUTION_BOOK_DEPTH,
+                                       EXECUTION_BOOK_MAX_AGE)
+    risk_engine = RiskEngine(order_repository, build_risk_limits(config), RISK_MAX_EXPOSURE, RISK_MAX_DAILY_LOSS,
+                             RISK_MAX_ORDERS_PER_MINUTE)
+    metrics.add_collector(risk_engine.collect_metrics)
+    mark('pairs')
+    return report_startup()
+## REGISTRA O TEMPO DE INICIALIZAÇÃO E AVISA SE PASSOU DO ORÇAMENTO
+def report_startup() -> bool:
+    total = sum(startup_timings.values())
+    for stage, seconds in startup_timings.items():
+        metrics.set('tradingbot_startup_seconds', seconds, stage=stage)
+    stages = ', '.join(f"{stage} {seconds:.3f}s" for stage, seconds in startup_timings.items())
+    if total > STARTUP_TIME_BUDGET:
+        logger.warning("Inicialização em %.3fs, acima do orçamento de %.1fs (%s).", total, STARTUP_TIME_BUDGET, stages)
+        return False
+    logger.info("Inicialização em %.3fs (%s).", total, stages)
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trading Bot")
+    subparsers = parser.add_subparsers(dest="command")
+    backtest_parser = subparsers.add_parser("backtest", help="Simula a estratégia sobre os candles em candles.db")
+    backtest_parser.add_argument("--start", help="Data inicial (AAAA-MM-DD)")
+    backtest_parser.add_argument("--end", help="Data final (AAAA-MM-DD)")
+    backtest_parser.add_argument("--download", help='Baixa o histórico antes de rodar, ex.: "6 months ago UTC"')
+    backtest_parser.add_argument("--output", default="backtest.db", help="Banco onde as ordens simuladas são gravadas")
+    sweep_parser = subparsers.add_parser("sweep", help="Varredura de parâmetros da estratégia em paralelo")
+    sweep_parser.add_argument("--grid", help="JSON com a grade de parâmetros (padrão: SWEEP_GRID do config.json)")
+    sweep_parser.add_argument("--samples", type=int, default=0, help="Avalia só uma amostra aleatória da grade")
+    sweep_parser.add_argument("--seed", type=int, help="Semente da amostra aleatória")
+    sweep_parser.add_argument("--processes", type=int, help="Quantidade de processos (padrão: todos os núcleos)")
+    sweep_parser.add_argument("--start", help="Data inicial (AAAA-MM-DD)")
+    sweep_parser.add_argument("--end", help="Data final (AAAA-MM-DD)")
+    sweep_parser.add_argument("--download", help='Baixa o histórico antes de rodar, ex.: "6 months ago UTC"')
+    sweep_parser.add_argument("--top", type=int, default=20, help="Quantidade de linhas exibidas no log")
+    sweep_parser.add_argument("--output", default="sweep.csv", help="Arquivo CSV com a tabela ordenada")
+    subparsers.add_parser("startup", help="Inicializa sem operar e mede o tempo de cada etapa (STARTUP_TIME_BUDGET)")
+    report_parser = subparsers.add_parser("report", help="Relatório de PnL da carteira a partir do orders.db")
+    report_parser.add_argument("--db", default="orders.db", help="Banco de ordens")
+    report_parser.add_argument("--symbol", help="Restringe o relatório a um símbolo")
+    report_parser.add_argument("--days", type=int, default=0, help="Série diária só dos últimos N dias (0 = tudo)")
+    benchmark_parser = subparsers.add_parser("benchmark", help="Mede os caminhos críticos com dados sintéticos")
+    benchmark_parser.add_argument("--candles", type=int, nargs="+", default=list(BENCHMARK_CANDLE_SIZES),
+                                  help="Quantidades de candles (ex.: 10000 100000 1000000 10000000)")
+    benchmark_parser.add_argument("--orders", type=int, nargs="+", default=list(BENCHMARK_ORDER_SIZES),
+                                  help="Quantidades de ordens no orders.db sintético (ex.: 100 10000 1000000)")
+    benchmark_parser.add_argument("--repeat", type=int, default=5, help="Rodadas por caminho (vale o menor tempo)")
+    benchmark_parser.add_argument("--window", type=int, help="Janela de suporte/resistência (padrão: BACKTEST_WINDOW)")
+    benchmark_parser.add_argument("--output", default="benchmark.json", help="Arquivo JSON com os resultados")
+    benchmark_parser.add_argument("--baseline", help="Resultado anterior para comparar ao final")
+    benchmark_parser.add_argument("--threshold", type=float, default=0.1, help="Aumento de tempo tratado como regressão (fração)")
+    compare_parser = subparsers.add_parser("benchmark-compare", help="Compara dois resultados do benchmark")
+    compare_parser.add_argument("baseline", help="Resultado anterior (JSON)")
+    compare_parser.add_argument("current", help="Resultado novo (JSON)")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Aumento de tempo tratado como regressão (fração)")
+    args = parser.parse_args()
+    try:
+        within_budget = init_app(trading=args.command not in ("backtest", "sweep", "report", "benchmark",
+                                                              "benchmark-compare"))
+        if args.command == "startup":
+            sys.exit(0 if within_budget else 1)
+        if args.command == "backtest":
+            backtest_main(args)
+        elif args.command == "sweep":
+            sweep_main(args)
+        elif args.command == "report":
+            report_main(args)
+        elif args.command == "benchmark":
+            sys.exit(1 if benchmark_main(args) else 0)
+        elif args.command == "benchmark-compare":
+            sys.exit(1 if benchmark_compare_main(args) else 0)
+        else:
+            main()
+    except Exception as e:
+        logger.error("Erro inesperado: %s", e)
+        input("Pressione qualquer tecla para sair...")  # Mantém a janela aberta para ver o erro
@@ -0,0 +1,51 @@
+import json
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import TradingBot as tb  # noqa: E402
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    """config.json do repositório aplicado ao módulo, com o diretório de trabalho num tmp_path."""
+    with open(os.path.join(ROOT, 'config.json'), encoding='utf-8') as file:
+        cfg = json.load(file)
+    tb.load_settings(cfg)
+    monkeypatch.chdir(tmp_path)
+    yield cfg
+    tb.load_settings(cfg)
+
+
+def candle_frame(count: int = 300, seed: int = 0, price: float = 100.0):
+    candles = tb.synthetic_candles(count, seed=seed, price=price)
+    index = pd.DatetimeIndex(candles['open_time'].astype('datetime64[ms]'), name='timestamp')
+    return pd.DataFrame({name: values for name, values in candles.items() if name != 'open_time'}, index=index)
+
+
+@pytest.fixture
+def app(settings, tmp_path, monkeypatch):
+    """Contexto mínimo de trade() sem init_app: orders.db no tmp_path, taxas fixas, saldo simulado de
+    R$1000 e um par com candles.
+
+    A estratégia do par sempre compra (buy_signal=True) com alvo 1% acima do preço."""
+    repository = tb.OrderRepository(str(tmp_path / 'orders.db'), default_symbol=tb.SYMBOL)
+    pair = tb.TradingPair(dict(settings, SYMBOL=tb.SYMBOL))
+    pair.candle_store.df = candle_frame()
+    pair.strategy.evaluate = lambda price, indicators: (True, 1.0, price * 1.01, {}, {})
+    monkeypatch.setattr(tb, 'order_repository', repository)
+    monkeypatch.setattr(tb, 'fee_provider', tb.FeeProvider(lambda: (0.001, 0.001)))
+    monkeypatch.setattr(tb, 'trading_pairs', [pair])
+    monkeypatch.setattr(tb, 'default_pair', pair)
+    monkeypatch.setattr(tb, 'SIMULATION_MODE', True)
+    monkeypatch.setattr(tb, 'SIMULATION_BALANCE', 1000.0)
+    monkeypatch.setattr(tb, 'quote_budget', tb.QuoteBudget())
+    yield pair
+    repository.close()
+    pair.candle_store.conn.close()
@@ -0,0 +1,284 @@
+"""Exchange em memória com a parte da interface do Client da Binance usada pelo bot (dublê para os testes)."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+from urllib.parse import parse_qsl, urlsplit
+
+from binance.exceptions import BinanceAPIException  # type: ignore
+
+
+class SimulatedExchange:
+    """Implementa a parte da interface do Client usada pelo bot, sem rede.
+
+    O livro é sintético em volta do preço atual: `levels` níveis de cada lado, separados por
+    `level_step` (fração do preço) e com `level_quantity` cada. Ordens a mercado consomem os níveis
+    (com slippage real para ordens grandes) e ordens LIMIT_MAKER ficam abertas até set_price()
+    cruzar o preço delas. Os saldos são atualizados a cada execução."""
+
+    def __init__(self, symbol: str = 'BTCBRL', price: float = 300000.0, base_asset: str = 'BTC',
+                 quote_asset: str = 'BRL', balances: Dict[str, float] = None, levels: int = 50,
+                 level_step: float = 0.0001, level_quantity: float = 0.01, step_size: float = 0.00001,
+                 tick_size: float = 0.01, min_notional: float = 10.0, maker_fee: float = 0.001,
+                 taker_fee: float = 0.001):
+        self.symbol = symbol
+        self.price = price
+        self.base_asset = base_asset
+        self.quote_asset = quote_asset
+        self.balances = dict(balances or {quote_asset: 10000.0, base_asset: 0.0})
+        self.levels = levels
+        self.level_step = level_step
+        self.level_quantity = level_quantity
+        self.step_size = step_size
+        self.tick_size = tick_size
+        self.min_notional = min_notional
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        self.orders: Dict[int, Dict[str, Any]] = {}
+        self.klines: list = []  # Candles brutos devolvidos por get_historical_klines
+        self.update_id = 1
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def _reject(code: int, message: str):
+        raise BinanceAPIException(None, 400, json.dumps({'code': code, 'msg': message}))
+
+    def _levels(self, side: str) -> list:
+        direction = 1 if side == 'asks' else -1
+        return [(round(self.price * (1 + direction * self.level_step * (level + 0.5)), 2), self.level_quantity)
+                for level in range(self.levels)]
+
+    def _fill(self, order: Dict[str, Any], quantity: float, price: float):
+        order['executedQty'] = str(float(order['executedQty']) + quantity)
+        order['cummulativeQuoteQty'] = str(float(order['cummulativeQuoteQty']) + quantity * price)
+        direction = 1 if order['side'] == 'BUY' else -1
+        self.balances[self.base_asset] = self.balances.get(self.base_asset, 0.0) + direction * quantity
+        self.balances[self.quote_asset] = self.balances.get(self.quote_asset, 0.0) - direction * quantity * price
+        order['status'] = 'FILLED' if float(order['executedQty']) >= float(order['origQty']) - 1e-12 else 'PARTIALLY_FILLED'
+        order['updateTime'] = int(time.time() * 1000)
+
+    def _new_order(self, symbol: str, side: str, order_type: str, quantity, price=None, client_order_id=None):
+        quantity = float(quantity)
+        if quantity < self.step_size:
+            self._reject(-1013, 'Filter failure: LOT_SIZE')
+        if quantity * float(price or self.price) < self.min_notional:
+            self._reject(-1013, 'Filter failure: NOTIONAL')
+        order_id = len(self.orders) + 1
+        order = {'symbol': symbol, 'orderId': order_id, 'clientOrderId': client_order_id or f"sim-{order_id}",
+                 'price': str(price or 0), 'origQty': str(quantity), 'executedQty': '0', 'cummulativeQuoteQty': '0',
+                 'status': 'NEW', 'type': order_type, 'side': side, 'time': int(time.time() * 1000),
+                 'updateTime': int(time.time() * 1000)}
+        self.orders[order_id] = order
+        return order
+
+    def get_exchange_info(self):
+        return {'symbols': [{'symbol': self.symbol, 'status': 'TRADING', 'baseAsset': self.base_asset,
+                             'quoteAsset': self.quote_asset, 'filters': [
+                                 {'filterType': 'PRICE_FILTER', 'tickSize': str(self.tick_size)},
+                                 {'filterType': 'LOT_SIZE', 'minQty': str(self.step_size), 'maxQty': '9000',
+                                  'stepSize': str(self.step_size)},
+                                 {'filterType': 'NOTIONAL', 'minNotional': str(self.min_notional)}]}]}
+
+    def get_symbol_info(self, symbol):
+        return next((info for info in self.get_exchange_info()['symbols'] if info['symbol'] == symbol), None)
+
+    def get_symbol_ticker(self, symbol=None):
+        return {'symbol': symbol or self.symbol, 'price': str(self.price)}
+
+    def get_historical_klines(self, symbol, interval, start_str=None, end_str=None, limit=1000, **params):
+        return list(self.klines)
+
+    def get_order_book(self, symbol=None, limit=100):
+        with self.lock:
+            return {'lastUpdateId': self.update_id,
+                    'bids': [[str(price), str(quantity)] for price, quantity in self._levels('bids')[:limit]],
+                    'asks': [[str(price), str(quantity)] for price, quantity in self._levels('asks')[:limit]]}
+
+    def get_account(self):
+        return {'makerCommission': self.maker_fee * 10000, 'takerCommission': self.taker_fee * 10000,
+                'balances': [{'asset': asset, 'free': str(free), 'locked': '0'} for asset, free in self.balances.items()]}
+
+    def get_asset_balance(self, asset):
+        return {'asset': asset, 'free': str(self.balances.get(asset, 0.0)), 'locked': '0'}
+
+    def set_price(self, price: float):
+        """Move o preço e executa as ordens LIMIT_MAKER que ele cruzou."""
+        with self.lock:
+            self.price = price
+            self.update_id += 1
+            for order in self.orders.values():
+                if order['status'] in ('NEW', 'PARTIALLY_FILLED') and order['type'] == 'LIMIT_MAKER':
+                    limit = float(order['price'])
+                    if (order['side'] == 'BUY' and price <= limit) or (order['side'] == 'SELL' and price >= limit):
+                        self._fill(order, float(order['origQty']) - float(order['executedQty']), limit)
+
+    def _market(self, side: str, symbol: str, quantity, newClientOrderId=None, **params):
+        with self.lock:
+            order = self._new_order(symbol, side, 'MARKET', quantity, client_order_id=newClientOrderId)
+            remaining = float(quantity)
+            for price, available in self._levels('asks' if side == 'BUY' else 'bids'):
+                filled = min(remaining, available)
+                self._fill(order, filled, price)
+                remaining -= filled
+                if remaining <= 1e-12:
+                    break
+            if order['status'] != 'FILLED':
+                order['status'] = 'EXPIRED'  # O livro acabou antes de executar tudo
+            return dict(order)
+
+    def order_market_buy(self, **params):
+        return self._market('BUY', **params)
+
+    def order_market_sell(self, **params):
+        return self._market('SELL', **params)
+
+    def create_order(self, symbol, side, type, quantity, price=None, newClientOrderId=None, **params):
+        with self.lock:
+            if type == 'MARKET':
+                return self._market(side, symbol, quantity, newClientOrderId)
+            price = float(price)
+            best_bid, best_ask = self._levels('bids')[0][0], self._levels('asks')[0][0]
+            if (side == 'BUY' and price >= best_ask) or (side == 'SELL' and price <= best_bid):
+                self._reject(-2010, 'Order would immediately match and take.')
+            return dict(self._new_order(symbol, side, type, quantity, price, newClientOrderId))
+
+    def get_order(self, symbol=None, orderId=None, origClientOrderId=None):
+        with self.lock:
+            for order in self.orders.values():
+                if order['orderId'] == orderId or (origClientOrderId and order['clientOrderId'] == origClientOrderId):
+                    return dict(order)
+            self._reject(-2013, 'Order does not exist.')
+
+    def cancel_order(self, symbol=None, orderId=None, origClientOrderId=None):
+        with self.lock:
+            order = self.get_order(symbol, orderId, origClientOrderId)
+            if order['status'] not in ('NEW', 'PARTIALLY_FILLED'):
+                self._reject(-2011, 'Unknown order sent.')
+            self.orders[order['orderId']]['status'] = 'CANCELED'
+            return dict(self.orders[order['orderId']])
+
+    def get_all_orders(self, symbol=None, orderId=None, startTime=None, limit=1000):
+        with self.lock:
+            orders = [dict(order) for order in self.orders.values() if order['symbol'] == symbol
+                      and (orderId is None or order['orderId'] >= orderId)
+                      and (startTime is None or order['time'] >= startTime)]
+            return orders[:limit]
+
+    def get_klines(self, symbol=None, interval=None, startTime=None, endTime=None, limit=500):
+        klines = [kline for kline in self.klines if (startTime is None or kline[0] >= int(startTime))
+                  and (endTime is None or kline[0] <= int(endTime))]
+        return klines[:int(limit)]
+
+
+## PESO DE CADA ROTA NA EXCHANGE FALSA, COMO NA API SPOT
+ROUTE_WEIGHTS = {'klines': 2, 'ticker/price': 2, 'depth': 5, 'account': 20, 'exchangeInfo': 20, 'allOrders': 20}
+
+
+class FakeBinanceServer(ThreadingHTTPServer):
+    """Servidor REST local com as rotas /api/v3 usadas pelo bot, sobre uma SimulatedExchange.
+
+    Conta o peso de cada requisição numa janela de `window` segundos, devolve o total no cabeçalho
+    X-MBX-USED-WEIGHT-1M e responde 429 (com Retry-After) acima de `weight_limit`, como a Binance.
+    Serve de alvo para API_BASE_URL."""
+
+    daemon_threads = True
+
+    def __init__(self, exchange: SimulatedExchange, weight_limit: int = 6000, window: float = 60.0):
+        super().__init__(('127.0.0.1', 0), FakeBinanceHandler)
+        self.exchange = exchange
+        self.weight_limit = weight_limit
+        self.window = window
+        self.used_weight = 0
+        self.window_started = time.monotonic()
+        self.requests: list = []  # (método, rota, peso)
+        self.rejected = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def charge(self, method: str, route: str) -> int:
+        """Soma o peso da requisição; retorna o peso usado na janela, ou -1 se passou do limite."""
+        weight = ROUTE_WEIGHTS.get(route, 4 if (method, route) == ('GET', 'order') else 1)
+        with self.lock:
+            if time.monotonic() - self.window_started >= self.window:
+                self.used_weight, self.window_started = 0, time.monotonic()
+            self.used_weight += weight
+            self.requests.append((method, route, weight))
+            if self.used_weight > self.weight_limit:
+                self.rejected += 1
+                return -1
+            return self.used_weight
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeBinanceHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: Any, headers: Dict[str, str] = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('X-MBX-USED-WEIGHT-1M', str(self.server.used_weight))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self, method: str):
+        url = urlsplit(self.path)
+        route = url.path.split('/api/v3/', 1)[-1]
+        params = dict(parse_qsl(url.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            params.update(parse_qsl(self.rfile.read(length).decode()))
+        for key in ('timestamp', 'signature', 'recvWindow'):
+            params.pop(key, None)
+        if self.server.charge(method, route) < 0:
+            self._reply(429, {'code': -1003, 'msg': 'Too many requests.'},
+                        {'Retry-After': str(self.server.window)})
+            return
+        exchange = self.server.exchange
+        routes = {
+            ('GET', 'ping'): lambda: {},
+            ('GET', 'time'): lambda: {'serverTime': int(time.time() * 1000)},
+            ('GET', 'klines'): lambda: exchange.get_klines(**params),
+            ('GET', 'ticker/price'): lambda: exchange.get_symbol_ticker(params.get('symbol')),
+            ('GET', 'exchangeInfo'): exchange.get_exchange_info,
+            ('GET', 'depth'): lambda: exchange.get_order_book(params.get('symbol'), int(params.get('limit', 100))),
+            ('GET', 'account'): exchange.get_account,
+            ('GET', 'allOrders'): lambda: exchange.get_all_orders(
+                params.get('symbol'), int(params['orderId']) if 'orderId' in params else None,
+                int(params['startTime']) if 'startTime' in params else None, int(params.get('limit', 500))),
+            ('GET', 'order'): lambda: exchange.get_order(params.get('symbol'), int(params['orderId']) if 'orderId' in params else None,
+                                                         params.get('origClientOrderId')),
+            ('POST', 'order'): lambda: exchange.create_order(**params),
+            ('DELETE', 'order'): lambda: exchange.cancel_order(params.get('symbol'), int(params['orderId']) if 'orderId' in params else None,
+                                                               params.get('origClientOrderId')),
+        }
+        handler = routes.get((method, route))
+        if handler is None:
+            self._reply(404, {'code': -1100, 'msg': f'Rota não suportada: {method} {route}'})
+            return
+        try:
+            self._reply(200, handler())
+        except BinanceAPIException as e:
+            self._reply(e.status_code, {'code': e.code, 'msg': e.message})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+import pytest
+
+import TradingBot as tb
+from fake_exchange import FakeBinanceServer, SimulatedExchange
+
+
+@pytest.fixture
+def server(settings, monkeypatch):
+    exchange = SimulatedExchange(balances={'BRL': 100000.0, 'BTC': 0.0})
+    candles = tb.synthetic_candles(3500, interval_ms=60000)
+    candles['open_time'] = candles['open_time'] - candles['open_time'][-1] + int(time.time() * 1000) // 60000 * 60000
+    exchange.klines = tb.synthetic_klines(candles)
+    fake = FakeBinanceServer(exchange)
+    monkeypatch.setattr(tb, 'API_BASE_URL', fake.url)
+    yield fake
+    fake.close()
+
+
+def test_historical_klines_weight_counts_pages():
+    minute = 60_000
+    assert tb.historical_klines_weight('BTCBRL', '1m') == 2  # Sem data inicial: uma página
+    # 999 candles: uma página + a consulta do primeiro candle disponível
+    assert tb.historical_klines_weight('BTCBRL', '1m', 0, 998 * minute) == 4
+    # 1000 candles exatos: a segunda página volta vazia e encerra a paginação
+    assert tb.historical_klines_weight('BTCBRL', '1m', 0, 999 * minute) == 6
+    assert tb.historical_klines_weight('BTCBRL', '1h', 0, 10_000 * 60 * minute) == 2 * (10_001 // 1000 + 2)
+    year = tb.historical_klines_weight('BTCBRL', '1m', '365 days ago UTC')
+    assert year == pytest.approx(2 * (365 * 1440 // 1000 + 2), abs=2)
+
+
+def test_long_lookback_is_charged_what_the_server_counts(server):
+    client = tb.initialize_client('key', 'secret')
+    start = int(time.time() * 1000) // 60_000 * 60_000 - 3000 * 60_000
+    klines = client.get_historical_klines('BTCBRL', '1m', start)
+    assert len(klines) == 3001
+    charged = sum(weight for _, _, weight in server.requests)
+    assert [route for _, route, _ in server.requests] == ['klines'] * 5  # 1 + 4 páginas
+    assert tb.historical_klines_weight('BTCBRL', '1m', start) == charged
+    # O saldo local segue o peso informado pela exchange
+    assert client.budget.tokens == pytest.approx(client.budget.capacity - charged, abs=1)
+
+
+def test_rate_limit_response_is_retried_after_the_window(server, monkeypatch):
+    server.weight_limit, server.window = 4, 0.2
+    client = tb.initialize_client('key', 'secret')
+    prices = [client.get_symbol_ticker(symbol='BTCBRL') for _ in range(3)]
+    assert server.rejected == 1  # A terceira leitura passa do limite e é repetida após o Retry-After
+    assert all(float(price['price']) == server.exchange.price for price in prices)
+
+
+def test_orders_go_through_the_http_api(server):
+    client = tb.initialize_client('key', 'secret')
+    engine = tb.ExecutionEngine(client, ['BTCBRL'], 'market')
+    quantity = engine.prepare('BTCBRL', 0.0123456, server.exchange.price)
+    executed, price, order = engine.execute('BUY', 'BTCBRL', quantity, 'tb-http')
+    assert executed == pytest.approx(0.01234)
+    assert order['clientOrderId'] == 'tb-http'
+    assert server.exchange.balances['BTC'] == pytest.approx(0.01234)
+    history = client.get_all_orders(symbol='BTCBRL', startTime=0, limit=1000)
+    assert [item['clientOrderId'] for item in history] == ['tb-http']
+    assert np.isclose(price, float(history[0]['cummulativeQuoteQty']) / executed)
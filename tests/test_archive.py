@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+
+import TradingBot as tb
+
+
+def arrays(count, start_ms=1704067200000, step_ms=60_000, price=100.0):
+    """Candles de 1m em colunas, com todas as colunas de KLINE_DTYPES."""
+    candles = tb.synthetic_candles(count, seed=1, price=price)
+    open_time = start_ms + np.arange(count, dtype=np.int64) * step_ms
+    values = {name: np.asarray(candles[name]) for name in ('open', 'high', 'low', 'close', 'volume')}
+    return dict(values, open_time=open_time, close_time=open_time + step_ms - 1,
+                quote_asset_volume=values['close'] * values['volume'], number_of_trades=np.arange(count),
+                taker_buy_base_asset_volume=values['volume'] / 2,
+                taker_buy_quote_asset_volume=values['close'] * values['volume'] / 2)
+
+
+def test_archive_round_trip_across_days_with_merge(tmp_path):
+    archive = tb.CandleArchive('BTCBRL', '1m', str(tmp_path))
+    data = arrays(3000)  # ~2 dias
+    archive.write({name: values[:2000] for name, values in data.items()})
+    archive.write({name: values[1500:] for name, values in data.items()})  # Sobreposição: o mais novo prevalece
+    assert archive.days() == ['2024-01-01', '2024-01-02', '2024-01-03']
+    loaded = archive.load()
+    for name in ('open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time'):
+        np.testing.assert_array_equal(loaded[name], data[name])
+    start, end = int(data['open_time'][100]), int(data['open_time'][1600])
+    window = archive.load(start, end)
+    np.testing.assert_array_equal(window['close'], data['close'][100:1601])
+
+
+def test_archive_views_skip_incomplete_days(tmp_path):
+    archive = tb.CandleArchive('BTCBRL', '1m', str(tmp_path))
+    assert archive.views() == []
+    data = arrays(3000)
+    archive.write(data)
+    os.remove(os.path.join(archive.path, '2024-01-01', 'open_time.npy'))
+    views = archive.views()
+    assert [int(view['open_time'][0]) for view in views] == [int(data['open_time'][1440]), int(data['open_time'][2880])]
+    assert len(archive.load()['close']) == 3000 - 1440
+
+
+class KlinesClient:
+    def __init__(self, klines):
+        self.klines = klines
+
+    def get_historical_klines(self, symbol, interval, start_str=None, end_str=None, limit=1000, **params):
+        if isinstance(start_str, int):
+            return [kline for kline in self.klines if kline[0] >= start_str]
+        return list(self.klines)
+
+
+def to_klines(data):
+    names = list(tb.KLINE_DTYPES)
+    return [[data[name][i].item() for name in names] + [0] for i in range(len(data['open_time']))]
+
+
+def test_live_candle_store_updates_feed_the_archive(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data = arrays(200)
+    now = int(data['close_time'][149]) + 1  # O candle 150 ainda está aberto
+    monkeypatch.setattr(tb.time, 'time', lambda: now / 1000)
+    store = tb.CandleStore('BTCBRL', '1m', archive_root=str(tmp_path / 'candles'), lookback='1 day')
+    client = KlinesClient(to_klines({name: values[:151] for name, values in data.items()}))
+    store.update(client)
+    np.testing.assert_array_equal(store.archive.load()['open_time'], data['open_time'][:150])
+
+    client.klines = to_klines(data)
+    now = int(data['close_time'][-1]) + 1
+    store.update(client)
+    np.testing.assert_array_equal(store.archive.load()['close'], data['close'])
+    now += 60_000  # O push de candle fechado chega depois do fechamento
+    store.apply_kline(to_klines({name: values[-1:] + 60_000 for name, values in data.items()})[0], closed=True)
+    assert len(store.archive.load()['close']) == 201
+    store.conn.close()
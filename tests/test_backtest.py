@@ -0,0 +1,78 @@
+import argparse
+import sqlite3
+
+import numpy as np
+import pytest
+
+import TradingBot as tb
+
+
+def price_candles(closes):
+    """Candles de 1m em que o preço de cada candle é o seu fechamento."""
+    close = np.asarray(closes, dtype=float)
+    open_time = 1_700_000_000_000 + np.arange(len(close), dtype=np.int64) * 60_000
+    return {'open_time': open_time, 'open': close, 'high': close, 'low': close, 'close': close,
+            'volume': np.ones(len(close)), 'close_time': open_time + 59_999}
+
+
+@pytest.fixture
+def params(settings):
+    """Só o sinal de Fibonacci: compra até R$100 com alvo 1% acima, usando metade do saldo."""
+    return tb.get_strategy_params(dict(settings, BUY_PRICE='100', ORDER_MARGIN='1', BUY_MIN='1',
+                                       BALANCE_SAFE='0', PERCENTAGE_TO_USE='50'))
+
+
+def test_backtest_buys_below_buy_price_and_sells_at_the_target(params):
+    stats, rows = tb.run_backtest(price_candles([100, 100, 102, 105, 99, 110]), params, 1000.0, 0.0, 0.0, 1440)
+
+    realized = 500 * 0.02 + 250 * 0.02 + 507.5 / 99 * 11  # Duas compras de R$100 vendidas a 102 e uma de 99 a 110
+    assert stats['trades'] == stats['closed_trades'] == 3
+    assert stats['win_rate'] == 1.0
+    assert stats['realized_pnl'] == pytest.approx(realized)
+    assert stats['pnl'] == pytest.approx(realized)
+    assert stats['final_balance'] == pytest.approx(1000 + realized)
+    assert [(row[0], row[3], row[5], row[10]) for row in rows] == [
+        (1, 100.0, 102.0, 'closed'), (2, 100.0, 102.0, 'closed'), (3, 99.0, 110.0, 'closed')]
+    assert [row[2] * row[3] for row in rows] == pytest.approx([500.0, 250.0, 507.5])
+
+
+def test_backtest_waits_until_the_sale_pays_the_fees(params):
+    stats, rows = tb.run_backtest(price_candles([100, 101.5, 103]), params, 1000.0, 0.01, 0.01, 1440)
+
+    # A 101.5 o alvo (101) foi atingido, mas as taxas de 1% tornam a venda deficitária
+    assert stats['closed_trades'] == 1
+    assert rows[0][5] == 103.0
+    assert rows[0][8] == pytest.approx(tb.calcular_lucro_liquido(100.0, 103.0, 5.0, 0.01, 0.01))
+
+
+def test_backtest_evaluates_buys_every_step_candles(params):
+    stats, rows = tb.run_backtest(price_candles([100, 100, 100, 100, 100]), params, 1000.0, 0.0, 0.0, 1440, step=2)
+
+    assert stats['trades'] == 3  # Candles 0, 2 e 4
+    assert stats['closed_trades'] == 0
+    assert [row[10] for row in rows] == ['open'] * 3
+    assert stats['unrealized_value'] == pytest.approx(1000 - stats['final_balance'])
+    assert stats['pnl'] == pytest.approx(0.0)
+
+
+def test_backtest_drawdown_is_marked_to_market(params):
+    stats, _ = tb.run_backtest(price_candles([100, 80, 90]), params, 1000.0, 0.0, 0.0, 1440)
+
+    # R$500 comprados a 100 valem R$400 a 80: patrimônio de 1000 para 900
+    assert stats['max_drawdown'] == pytest.approx(0.1)
+
+
+def test_backtest_main_replays_the_archive_into_the_orders_table(settings, tmp_path):
+    candles = tb.synthetic_candles(3000, seed=3, price=320000.0)
+    tb.CandleArchive(tb.SYMBOL, tb.INTERVAL, tb.CANDLE_ARCHIVE_DIR).write(candles)
+    output = str(tmp_path / 'backtest.db')
+
+    tb.backtest_main(argparse.Namespace(download=None, start=None, end=None, output=output))
+
+    _, rows = tb.run_backtest(candles, tb.get_strategy_params(settings), tb.BACKTEST_BALANCE, tb.BACKTEST_MAKER_FEE,
+                              tb.BACKTEST_TAKER_FEE, tb.BACKTEST_WINDOW, step=1)  # TIME_CHECK de 60s = um candle de 1m
+    conn = sqlite3.connect(output)
+    saved = conn.execute('SELECT id, quantity, buy_price, sell_price, status FROM orders ORDER BY id').fetchall()
+    conn.close()
+    assert rows
+    assert saved == [(row[0], pytest.approx(row[2]), row[3], row[5], row[10]) for row in rows]
@@ -0,0 +1,60 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+import TradingBot as tb
+from conftest import ROOT
+
+
+def report(timings, created='2024-01-01 00:00:00'):
+    """Resultado no formato do benchmark: {(caminho, tamanho): menor tempo em segundos}."""
+    return {'meta': {'created': created},
+            'results': [{'name': name, 'group': 'candles', 'size': size, 'min': seconds}
+                        for (name, size), seconds in timings.items()]}
+
+
+BEFORE = {('backtest', 1000): 0.100, ('indicators', 1000): 0.100, ('resample', 1000): 0.100,
+          ('chart_rows', 1000): 0.100, ('removed', 1000): 0.100}
+AFTER = {('backtest', 1000): 0.105, ('indicators', 1000): 0.125, ('resample', 1000): 0.080,
+         ('chart_rows', 1000): 0.095, ('added', 1000): 0.100}
+BASELINE = report({**BEFORE, ('zero', 1000): 0.0})  # Tempo zero: qualquer aumento é regressão
+CURRENT = report({**AFTER, ('zero', 1000): 0.001})
+
+
+def test_compare_flags_only_changes_beyond_the_threshold():
+    table = tb.compare_benchmarks(BASELINE, CURRENT, threshold=0.1)
+    status = dict(zip(table['name'], table['status']))
+    assert status == {'backtest': 'ok', 'indicators': 'regressão', 'resample': 'melhora',
+                      'chart_rows': 'ok', 'zero': 'regressão'}  # Caminhos de um arquivo só ficam de fora
+    row = table[table['name'] == 'indicators'].iloc[0]
+    assert (row['antes_ms'], row['depois_ms'], row['razao']) == pytest.approx((100.0, 125.0, 1.25))
+    assert list(tb.compare_benchmarks(BASELINE, CURRENT, threshold=0.3)['status']).count('regressão') == 1
+
+
+def test_compare_without_common_paths_reports_no_regressions():
+    assert tb.log_benchmark_comparison(BASELINE, report({('other', 10): 1.0}), 0.1) == 0
+    assert tb.log_benchmark_comparison(BASELINE, CURRENT, 0.1) == 2
+
+
+def test_benchmark_results_compare_cleanly_with_themselves(settings):
+    results = tb.run_benchmarks([300], [30], repeat=1, window=100)
+    assert {row['group'] for row in results['results']} == {'candles', 'orders'}
+    table = tb.compare_benchmarks(results, results)
+    assert len(table) == len(results['results'])
+    assert set(table['status']) == {'ok'}
+
+
+@pytest.mark.parametrize('threshold, code', [('0.1', 1), ('0.5', 0)])
+def test_benchmark_compare_command_exits_with_1_on_regressions(tmp_path, threshold, code):
+    shutil.copy(os.path.join(ROOT, 'config.json'), tmp_path)
+    for name, data in (('antes.json', report(BEFORE)), ('depois.json', report(AFTER))):
+        with open(tmp_path / name, 'w') as f:
+            json.dump(data, f)
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'TradingBot.py'), 'benchmark-compare',
+                             'antes.json', 'depois.json', '--threshold', threshold],
+                            cwd=tmp_path, capture_output=True, text=True, timeout=120)
+    assert result.returncode == code, result.stderr
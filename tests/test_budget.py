@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+import TradingBot as tb
+from conftest import candle_frame
+from fake_exchange import SimulatedExchange
+
+
+@pytest.fixture
+def pairs(app, settings, monkeypatch):
+    """O par do app e mais dois em BRL e um em USDT, todos comprando a cada ciclo."""
+    extra = [tb.TradingPair(dict(settings, SYMBOL=symbol, MOEDA=asset))
+             for symbol, asset in (('ETHBRL', 'BRL'), ('SOLBRL', 'BRL'), ('BTCUSDT', 'USDT'))]
+    for pair in extra:
+        pair.candle_store.df = candle_frame()
+        pair.strategy.evaluate = app.strategy.evaluate
+    monkeypatch.setattr(tb, 'SIMULATION_BALANCE', 4000.0)
+    monkeypatch.setattr(tb, 'client', SimulatedExchange())  # Sem candles novos: usa os do cache
+    yield [app] + extra
+    for pair in extra:
+        pair.candle_store.conn.close()
+
+
+def bought(repository):
+    rows = repository.conn.execute("SELECT symbol, SUM(quantity * buy_price) FROM orders GROUP BY symbol").fetchall()
+    return {symbol: value for symbol, value in rows}
+
+
+async def cycle(pairs):
+    tb.quote_budget.reset()
+    await asyncio.gather(*(tb.run_pair_cycle(pair) for pair in pairs))
+
+
+def test_concurrent_pairs_split_the_quote_balance(pairs):
+    # PERCENTAGE_TO_USE 50% e BALANCE_SAFE R$1000: cada compra usa metade do que ainda está livre
+    asyncio.run(cycle(pairs))
+    spent = bought(tb.order_repository)
+    brl = sorted(value for symbol, value in spent.items() if symbol.endswith('BRL'))
+    assert brl == [pytest.approx(500.0), pytest.approx(1000.0), pytest.approx(2000.0)]
+    assert spent['BTCUSDT'] == pytest.approx(2000.0)  # Outra moeda cotada, outro orçamento
+
+    # O ciclo seguinte lê o saldo de novo
+    asyncio.run(cycle(pairs))
+    assert sum(bought(tb.order_repository).values()) == pytest.approx(2 * 5500.0)
+
+
+def test_budget_counts_pending_and_spent_until_the_next_read(app, monkeypatch):
+    exchange = SimulatedExchange(balances={'BRL': 4000.0})
+    monkeypatch.setattr(tb, 'client', exchange)
+    budget = tb.quote_budget
+    balance = tb.get_available_balance(asset='BRL')
+    with budget.reserve('BRL', balance, 1000.0, 0.5) as first:
+        with budget.reserve('BRL', balance, 1000.0, 0.5) as second:
+            assert (first, second) == (2000.0, 1000.0)
+        budget.spend('BRL', first)
+    assert budget.pending['BRL'] == 0.0
+    with budget.reserve('BRL', balance, 1000.0, 0.5) as third:
+        assert third == 1000.0  # Saldo em cache ainda sem a compra de R$2000
+
+    # A nova leitura já inclui o gasto, que deixa de ser descontado
+    exchange.balances['BRL'] = 2000.0
+    tb.invalidate_balance_cache()
+    balance = tb.get_available_balance(max_age=60, asset='BRL')
+    with budget.reserve('BRL', balance, 1000.0, 0.5) as fourth:
+        assert fourth == 1000.0
+    budget.spend('BRL', 500.0)
+    tb.refresh_balances()
+    assert budget.spent == {}
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+import TradingBot as tb
+
+START_MS = 1704067200000
+MINUTE_MS = 60_000
+
+
+def klines(count, price=100.0):
+    """Candles de 1m no formato da API (12 campos), a partir de START_MS."""
+    candles = tb.synthetic_candles(count, seed=1, price=price)
+    rows = []
+    for i in range(count):
+        open_time = START_MS + i * MINUTE_MS
+        close = float(candles['close'][i])
+        rows.append([open_time, float(candles['open'][i]), float(candles['high'][i]), float(candles['low'][i]), close,
+                     float(candles['volume'][i]), open_time + MINUTE_MS - 1, close * float(candles['volume'][i]), i,
+                     0.0, 0.0, 0])
+    return rows
+
+
+class KlinesClient:
+    """Exchange com os candles até `now` (o último ainda em aberto); registra o início de cada busca."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.now = None
+        self.starts = []
+
+    def get_historical_klines(self, symbol, interval, start_str=None, end_str=None, limit=1000, **params):
+        self.starts.append(start_str)
+        visible = [row for row in self.rows if row[0] < self.now]
+        if isinstance(start_str, int):
+            return [row for row in visible if row[0] >= start_str]
+        return visible[-100:]  # LOOKBACK: os 100 candles mais recentes
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {'ms': 0}
+    monkeypatch.setattr(tb.time, 'time', lambda: now['ms'] / 1000)
+    return now
+
+
+def at(client, clock, index, offset=MINUTE_MS // 2):
+    """Relógio no meio do candle `index` (que fica em aberto)."""
+    clock['ms'] = client.now = START_MS + index * MINUTE_MS + offset
+
+
+def test_update_fetches_only_new_candles_and_refetches_the_open_one(tmp_path, clock):
+    rows = klines(400)
+    client = KlinesClient(rows)
+    store = tb.CandleStore('BTCBRL', '1m', str(tmp_path / 'candles.db'), str(tmp_path / 'candles'), lookback='100 min')
+    at(client, clock, 199)
+    assert store.update(client) == 100  # Sem cache: backfill com o LOOKBACK do par
+    assert client.starts == ['100 min']
+    assert store.last_candle_open
+
+    at(client, clock, 205)  # O candle 199 fechou desde a última busca: é buscado de novo
+    assert store.update(client) == 7
+    assert client.starts[-1] == rows[199][0]
+    assert store.last_candle_open and store.last_open_time == rows[205][0]
+
+    at(client, clock, 205, offset=MINUTE_MS)  # Candle 205 fechado: a próxima busca começa depois dele
+    store.update(client)
+    assert client.starts[-1] == rows[205][0]
+    store.update(client)
+    assert client.starts[-1] == rows[205][6] + 1
+
+    expected = tb.klines_to_dataframe(rows[106:206])
+    assert len(store.df) == store.window == 100
+    np.testing.assert_array_equal(store.df['close'].to_numpy(), expected['close'].to_numpy())
+    assert list(store.df.index) == list(expected.index)
+    store.conn.close()
+
+
+def test_restart_backfills_without_duplicating_the_cache(tmp_path, clock):
+    rows = klines(300)
+    client = KlinesClient(rows)
+    db_path, archive = str(tmp_path / 'candles.db'), str(tmp_path / 'candles')
+    store = tb.CandleStore('BTCBRL', '1m', db_path, archive, lookback='100 min')
+    at(client, clock, 150)
+    store.update(client)
+    at(client, clock, 160)
+    store.update(client)
+    store.conn.close()
+
+    at(client, clock, 170)
+    restarted = tb.CandleStore('BTCBRL', '1m', db_path, archive, lookback='100 min')
+    restarted.update(client)
+    count, distinct = restarted.conn.execute(
+        'SELECT COUNT(*), COUNT(DISTINCT open_time) FROM klines WHERE symbol = ? AND interval = ?',
+        ('BTCBRL', '1m')).fetchone()
+    assert count == distinct == 171 - 51  # Do primeiro backfill (candle 51) ao candle 170
+    persisted = restarted.load_arrays()
+    np.testing.assert_array_equal(persisted['close'], [row[4] for row in rows[51:171]])
+    assert len(restarted.df) == 100 and restarted.df.index[-1] == tb.klines_to_dataframe(rows[170:171]).index[0]
+    restarted.conn.close()
@@ -0,0 +1,72 @@
+import queue
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import TradingBot as tb
+from conftest import candle_frame
+
+
+def test_chart_deltas_rebuild_the_full_series(monkeypatch):
+    monkeypatch.setattr(tb, '_chart_cursors', {})
+    history = candle_frame(700)
+    pair = SimpleNamespace(symbol='BTCBRL', candle_store=SimpleNamespace(df=None))
+    messages = queue.Queue()
+    data = np.empty((0, 2 + len(tb.CHART_SMA_PERIODS)))
+    for shift in range(0, 400, 37):
+        df = history.iloc[shift:shift + 300].copy()
+        if shift < 370:
+            df.iloc[-1, df.columns.get_loc('close')] *= 1.01  # Último candle ainda em aberto
+        pair.candle_store.df = df
+        tb.send_chart_update(messages, pair)
+        symbol, first_time, rows = messages.get_nowait()
+        assert symbol == 'BTCBRL'
+        assert len(rows) == (300 if shift == 0 else 38)  # Do último candle enviado em diante, não a janela toda
+        data = tb.merge_chart_rows(data, first_time, rows)
+
+    window = history.iloc[shift:shift + 300]
+    closes = history['close']
+    np.testing.assert_array_equal(data[:, 0], window.index.values.astype('datetime64[ms]').astype(np.int64))
+    np.testing.assert_array_equal(data[:, 1], window['close'].to_numpy())
+    # As SMAs enviadas aos poucos são as da série completa, mesmo depois que a janela deslizou
+    for col, period in enumerate(tb.CHART_SMA_PERIODS, 2):
+        expected = closes.rolling(period).mean().to_numpy()[shift:shift + 300]
+        np.testing.assert_allclose(data[:, col], expected, rtol=1e-12)
+
+
+def test_full_chart_queue_keeps_the_cursor(monkeypatch):
+    monkeypatch.setattr(tb, '_chart_cursors', {})
+    pair = SimpleNamespace(symbol='BTCBRL', candle_store=SimpleNamespace(df=candle_frame(300)))
+    messages = queue.Queue()
+    for _ in range(5):
+        messages.put(None)
+    tb.send_chart_update(messages, pair)
+    assert tb._chart_cursors == {}
+    for _ in range(5):
+        messages.get_nowait()
+    tb.send_chart_update(messages, pair)
+    assert len(messages.get_nowait()[2]) == 300
+
+
+def test_downsample_keeps_the_envelope_of_each_bucket():
+    rng = np.random.default_rng(0)
+    x = np.arange(10_000, dtype=float)
+    y = np.cumsum(rng.normal(size=len(x)))
+    y[:150] = np.nan  # Início de uma SMA
+
+    xs, ys = tb.downsample_minmax(x, y, 100)
+
+    assert len(xs) == len(ys) == 200
+    assert np.all(np.diff(xs) >= 0)
+    assert np.nanmin(ys) == np.nanmin(y) and np.nanmax(ys) == np.nanmax(y)
+    for bucket in range(100):
+        values = y[bucket * 100:(bucket + 1) * 100]
+        if not np.isnan(values).all():
+            assert ys[2 * bucket:2 * bucket + 2] == pytest.approx([np.nanmin(values), np.nanmax(values)])
+
+
+def test_downsample_leaves_short_series_unchanged():
+    x, y = np.arange(150.0), np.arange(150.0)
+    xs, ys = tb.downsample_minmax(x, y, 100)
+    assert xs is x and ys is y
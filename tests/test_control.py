@@ -0,0 +1,94 @@
+import json
+import signal
+import urllib.error
+import urllib.request
+
+import pytest
+
+import TradingBot as tb
+
+TOKEN = 's3cr3t'
+
+
+@pytest.fixture
+def control_api():
+    control = tb.BotControl()
+    server = tb.start_control_server('127.0.0.1', 0, control, TOKEN)
+    yield control, f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def call(url, method='POST', token=TOKEN):
+    request = urllib.request.Request(url, method=method, data=b'' if method == 'POST' else None,
+                                     headers={'X-Control-Token': token} if token is not None else {})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+@pytest.mark.parametrize('token', [None, '', 'errado', TOKEN + 'x'])
+def test_commands_without_the_token_are_rejected(control_api, token):
+    control, url = control_api
+    assert call(url + '/pause', token=token)[0] == 401
+    assert call(url + '/status', 'GET', token=token)[0] == 401
+    assert control.status() == {'paused': False, 'draining': False, 'reload_pending': False}
+
+
+def test_pause_resume_and_toggle_wake_the_loop(control_api):
+    control, url = control_api
+    woken = []
+    control.subscribe(lambda: woken.append(control.status()['paused']))
+
+    assert call(url + '/pause') == (200, {'paused': True, 'draining': False, 'reload_pending': False})
+    assert control.wake.is_set()
+    control.wait(0)
+    assert not control.wake.is_set()
+    assert call(url + '/pause')[1]['paused']  # Pausar de novo não acorda o loop
+    assert call(url + '/resume')[1]['paused'] is False
+    assert call(url + '/toggle')[1]['paused'] is True
+    assert call(url + '/status', 'GET') == (200, control.status())
+    assert woken == [True, False, True]
+
+
+def test_reload_is_taken_once_and_drain_is_final(control_api):
+    control, url = control_api
+    assert call(url + '/reload')[1]['reload_pending']
+    assert control.take_reload()
+    assert not control.take_reload()
+    assert call(url + '/drain')[1]['draining']
+    assert call(url + '/resume')[1]['draining']
+
+
+def test_unknown_routes_are_404(control_api):
+    _, url = control_api
+    assert call(url + '/shutdown')[0] == 404
+    assert call(url + '/pause', 'GET')[0] == 404
+
+
+def test_without_a_token_the_api_is_open():
+    control = tb.BotControl()
+    server = tb.start_control_server('127.0.0.1', 0, control)
+    try:
+        assert call(f'http://127.0.0.1:{server.server_port}/pause', token=None)[1]['paused']
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_signals_reload_toggle_and_drain(monkeypatch):
+    installed = {}
+    monkeypatch.setattr(tb.signal, 'signal', lambda signum, handler: installed.__setitem__(signum, handler))
+    control = tb.BotControl()
+    tb.install_signal_handlers(control)
+
+    installed[signal.SIGUSR1](signal.SIGUSR1, None)
+    assert control.paused
+    installed[signal.SIGHUP](signal.SIGHUP, None)
+    assert control.take_reload()
+    installed[signal.SIGTERM](signal.SIGTERM, None)
+    assert control.draining
+    with pytest.raises(KeyboardInterrupt):  # Segundo sinal: sai sem esperar o ciclo
+        installed[signal.SIGINT](signal.SIGINT, None)
@@ -0,0 +1,176 @@
+import pytest
+
+import TradingBot as tb
+from fake_exchange import SimulatedExchange
+from test_orders import aggregates, assert_rows_equal, recomputed
+
+
+class RejectingMakerExchange(SimulatedExchange):
+    """Recusa toda LIMIT_MAKER como se ela fosse cruzar o livro."""
+
+    def create_order(self, symbol, side, type, quantity, price=None, newClientOrderId=None, **params):
+        if type == 'LIMIT_MAKER':
+            self._reject(-2010, 'Order would immediately match and take.')
+        return super().create_order(symbol, side, type, quantity, price, newClientOrderId, **params)
+
+
+class PartialMakerExchange(SimulatedExchange):
+    """Executa `fill` da LIMIT_MAKER logo após o envio; o restante fica no livro."""
+
+    def __init__(self, fill: float, **kwargs):
+        super().__init__(**kwargs)
+        self.fill = fill
+
+    def create_order(self, symbol, side, type, quantity, price=None, newClientOrderId=None, **params):
+        order = super().create_order(symbol, side, type, quantity, price, newClientOrderId, **params)
+        with self.lock:
+            self._fill(self.orders[order['orderId']], self.fill, float(price))
+            return dict(self.orders[order['orderId']])
+
+
+class PartialMakerRejectedRemainderExchange(PartialMakerExchange):
+    """Executa parte da LIMIT_MAKER e recusa a ordem a mercado do restante."""
+
+    def _market(self, side, **params):
+        self._reject(-2010, 'Account has insufficient balance for requested action.')
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(tb, 'EXECUTION_POLL_INTERVAL', 0.01)
+
+
+def engine_for(exchange, mode='market'):
+    return tb.ExecutionEngine(exchange, [exchange.symbol], mode, limit_timeout=0.05)
+
+
+def test_symbol_filters_round_and_reject():
+    filters = tb.SymbolFilters(SimulatedExchange().get_symbol_info('BTCBRL'))
+    assert filters.round_quantity(0.123456789) == 0.12345
+    assert filters.round_price(100.005, 'BUY') == 100.0
+    assert filters.round_price(100.005, 'SELL') == 100.01
+    assert filters.format_quantity(0.1) == '0.10000'
+    assert 'LOT_SIZE' in filters.rejection(0.000001, 300000.0)
+    assert 'NOTIONAL' in filters.rejection(0.00002, 300000.0)
+    assert filters.rejection(0.0001, 300000.0) is None
+    tenths = tb.SymbolFilters({'filters': [{'filterType': 'LOT_SIZE', 'stepSize': '0.1', 'minQty': '0.1'}]})
+    assert tenths.round_quantity(0.3) == 0.3  # 0.3 / 0.1 = 2.9999... não perde um passo
+
+
+def test_prepare_rounds_and_skips_rejected_orders():
+    engine = engine_for(SimulatedExchange())
+    assert engine.prepare('BTCBRL', 0.000123456, 300000.0) == 0.00012
+    assert engine.prepare('BTCBRL', 0.00002, 300000.0) == 0.0  # R$6 abaixo do NOTIONAL de R$10
+    with pytest.raises(ValueError):
+        engine.prepare('ETHBRL', 1.0, 100.0)
+
+
+def test_market_order_returns_average_fill_price():
+    exchange = SimulatedExchange(level_quantity=0.01)
+    executed, price, order = engine_for(exchange).execute('BUY', 'BTCBRL', 0.025, 'tb-buy')
+    asks = [level for level, _ in exchange._levels('asks')]
+    assert executed == pytest.approx(0.025)
+    assert price == pytest.approx((asks[0] * 0.01 + asks[1] * 0.01 + asks[2] * 0.005) / 0.025)
+    assert order['status'] == 'FILLED' and order['clientOrderId'] == 'tb-buy'
+
+
+def test_market_order_partial_fill_when_book_runs_out():
+    exchange = SimulatedExchange(levels=2, level_quantity=0.01, balances={'BTC': 1.0, 'BRL': 0.0})
+    executed, _, order = engine_for(exchange).execute('SELL', 'BTCBRL', 0.05, 'tb-sell')
+    assert executed == pytest.approx(0.02)
+    assert order['status'] == 'EXPIRED'
+
+
+def test_rejected_maker_falls_back_to_market():
+    exchange = RejectingMakerExchange()
+    executed, _, order = engine_for(exchange, 'limit').execute('SELL', 'BTCBRL', 0.005, 'tb-sell')
+    assert executed == pytest.approx(0.005)
+    assert (order['type'], order['clientOrderId']) == ('MARKET', 'tb-sell')
+
+
+def test_unfilled_maker_sell_goes_to_market_with_suffix():
+    exchange = SimulatedExchange()
+    executed, _, _ = engine_for(exchange, 'limit').execute('SELL', 'BTCBRL', 0.005, 'tb-sell')
+    maker, market = exchange.orders.values()
+    assert (maker['type'], maker['status']) == ('LIMIT_MAKER', 'CANCELED')
+    assert (market['type'], market['clientOrderId'], market['status']) == ('MARKET', 'tb-sell-m', 'FILLED')
+    assert executed == pytest.approx(0.005)
+
+
+def test_unfilled_maker_buy_is_abandoned():
+    exchange = SimulatedExchange()
+    executed, price, order = engine_for(exchange, 'limit').execute('BUY', 'BTCBRL', 0.005, 'tb-buy')
+    assert (executed, price, order['status']) == (0.0, 0.0, 'CANCELED')
+    assert len(exchange.orders) == 1
+
+
+def test_maker_fill_executed_between_poll_and_cancel():
+    exchange = SimulatedExchange()
+    engine = engine_for(exchange, 'limit')
+    original_cancel = exchange.cancel_order
+
+    def cancel_after_fill(**params):
+        exchange.set_price(exchange.price * 1.01)  # Cruza a LIMIT_MAKER de venda antes do cancelamento
+        return original_cancel(**params)
+    exchange.cancel_order = cancel_after_fill
+    executed, price, order = engine.execute('SELL', 'BTCBRL', 0.005, 'tb-sell')
+    assert executed == pytest.approx(0.005)
+    assert order['status'] == 'FILLED' and len(exchange.orders) == 1
+
+
+def test_partial_maker_fill_with_remainder_below_notional():
+    exchange = PartialMakerExchange(fill=0.004)
+    executed, price, _ = engine_for(exchange, 'limit').execute('SELL', 'BTCBRL', 0.00403, 'tb-sell')
+    # R$9 restantes ficam abaixo do NOTIONAL: a sobra não é enviada a mercado
+    assert executed == pytest.approx(0.004)
+    assert len(exchange.orders) == 1
+    assert price == pytest.approx(float(exchange.orders[1]['price']))
+
+
+def test_partial_maker_fill_with_remainder_rejected_at_market(app):
+    exchange = PartialMakerRejectedRemainderExchange(fill=0.002)
+    executed, price, order = engine_for(exchange, 'limit').execute('SELL', 'BTCBRL', 0.005, 'tb-sell')
+    assert executed == pytest.approx(0.002)
+    assert price == pytest.approx(float(exchange.orders[1]['price']))
+    assert (order['type'], order['clientOrderId']) == ('LIMIT_MAKER', 'tb-sell')
+
+
+def test_trade_records_the_maker_leg_when_the_remainder_is_rejected(app, monkeypatch):
+    exchange = PartialMakerRejectedRemainderExchange(fill=0.002, balances={'BTC': 1.0, 'BRL': 0.0})
+    monkeypatch.setattr(tb, 'SIMULATION_MODE', False)
+    monkeypatch.setattr(tb, 'execution_engine', engine_for(exchange, 'limit'))
+    monkeypatch.setattr(tb.fee_provider, 'get', lambda: (0.0, 0.0))
+    repository = tb.order_repository
+    order_id = repository.insert('2024-01-01 00:00:00', 0.005, 200000.0, 250000.0, app.symbol)
+
+    tb.trade(current_price=exchange.price, evaluate_buy=False, pair=app)
+
+    closed = repository.conn.execute('SELECT quantity, status FROM orders WHERE id = ?', (order_id,)).fetchone()
+    assert closed == pytest.approx((0.002, 'closed'))
+    assert repository.pending_intents() == []
+    # Só o restante não vendido volta a ser candidato à venda no próximo tick
+    assert [row[2] for row in repository.sellable_orders(exchange.price, app.symbol)] == pytest.approx([0.003])
+    assert_rows_equal(aggregates(repository)[0], recomputed(repository)[0])
+
+
+def test_trade_closes_only_the_executed_part_of_a_sell(app, monkeypatch):
+    exchange = SimulatedExchange(levels=3, level_quantity=0.01, balances={'BTC': 1.0, 'BRL': 0.0})
+    monkeypatch.setattr(tb, 'SIMULATION_MODE', False)
+    monkeypatch.setattr(tb, 'execution_engine', engine_for(exchange))
+    repository = tb.order_repository
+    order_id = repository.insert('2024-01-01 00:00:00', 0.05, 200000.0, 250000.0, app.symbol)
+
+    tb.trade(current_price=exchange.price, evaluate_buy=False, pair=app)
+
+    closed = repository.conn.execute(
+        'SELECT quantity, value_purchased, value_end, status FROM orders WHERE id = ?', (order_id,)).fetchone()
+    remainder = repository.conn.execute(
+        "SELECT quantity, value_purchased, buy_price, target_price FROM orders WHERE status = 'open'").fetchall()
+    sold_quote = sum(float(order['cummulativeQuoteQty']) for order in exchange.orders.values())
+    assert closed == pytest.approx((0.03, 6000.0, sold_quote, 'closed'))
+    assert remainder == [pytest.approx((0.02, 4000.0, 200000.0, 250000.0))]
+    assert repository.pending_intents() == []
+    assert repository.open_positions[app.symbol] == pytest.approx([0.02, 4000.0])
+    assert [row[2] for row in repository.sellable_orders(exchange.price, app.symbol)] == pytest.approx([0.02])
+    assert_rows_equal(aggregates(repository)[0], recomputed(repository)[0])
+    assert_rows_equal(aggregates(repository)[1], recomputed(repository)[1])
@@ -0,0 +1,48 @@
+import TradingBot as tb
+
+
+class Fetch:
+    """get_trading_fees() falso: devolve os resultados na ordem e conta as chamadas."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.results.pop(0)
+
+
+def test_fees_are_cached_for_the_ttl(monkeypatch):
+    fetch = Fetch((0.001, 0.002), (0.0005, 0.001))
+    provider = tb.FeeProvider(fetch, ttl=60)
+    now = [1000.0]
+    monkeypatch.setattr(tb.time, 'time', lambda: now[0])
+    assert provider.get() == (0.001, 0.002)
+    now[0] += 59
+    assert provider.get() == (0.001, 0.002)
+    assert fetch.calls == 1
+    now[0] += 2
+    assert provider.get() == (0.0005, 0.001)
+    assert fetch.calls == 2
+
+
+def test_failed_first_fetch_is_not_cached():
+    fetch = Fetch((0.0, 0.0), (0.001, 0.001))
+    provider = tb.FeeProvider(fetch, ttl=3600)
+    assert provider.get() == (0.0, 0.0)
+    assert provider.get() == (0.001, 0.001)  # Nova tentativa já na consulta seguinte
+    assert provider.get() == (0.001, 0.001)
+    assert fetch.calls == 2
+
+
+def test_failed_renewal_keeps_the_previous_fees(monkeypatch):
+    fetch = Fetch((0.001, 0.001), (0.0, 0.0))
+    provider = tb.FeeProvider(fetch, ttl=60)
+    now = [1000.0]
+    monkeypatch.setattr(tb.time, 'time', lambda: now[0])
+    provider.get()
+    now[0] += 61
+    assert provider.get() == (0.001, 0.001)
+    assert provider.get() == (0.001, 0.001)
+    assert fetch.calls == 2
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import TradingBot as tb
+
+
+def random_walk(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return 300000.0 * np.exp(np.cumsum(rng.normal(0.0, 0.002, count)))
+
+
+def wilder_rsi(closes, period):
+    """RSI de referência em pandas: médias de Wilder (ewm adjust=False) de ganhos e perdas."""
+    delta = pd.Series(closes).diff().iloc[1:]
+    gain = delta.clip(lower=0).ewm(alpha=1 / period, min_periods=period, adjust=False).mean()
+    loss = (-delta).clip(lower=0).ewm(alpha=1 / period, min_periods=period, adjust=False).mean()
+    rsi = (100 - 100 / (1 + gain / loss)).where(loss != 0, 100.0).where(gain.notna())
+    return np.concatenate(([np.nan], rsi.to_numpy()))
+
+
+@pytest.mark.parametrize('period', [1, 14, 50])
+def test_rolling_sma_matches_pandas(period):
+    closes = random_walk(1000)
+    expected = pd.Series(closes).rolling(period).mean().to_numpy()
+    sma = tb.RollingSMA(period)
+    for i, close in enumerate(closes):
+        assert sma.value(peek=close) == pytest.approx(expected[i], rel=1e-12, nan_ok=True)
+        sma.update(close)
+        assert sma.value() == pytest.approx(expected[i], rel=1e-12, nan_ok=True)
+    np.testing.assert_allclose(tb.sma_batch(closes, period), expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize('span', [12, 26, 200])
+def test_exponential_average_matches_pandas(span):
+    closes = random_walk(1000, seed=1)
+    alpha = 2.0 / (span + 1)
+    expected = pd.Series(closes).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    ema = tb.ExponentialAverage(alpha)
+    for i, close in enumerate(closes):
+        assert ema.value(peek=close) == pytest.approx(expected[i], rel=1e-12)
+        ema.update(close)
+        assert ema.value() == pytest.approx(expected[i], rel=1e-12)
+    np.testing.assert_allclose(tb.ewm_batch(closes, alpha), expected, rtol=1e-10)
+
+
+@pytest.mark.parametrize('period', [2, 14, 30])
+def test_wilder_rsi_matches_pandas(period):
+    closes = random_walk(1000, seed=2)
+    expected = wilder_rsi(closes, period)
+    rsi = tb.WilderRSI(period)
+    for i, close in enumerate(closes):
+        assert rsi.value(peek=close) == pytest.approx(expected[i], rel=1e-9, nan_ok=True)
+        rsi.update(close)
+        assert rsi.value() == pytest.approx(expected[i], rel=1e-9, nan_ok=True)
+    np.testing.assert_allclose(tb.rsi_batch(closes, period), expected, rtol=1e-9)
+
+
+def test_wilder_rsi_without_losses_is_100():
+    rsi = tb.WilderRSI(14)
+    for close in np.arange(1.0, 31.0):
+        rsi.update(close)
+    assert rsi.value() == 100.0
+    assert tb.rsi_batch(np.arange(1.0, 31.0), 14)[-1] == 100.0
+
+
+@pytest.mark.parametrize('window', [1, 20, 500])
+def test_rolling_min_max_matches_pandas(window):
+    closes = random_walk(2000, seed=3)
+    series = pd.Series(closes)
+    # Antes de completar a janela o incremental usa os candles disponíveis (min_periods=1)
+    lows = series.rolling(window, min_periods=1).min().to_numpy()
+    highs = series.rolling(window, min_periods=1).max().to_numpy()
+    tracker = tb.RollingMinMax(window)
+    for i, close in enumerate(closes):
+        tracker.update(close)
+        assert tracker.value() == (lows[i], highs[i])
+    batch_lows, batch_highs = tb.rolling_min_max_batch(closes, window)
+    np.testing.assert_array_equal(batch_lows, series.rolling(window).min().to_numpy())
+    np.testing.assert_array_equal(batch_highs, series.rolling(window).max().to_numpy())
+
+
+def test_indicator_engine_sliding_window_matches_batch():
+    """Sincroniza uma janela deslizante (como a do CandleStore) e compara com o recálculo completo."""
+    closes = random_walk(1500, seed=4)
+    index = pd.date_range('2024-01-01', periods=len(closes), freq='min')
+    frame = pd.DataFrame({'open': closes, 'high': closes, 'low': closes, 'close': closes}, index=index)
+    window = 300
+    engine = tb.IndicatorEngine(14)
+    rng = np.random.default_rng(5)
+    end = window
+    while end <= len(closes):
+        engine.sync(frame.iloc[end - window:end])
+        history = closes[:end]  # O último candle (em aberto) entra só como peek
+        values = engine.values(float(history[-1]))
+        assert values['rsi'] == pytest.approx(wilder_rsi(history, 14)[-1], rel=1e-9)
+        for period in (50, 200):
+            assert values[f'sma_{period}'] == pytest.approx(pd.Series(history).rolling(period).mean().iloc[-1], rel=1e-12)
+        for period in (12, 26):
+            expected = pd.Series(history).ewm(span=period, adjust=False).mean().iloc[-1]
+            assert values[f'ema_{period}'] == pytest.approx(expected, rel=1e-12)
+        assert (values['support'], values['resistance']) == (history[-window:].min(), history[-window:].max())
+        end += int(rng.integers(1, 20))
@@ -0,0 +1,23 @@
+import logging
+import queue
+
+import TradingBot as tb
+
+
+def test_deferred_handler_freezes_mutable_arguments():
+    records = queue.SimpleQueue()
+    handler = tb.DeferredQueueHandler(records)
+    log = logging.getLogger('tradingbot.test')
+    log.addHandler(handler)
+    log.propagate = False
+    try:
+        order = {'status': 'NEW', 'executedQty': '0'}
+        log.warning("Ordem: %s, preço %.2f", order, 100.0)
+        order.update(status='FILLED', executedQty='1')  # Alterada antes de o listener formatar
+    finally:
+        log.removeHandler(handler)
+    record = records.get_nowait()
+    assert record.getMessage() == "Ordem: {'status': 'NEW', 'executedQty': '0'}, preço 100.00"
+    assert record.args is None
+    formatted = tb.JsonFormatter().format(record)
+    assert "'status': 'NEW'" in formatted and 'FILLED' not in formatted
@@ -0,0 +1,92 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+import TradingBot as tb
+
+
+def samples(text):
+    """Linhas de amostra do formato de texto do Prometheus: {série: valor}."""
+    return {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in text.splitlines() if line and not line.startswith('#')}
+
+
+def test_render_counters_gauges_and_cumulative_histograms():
+    registry = tb.Metrics()
+    registry.inc('tradingbot_api_requests_total', endpoint='get_account')
+    registry.inc('tradingbot_api_requests_total', 2, endpoint='get_account')
+    registry.set('tradingbot_open_orders', 3, symbol='BTC"BRL')
+    for value in (0.001, 0.003, 0.2, 20.0):
+        registry.observe('tradingbot_trade_cycle_seconds', value, symbol='BTCBRL')
+
+    text = registry.render()
+    values = samples(text)
+
+    assert '# TYPE tradingbot_api_requests_total counter' in text
+    assert '# TYPE tradingbot_trade_cycle_seconds histogram' in text
+    assert values['tradingbot_api_requests_total{endpoint="get_account"}'] == 3.0
+    assert values['tradingbot_open_orders{symbol="BTC\\"BRL"}'] == 3.0
+    bucket = 'tradingbot_trade_cycle_seconds_bucket{symbol="BTCBRL",le="%s"}'
+    assert values[bucket % '0.001'] == 1  # O limite é inclusivo (le)
+    assert values[bucket % '0.005'] == 2
+    assert values[bucket % '0.25'] == 3
+    assert values[bucket % '10.0'] == 3
+    assert values[bucket % '+Inf'] == 4
+    assert values['tradingbot_trade_cycle_seconds_count{symbol="BTCBRL"}'] == 4
+    assert values['tradingbot_trade_cycle_seconds_sum{symbol="BTCBRL"}'] == pytest.approx(20.204)
+
+
+def test_a_failing_collector_does_not_break_the_others():
+    registry = tb.Metrics()
+
+    def broken(_):
+        raise RuntimeError("coletor quebrado")
+
+    registry.add_collector(broken)
+    registry.add_collector(lambda r: r.set('tradingbot_risk_exposure', 10.0))
+    assert samples(registry.render()) == {'tradingbot_risk_exposure': 10.0}
+
+
+@pytest.fixture
+def server(settings, tmp_path, monkeypatch):
+    registry = tb.Metrics()
+    monkeypatch.setattr(tb, 'metrics', registry)
+    profiler = tb.SamplingProfiler()
+    profiler.samples['TradingBot.py:main;TradingBot.py:trade'] = 7
+    server = tb.start_metrics_server('127.0.0.1', 0, profiler)
+    yield registry, f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_metrics_endpoint_serves_the_registry_and_the_collectors(server, tmp_path, monkeypatch):
+    registry, url = server
+    repository = tb.OrderRepository(str(tmp_path / 'orders.db'), default_symbol='BTCBRL')
+    order_id = repository.insert('2024-01-01 00:00:00', 0.5, 100.0, 101.0, 'BTCBRL')
+    repository.insert('2024-01-01 00:01:00', 0.5, 100.0, 120.0, 'BTCBRL')
+    repository.close_orders([order_id], 'closed', 110.0, '2024-01-01 01:00:00')
+    monkeypatch.setitem(tb.last_prices, 'BTCBRL', 104.0)
+    registry.add_collector(repository.collect_metrics)
+    registry.inc('tradingbot_api_requests_total', endpoint='get_symbol_ticker')
+
+    with urllib.request.urlopen(url + '/metrics', timeout=5) as response:
+        assert response.status == 200
+        assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+        values = samples(response.read().decode('utf-8'))
+
+    assert values['tradingbot_api_requests_total{endpoint="get_symbol_ticker"}'] == 1.0
+    assert values['tradingbot_open_orders{symbol="BTCBRL"}'] == 1.0
+    assert values['tradingbot_realized_pnl{symbol="BTCBRL"}'] == pytest.approx(5.0)
+    assert values['tradingbot_open_exposure{symbol="BTCBRL"}'] == pytest.approx(50.0)
+    assert values['tradingbot_unrealized_pnl{symbol="BTCBRL"}'] == pytest.approx(2.0)
+    repository.close()
+
+
+def test_profile_endpoint_and_unknown_paths(server):
+    _, url = server
+    with urllib.request.urlopen(url + '/profile', timeout=5) as response:
+        assert response.read().decode('utf-8') == 'TradingBot.py:main;TradingBot.py:trade 7\n'
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(url + '/orders', timeout=5)
+    assert error.value.code == 404
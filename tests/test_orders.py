@@ -0,0 +1,201 @@
+import random
+import sqlite3
+import time
+
+import pytest
+
+import TradingBot as tb
+
+
+def aggregates(repository):
+    daily = repository.conn.execute(
+        'SELECT day, symbol, buys, buy_value, sells, sell_value, realized_pnl, wins, losses FROM pnl_daily '
+        'ORDER BY day, symbol').fetchall()
+    symbols = repository.conn.execute(
+        'SELECT symbol, open_orders, open_quantity, open_cost, closed_orders, realized_pnl, wins, losses, '
+        'peak_pnl, max_drawdown FROM pnl_symbol ORDER BY symbol').fetchall()
+    return daily, symbols
+
+
+def recomputed(repository):
+    """Os mesmos agregados por GROUP BY sobre a tabela orders."""
+    conn = repository.conn
+    buys = {(day, symbol): (count, value) for day, symbol, count, value in conn.execute(
+        'SELECT substr(date_buy, 1, 10), symbol, COUNT(*), SUM(value_purchased) FROM orders GROUP BY 1, 2')}
+    sells = {(day, symbol): row for day, symbol, *row in conn.execute(
+        "SELECT substr(date_sell, 1, 10), symbol, COUNT(*), SUM(value_end), SUM(profit), SUM(profit > 0), "
+        "SUM(profit <= 0) FROM orders WHERE status = 'closed' GROUP BY 1, 2")}
+    daily = [(day, symbol) + buys.get((day, symbol), (0, 0.0)) + tuple(sells.get((day, symbol), (0, 0.0, 0.0, 0, 0)))
+             for day, symbol in sorted(set(buys) | set(sells))]
+    symbols = []
+    for (symbol,) in conn.execute('SELECT DISTINCT symbol FROM orders ORDER BY symbol').fetchall():
+        open_orders, open_quantity, open_cost = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(value_purchased), 0) FROM orders "
+            "WHERE status = 'open' AND symbol = ?", (symbol,)).fetchone()
+        profits = [profit for (profit,) in conn.execute(
+            "SELECT profit FROM orders WHERE status = 'closed' AND symbol = ? ORDER BY date_sell, id", (symbol,))]
+        cumulative = peak = drawdown = 0.0
+        for profit in profits:
+            cumulative += profit
+            peak = max(peak, cumulative)
+            drawdown = max(drawdown, peak - cumulative)
+        symbols.append((symbol, open_orders, open_quantity, open_cost, len(profits), cumulative,
+                        sum(profit > 0 for profit in profits), sum(profit <= 0 for profit in profits), peak, drawdown))
+    return daily, symbols
+
+
+def assert_rows_equal(actual, expected):
+    assert len(actual) == len(expected)
+    for row, reference in zip(actual, expected):
+        assert row == pytest.approx(reference, abs=1e-6)
+
+
+def test_incremental_aggregates_match_group_by(settings, tmp_path):
+    repository = tb.OrderRepository(str(tmp_path / 'orders.db'), default_symbol='BTCBRL')
+    rng = random.Random(7)
+    open_ids = []
+    for minute in range(600):
+        date = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(1704067200 + minute * 397))  # ~3 dias, em ordem
+        symbol = rng.choice(['BTCBRL', 'ETHBRL'])
+        price = rng.uniform(100.0, 200.0)
+        open_ids.append(repository.insert(date, rng.uniform(0.01, 1.0), price, price * 1.01, symbol))
+        if rng.random() < 0.4 and open_ids:
+            batch = rng.sample(open_ids, min(len(open_ids), rng.randint(1, 3)))
+            repository.close_orders(batch, 'closed', rng.uniform(100.0, 200.0), date)
+            open_ids = [order_id for order_id in open_ids if order_id not in batch]
+    actual = aggregates(repository)
+    assert_rows_equal(actual[0], recomputed(repository)[0])
+    assert_rows_equal(actual[1], recomputed(repository)[1])
+    # Um banco que só tem a tabela orders chega aos mesmos agregados pela migração
+    repository.conn.execute('DROP TABLE pnl_daily')
+    repository.conn.execute('DROP TABLE pnl_symbol')
+    repository.conn.execute('PRAGMA user_version = 4')
+    repository.conn.commit()
+    repository.close()
+    migrated = tb.OrderRepository(str(tmp_path / 'orders.db'))
+    assert_rows_equal(aggregates(migrated)[0], actual[0])
+    assert_rows_equal(aggregates(migrated)[1], actual[1])
+    migrated.close()
+
+
+def test_closing_twice_changes_neither_orders_nor_aggregates(settings, tmp_path):
+    repository = tb.OrderRepository(str(tmp_path / 'orders.db'), default_symbol='BTCBRL')
+    order_id = repository.insert('2024-01-01 00:00:00', 0.5, 100.0, 101.0, 'BTCBRL')
+    assert repository.close_orders([order_id], 'closed', 110.0, '2024-01-01 01:00:00') == [(order_id, 110.0, 55.0, 5.0)]
+    before = aggregates(repository), repository.conn.execute('SELECT * FROM orders').fetchall()
+    assert repository.close_orders([order_id], 'closed', 90.0, '2024-01-02 00:00:00') == []
+    after = aggregates(repository), repository.conn.execute('SELECT * FROM orders').fetchall()
+    assert after == before
+    assert_rows_equal(aggregates(repository)[1], recomputed(repository)[1])
+    assert repository.open_positions['BTCBRL'] == pytest.approx([0.0, 0.0])
+    repository.close()
+
+
+def memory_state(repository):
+    return ({symbol: [row[0] for row in index.rows] for symbol, index in repository.open_indexes.items()},
+            {symbol: list(position) for symbol, position in repository.open_positions.items()},
+            dict(repository.realized_pnl))
+
+
+def snapshot(repository, engine):
+    return (memory_state(repository), {symbol: list(position) for symbol, position in engine.positions.items()},
+            repository.conn.execute('SELECT * FROM orders').fetchall())
+
+
+def test_failed_transaction_leaves_memory_and_listeners_unchanged(settings, tmp_path, monkeypatch):
+    repository = tb.OrderRepository(str(tmp_path / 'orders.db'), default_symbol='BTCBRL')
+    engine = tb.RiskEngine(repository)
+    order_id = repository.insert('2024-01-01 00:00:00', 0.5, 100.0, 101.0, 'BTCBRL')
+    before = snapshot(repository, engine)
+
+    def fail(client_order_ids, status):
+        raise sqlite3.OperationalError('database is locked')
+    monkeypatch.setattr(repository, '_finish_intents', fail)
+    with pytest.raises(sqlite3.OperationalError):
+        repository.close_orders([order_id], 'closed', 110.0, '2024-01-01 01:00:00', ['tb-sell'],
+                                fills={order_id: (0.3, 0.2)})
+    with pytest.raises(sqlite3.OperationalError):
+        repository.insert('2024-01-01 02:00:00', 0.1, 100.0, 101.0, 'BTCBRL', 'tb-buy')
+    after = snapshot(repository, engine)
+    assert after == before
+    assert [row[0] for row in repository.sellable_orders(101.0, 'BTCBRL')] == [order_id]
+    repository.close()
+
+
+class FailingCommit:
+    """Conexão cujo commit falha (ex.: disco cheio): o SQLite desfaz a transação inteira."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *exc):
+        if exc[0] is not None:
+            return self.conn.__exit__(*exc)
+        self.conn.rollback()
+        raise sqlite3.OperationalError('disk I/O error')
+
+
+def test_failed_commit_keeps_in_memory_pnl_equal_to_the_aggregates(settings, tmp_path):
+    repository = tb.OrderRepository(str(tmp_path / 'orders.db'), default_symbol='BTCBRL')
+    day = time.strftime('%Y-%m-%d')
+    first = repository.insert(day + ' 00:00:00', 0.5, 100.0, 101.0, 'BTCBRL')
+    second = repository.insert(day + ' 00:01:00', 0.5, 100.0, 101.0, 'BTCBRL')
+    repository.close_orders([first], 'closed', 90.0, day + ' 00:02:00')
+    engine = tb.RiskEngine(repository)
+
+    repository.conn = FailingCommit(repository.conn)
+    with pytest.raises(sqlite3.OperationalError):
+        repository.close_orders([second], 'closed', 120.0, day + ' 00:03:00')
+    with pytest.raises(sqlite3.OperationalError):
+        repository.insert(day + ' 00:04:00', 1.0, 100.0, 101.0, 'BTCBRL')
+    repository.conn = repository.conn.conn
+
+    daily, symbols = recomputed(repository)
+    assert_rows_equal(aggregates(repository)[0], daily)
+    assert_rows_equal(aggregates(repository)[1], symbols)
+    (symbol, _, open_quantity, open_cost, _, realized, *_), = symbols
+    assert repository.realized_pnl[symbol] == pytest.approx(realized) == pytest.approx(-5.0)
+    assert repository.open_positions[symbol] == pytest.approx([open_quantity, open_cost])
+    assert engine.daily_pnl == pytest.approx(repository.realized_on(day))
+    assert engine.positions[symbol] == pytest.approx([open_quantity, open_cost])
+    assert [row[0] for row in repository.sellable_orders(101.0, symbol)] == [second]
+    repository.close()
+
+
+def sql_sellable(repository, price, symbol):
+    return [row[0] for row in repository.conn.execute(
+        "SELECT id FROM orders WHERE status = 'open' AND symbol = ? AND target_price <= ? ORDER BY target_price, id",
+        (symbol, price))]
+
+
+def test_open_order_index_matches_the_sql_range_query(settings, tmp_path):
+    repository = tb.OrderRepository(str(tmp_path / 'orders.db'), default_symbol='BTCBRL')
+    rng = random.Random(11)
+    targets = [100.0 + step for step in range(0, 50, 5)]  # Poucos alvos distintos: muitos empates
+    open_ids = []
+    for minute in range(400):
+        date = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(1704067200 + minute * 60))
+        target = rng.choice(targets)
+        open_ids.append(repository.insert(date, 1.0, target / 1.01, target, rng.choice(['BTCBRL', 'ETHBRL'])))
+        if rng.random() < 0.3:
+            batch = rng.sample(open_ids, min(len(open_ids), rng.randint(1, 4)))
+            # Metade das vendas é parcial: o restante volta ao índice como uma nova ordem
+            fills = {order_id: (0.4, 0.6) for order_id in batch if rng.random() < 0.5}
+            repository.close_orders(batch, 'closed', 150.0, date, fills=fills)
+            open_ids = [row[0] for row in repository.open_orders()]
+
+    reopened = tb.OrderRepository(str(tmp_path / 'orders.db'))
+    for symbol in ('BTCBRL', 'ETHBRL'):
+        for price in [99.0] + targets + [112.5, 200.0]:
+            expected = sql_sellable(repository, price, symbol)
+            assert [row[0] for row in repository.sellable_orders(price, symbol)] == expected
+            assert [row[0] for row in reopened.sellable_orders(price, symbol)] == expected
+        assert len(repository.open_indexes[symbol]) == len(sql_sellable(repository, 200.0, symbol))
+    reopened.close()
+    repository.close()
@@ -0,0 +1,31 @@
+import pytest
+
+import TradingBot as tb
+from fake_exchange import SimulatedExchange
+
+
+class RecordingExchange(SimulatedExchange):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.starts = []
+
+    def get_historical_klines(self, symbol, interval, start_str=None, end_str=None, limit=1000, **params):
+        self.starts.append((symbol, interval, start_str))
+        return super().get_historical_klines(symbol, interval, start_str, end_str, limit, **params)
+
+
+def test_candle_store_backfills_with_the_pair_lookback(settings):
+    pair = tb.TradingPair(dict(settings, SYMBOL='ETHBRL', INTERVAL='5m', LOOKBACK='3 hours'))
+    exchange = RecordingExchange()
+    pair.candle_store.update(exchange)  # Sem backfill prévio: o update faz o backfill do par
+    assert exchange.starts == [('ETHBRL', '5m', '3 hours')]
+    pair.candle_store.conn.close()
+
+
+def test_stream_mode_with_several_pairs_is_rejected(settings):
+    tb.load_settings(dict(settings, API_KEY='key', API_SECRET='secret', STREAM_MODE=True,
+                          SYMBOLS=['BTCBRL', 'ETHBRL']))
+    with pytest.raises(ValueError, match='STREAM_MODE'):
+        tb.validate_settings()
+    tb.load_settings(dict(settings, API_KEY='key', API_SECRET='secret', STREAM_MODE=True, SYMBOLS=['BTCBRL']))
+    tb.validate_settings()
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+import TradingBot as tb
+
+
+def varied_candles(count, seed=0):
+    """Candles com corpos e sombras bem variados, para que todos os padrões apareçam."""
+    rng = np.random.default_rng(seed)
+    open_price = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.01, count)))
+    body = rng.normal(0.0, 0.01, count) * rng.choice([0.02, 1.0, 3.0], count)  # Dojis, corpos normais e longos
+    close = open_price * (1 + body)
+    shadows = rng.exponential(0.005, (2, count)) * rng.choice([0.0, 0.05, 1.0], (2, count))
+    high = np.maximum(open_price, close) * (1 + shadows[0])
+    low = np.minimum(open_price, close) * (1 - shadows[1])
+    return open_price, high, low, close
+
+
+def scalar_patterns(o, h, l, c, i):
+    """Os padrões do candle i avaliados um a um, direto das definições."""
+    found = {
+        'hammer': c[i] > o[i] and (h[i] - c[i]) < (c[i] - l[i]) * 0.2,
+        'inverted_hammer': c[i] > o[i] and (o[i] - l[i]) < (h[i] - o[i]) * 0.2,
+        'shooting_star': c[i] < o[i] and (c[i] - l[i]) < (h[i] - c[i]) * 0.2,
+        'doji': h[i] - l[i] > 0 and abs(c[i] - o[i]) <= (h[i] - l[i]) * tb.DOJI_BODY_RATIO,
+        'bullish_engulfing': False, 'bearish_engulfing': False, 'morning_star': False, 'evening_star': False,
+    }
+    if i >= 1:
+        found['bullish_engulfing'] = c[i - 1] < o[i - 1] and c[i] > o[i] and o[i] <= c[i - 1] and c[i] >= o[i - 1]
+        found['bearish_engulfing'] = c[i - 1] > o[i - 1] and c[i] < o[i] and o[i] >= c[i - 1] and c[i] <= o[i - 1]
+    if i >= 2:
+        star = abs(c[i - 1] - o[i - 1]) < abs(c[i - 2] - o[i - 2]) * 0.3
+        middle = (o[i - 2] + c[i - 2]) / 2
+        found['morning_star'] = c[i - 2] < o[i - 2] and star and c[i] > o[i] and c[i] > middle
+        found['evening_star'] = c[i - 2] > o[i - 2] and star and c[i] < o[i] and c[i] < middle
+    return found
+
+
+def scalar_scan(o, h, l, c):
+    rows = [scalar_patterns(o, h, l, c, i) for i in range(len(c))]
+    masks = {name: np.array([row[name] for row in rows], dtype=bool) for name in tb.CANDLE_PATTERNS}
+    bias = [sum(tb.CANDLE_PATTERNS[name][2] for name, hit in row.items() if hit) for row in rows]
+    return masks, np.sign(bias).astype(np.int8)
+
+
+def test_vectorized_scan_matches_the_scalar_detectors():
+    o, h, l, c = varied_candles(3000)
+    masks, signal = scalar_scan(o, h, l, c)
+    assert all(mask.sum() >= 5 for mask in masks.values())  # Todos os padrões aparecem na amostra
+
+    scanned = tb.scan_candle_patterns(o, h, l, c)
+    for name in tb.CANDLE_PATTERNS:
+        np.testing.assert_array_equal(scanned[name], masks[name], err_msg=name)
+    np.testing.assert_array_equal(tb.pattern_signal(scanned), signal)
+    # O detector de martelo usado pela estratégia concorda com a máscara
+    assert [tb.detect_hammer_candle(o[i], c[i], l[i], h[i]) for i in range(50)] == list(masks['hammer'][:50])
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_incremental_scanner_matches_the_scalar_detectors(seed):
+    o, h, l, c = varied_candles(1500, seed)
+    masks, signal = scalar_scan(o, h, l, c)
+    rng = np.random.default_rng(seed)
+    scanner = tb.CandlePatternScanner()
+    start = 0
+    while start < len(c):
+        end = min(len(c), start + int(rng.choice([0, 1, 2, 3, 50])))  # Inclui atualizações vazias
+        new_masks, new_signal = scanner.update(o[start:end], h[start:end], l[start:end], c[start:end])
+        for name in tb.CANDLE_PATTERNS:
+            np.testing.assert_array_equal(new_masks[name], masks[name][start:end], err_msg=f"{name} {start}:{end}")
+        np.testing.assert_array_equal(new_signal, signal[start:end])
+        if end > start:
+            assert scanner.last_signal == signal[end - 1]
+            assert scanner.last_masks == {name: masks[name][end - 1] for name in tb.CANDLE_PATTERNS}
+        start = end
+
+
+def test_scanner_with_selected_patterns_only():
+    o, h, l, c = varied_candles(500, seed=4)
+    masks, _ = scalar_scan(o, h, l, c)
+    scanner = tb.CandlePatternScanner(['morning_star', 'doji'])
+    new_masks, new_signal = scanner.update(o, h, l, c)
+    assert list(new_masks) == ['morning_star', 'doji']
+    np.testing.assert_array_equal(new_signal, masks['morning_star'].astype(np.int8))  # O doji não tem viés
+    with pytest.raises(ValueError):
+        tb.scan_candle_patterns(o, h, l, c, ['three_white_soldiers'])
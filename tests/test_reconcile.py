@@ -0,0 +1,97 @@
+import pytest
+
+import TradingBot as tb
+from fake_exchange import SimulatedExchange
+
+
+@pytest.fixture
+def crash(settings, tmp_path):
+    """Um orders.db e a exchange; restart() reabre o banco como uma nova execução do bot."""
+    class Crash:
+        path = str(tmp_path / 'orders.db')
+        exchange = SimulatedExchange(balances={'BRL': 100000.0, 'BTC': 1.0})
+        repository = tb.OrderRepository(path, default_symbol='BTCBRL')
+
+        def restart(self):
+            self.repository.close()  # Queda: nada além do que já foi gravado fica no banco
+            self.repository = tb.OrderRepository(self.path, default_symbol='BTCBRL')
+            return tb.reconcile_orders(self.exchange, self.repository)
+
+        def orders(self):
+            return self.repository.conn.execute(
+                'SELECT id, quantity, buy_price, status, sell_price, client_order_id FROM orders ORDER BY id').fetchall()
+
+        def intents(self):
+            return dict(self.repository.conn.execute('SELECT client_order_id, status FROM order_intents').fetchall())
+
+    state = Crash()
+    yield state
+    state.repository.close()
+
+
+def test_intent_without_order_is_marked_failed(crash):
+    client_order_id = crash.repository.begin_intent('BUY', 'BTCBRL', 0.001, 300000.0, 303000.0)
+    assert crash.restart() == 1
+    assert crash.intents() == {client_order_id: 'failed'}
+    assert crash.orders() == []
+    assert crash.repository.checkpoint('BTCBRL') is not None
+
+
+def test_buy_placed_but_not_recorded_is_inserted_once(crash):
+    client_order_id = crash.repository.begin_intent('BUY', 'BTCBRL', 0.002, 300000.0, 303000.0)
+    order = crash.exchange.order_market_buy(symbol='BTCBRL', quantity='0.002', newClientOrderId=client_order_id)
+    assert crash.restart() == 1
+    ((order_id, quantity, buy_price, status, _, recorded_id),) = crash.orders()
+    assert (quantity, status, recorded_id) == (pytest.approx(0.002), 'open', client_order_id)
+    assert buy_price == pytest.approx(float(order['cummulativeQuoteQty']) / 0.002)
+    assert crash.intents() == {client_order_id: 'done'}
+    assert crash.repository.sellable_orders(10 ** 9, 'BTCBRL')[0][0] == order_id
+    assert crash.restart() == 0  # Nova inicialização: nada pendente, nenhuma compra duplicada
+    assert len(crash.orders()) == 1
+
+
+def test_sell_filled_but_not_closed_is_closed(crash):
+    order_id = crash.repository.insert('2024-01-01 00:00:00', 0.003, 250000.0, 260000.0, 'BTCBRL')
+    client_order_id = crash.repository.begin_intent('SELL', 'BTCBRL', 0.003, 300000.0, order_ids=[order_id])
+    order = crash.exchange.order_market_sell(symbol='BTCBRL', quantity='0.003', newClientOrderId=client_order_id)
+    assert crash.restart() == 1
+    ((_, quantity, _, status, sell_price, _),) = crash.orders()
+    assert (quantity, status) == (pytest.approx(0.003), 'closed')
+    assert sell_price == pytest.approx(float(order['cummulativeQuoteQty']) / 0.003)
+    assert crash.repository.open_positions['BTCBRL'] == pytest.approx([0.0, 0.0])
+    assert crash.repository.realized_pnl['BTCBRL'] == pytest.approx(float(order['cummulativeQuoteQty']) - 750.0)
+    assert crash.intents() == {client_order_id: 'done'}
+
+
+def test_partially_filled_sell_keeps_the_rest_open(crash):
+    order_id = crash.repository.insert('2024-01-01 00:00:00', 0.02, 250000.0, 260000.0, 'BTCBRL')
+    client_order_id = crash.repository.begin_intent('SELL', 'BTCBRL', 0.02, 300000.0, order_ids=[order_id])
+    crash.exchange.levels = 1  # O livro só tem 0.01 do lado da compra: a ordem expira pela metade
+    crash.exchange.order_market_sell(symbol='BTCBRL', quantity='0.02', newClientOrderId=client_order_id)
+    crash.restart()
+    (closed, remainder) = crash.orders()
+    assert (closed[1], closed[3]) == (pytest.approx(0.01), 'closed')
+    assert (remainder[1], remainder[2], remainder[3]) == (pytest.approx(0.01), 250000.0, 'open')
+
+
+def test_maker_with_market_remainder_is_summed(crash):
+    client_order_id = crash.repository.begin_intent('BUY', 'BTCBRL', 0.004, 300000.0, 303000.0)
+    maker = crash.exchange.create_order('BTCBRL', 'BUY', 'LIMIT_MAKER', '0.004', price='299000',
+                                        newClientOrderId=client_order_id)
+    crash.exchange.cancel_order(orderId=maker['orderId'])
+    crash.exchange.order_market_buy(symbol='BTCBRL', quantity='0.004', newClientOrderId=client_order_id + '-m')
+    crash.restart()
+    ((_, quantity, _, status, _, recorded_id),) = crash.orders()
+    assert (quantity, status, recorded_id) == (pytest.approx(0.004), 'open', client_order_id)
+
+
+def test_order_still_working_stays_pending(crash):
+    client_order_id = crash.repository.begin_intent('BUY', 'BTCBRL', 0.004, 300000.0, 303000.0)
+    crash.exchange.create_order('BTCBRL', 'BUY', 'LIMIT_MAKER', '0.004', price='299000', newClientOrderId=client_order_id)
+    crash.restart()
+    assert crash.intents() == {client_order_id: 'pending'}
+    assert crash.orders() == []
+    crash.exchange.set_price(298000.0)  # A ordem executa enquanto o bot está parado
+    crash.restart()
+    assert crash.intents() == {client_order_id: 'done'}
+    assert crash.orders()[0][2] == pytest.approx(299000.0)
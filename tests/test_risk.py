@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+import TradingBot as tb
+
+
+def open_orders(repository):
+    return repository.conn.execute("SELECT quantity, buy_price FROM orders WHERE status = 'open'").fetchall()
+
+
+def test_trade_without_risk_engine_buys(app):
+    assert tb.risk_engine is None
+    tb.trade(current_price=100.0, pair=app)
+    assert len(open_orders(tb.order_repository)) == 1
+
+
+def test_reserve_clips_to_position_limit(app, monkeypatch):
+    engine = tb.RiskEngine(tb.order_repository, {app.symbol: (300.0, 0.0)})
+    monkeypatch.setattr(tb, 'risk_engine', engine)
+    for _ in range(4):
+        tb.trade(current_price=100.0, pair=app)
+    assert sum(quantity * price for quantity, price in open_orders(tb.order_repository)) == pytest.approx(300.0)
+    assert engine.positions[app.symbol][1] == pytest.approx(300.0)
+    assert engine.blocked(app.symbol, 100.0) == 'position'
+
+
+def test_daily_loss_breaker_trips_and_rearms(app):
+    repository = tb.order_repository
+    engine = tb.RiskEngine(repository, max_daily_loss=50.0)
+    now = time.strftime('%Y-%m-%d %H:%M:%S')
+    order_id = repository.insert(now, 1.0, 100.0, 110.0, app.symbol)
+    with engine.reserve(app.symbol, 1.0, 100.0) as quantity:
+        assert quantity == 1.0
+    repository.close_orders([order_id], 'closed', 40.0, now)
+    assert engine.daily_pnl == pytest.approx(-60.0)
+    assert engine.blocked(app.symbol, 100.0) == 'daily_loss'
+    with engine.reserve(app.symbol, 1.0, 100.0) as quantity:
+        assert quantity == 0.0
+    engine.day_end = 0.0  # Virada do dia
+    assert engine.blocked(app.symbol, 100.0) is None
+    # O lucro do dia é recarregado do pnl_daily por um motor novo
+    assert tb.RiskEngine(repository, max_daily_loss=50.0).tripped
+
+
+def test_order_rate_and_global_exposure(app):
+    engine = tb.RiskEngine(tb.order_repository, max_exposure=250.0, max_orders_per_minute=2)
+    with engine.reserve('BTCBRL', 1.0, 100.0) as first, engine.reserve('ETHBRL', 2.0, 100.0) as second:
+        assert (first, second) == (1.0, pytest.approx(1.5))  # A reserva em andamento conta na exposição
+    assert engine.pending_cost == pytest.approx(0.0)
+    with engine.reserve('BTCBRL', 0.1, 100.0) as third:
+        assert third == 0.0
+    assert engine.blocked('BTCBRL', 100.0) == 'order_rate'
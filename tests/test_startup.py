@@ -0,0 +1,33 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+IMPORT_TIME_BUDGET = 2.0  # Segundos; sem pandas e python-binance o import leva uma fração disso
+
+IMPORT_SCRIPT = '''
+import json, socket, sys, time
+
+def offline(*args, **kwargs):
+    raise OSError("rede bloqueada no teste de import")
+
+socket.socket.connect = socket.create_connection = offline
+started = time.perf_counter()
+import TradingBot
+elapsed = time.perf_counter() - started
+print(json.dumps({"elapsed": elapsed, "modules": sorted(name for name in ("pandas", "binance") if name in sys.modules)}))
+'''
+
+
+def test_import_without_config_or_network_is_fast(tmp_path):
+    # Interpretador novo (módulos não carregados), num diretório sem config.json
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.splitlines()[-1])
+    assert report['modules'] == []
+    assert report['elapsed'] < IMPORT_TIME_BUDGET
+    assert os.listdir(tmp_path) == []  # Nem log, nem orders.db, nem candles.db
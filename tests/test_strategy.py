@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+import TradingBot as tb
+
+
+def check_buy_criteria(criteria, current_price, suporte, resistencia, buy_price_limit, order_margin, tolerance,
+                       fibonacci_level):
+    """Critério de compra anterior aos sinais componíveis, como era compartilhado por trade() e o backtest."""
+    if criteria == "fibonacci":
+        fibonacci_price = current_price - (current_price * fibonacci_level)
+        return current_price <= buy_price_limit and current_price >= fibonacci_price, current_price * (1 + order_margin)
+    if criteria == "support_resistance":
+        return current_price <= suporte * (1 + tolerance), resistencia
+    raise ValueError(f"Critério de trade inválido: {criteria}")
+
+
+@pytest.fixture
+def candles():
+    return tb.synthetic_candles(2000, seed=3, price=100.0)
+
+
+def fibonacci_params(settings, candles, **overrides):
+    """Só o sinal FIBONACCI ativo, com o BUY_PRICE no meio dos preços para haver compras e recusas.
+
+    A tolerância estreita faz a regra de retração recusar parte das compras da regra original."""
+    cfg = dict(settings, SUPPORT_RESISTANCE=False, HAMMER_CANDLE=False, RSI=False, CANDLE_PATTERNS=[], FIBONACCI=True,
+               BUY_PRICE=str(np.median(candles['close'])), FIBONACCI_TOLERANCE='0.1')
+    cfg.update(overrides)
+    return tb.get_strategy_params(cfg)
+
+
+def test_fibonacci_default_matches_the_original_rule(settings, candles):
+    params = fibonacci_params(settings, candles)
+    assert params['FIBONACCI_MODE'] == 'buy_price'
+    window = 100
+    buy, _, targets, _, _ = tb.build_strategy(params, window).evaluate(candles['close'], candles, series=True)
+    supports, resistances = tb.backtest_support_resistance(candles['close'], window)
+    expected = [check_buy_criteria('fibonacci', price, support, resistance, params['BUY_PRICE'], params['ORDER_MARGIN'],
+                                   params['FIBONACCI_TOLERANCE'], tb.FIBONACCI_LEVELS[0])
+                for price, support, resistance in zip(candles['close'], supports, resistances)]
+    assert 0 < buy.sum() < len(buy)
+    np.testing.assert_array_equal(buy, [decision for decision, _ in expected])
+    np.testing.assert_allclose(targets, [target for _, target in expected])
+
+    # Em trade() (escalares) a decisão é a mesma
+    strategy = tb.build_strategy(params, window)
+    for i in range(0, len(buy), 97):
+        assert bool(strategy.evaluate(candles['close'][i], {})[0]) == buy[i]
+
+
+def test_fibonacci_retracement_is_a_subset_of_the_original_rule(settings, candles):
+    window = 100
+    original = tb.build_strategy(fibonacci_params(settings, candles), window)
+    params = fibonacci_params(settings, candles, FIBONACCI_MODE='retracement')
+    retracement = tb.build_strategy(params, window)
+    buy_original = original.evaluate(candles['close'], candles, series=True)[0]
+    buy, _, _, _, ctx = retracement.evaluate(candles['close'], candles, series=True)
+
+    distance = np.abs(ctx['fibonacci_levels'] / candles['close'][:, None] - 1).min(axis=1)
+    np.testing.assert_array_equal(buy, buy_original & (distance <= params['FIBONACCI_TOLERANCE']))
+    assert 0 < buy.sum() < buy_original.sum()  # Mudança de comportamento: compra menos que a regra original
+
+
+def test_invalid_fibonacci_mode(settings, candles):
+    with pytest.raises(ValueError):
+        tb.build_strategy(fibonacci_params(settings, candles, FIBONACCI_MODE='levels'))
+
+
+def original_decisions(params, candles, window):
+    supports, resistances = tb.backtest_support_resistance(candles['close'], window)
+    return np.array([check_buy_criteria(params['TRADE_CRITERIA'], price, support, resistance, params['BUY_PRICE'],
+                                        params['ORDER_MARGIN'], params['FIBONACCI_TOLERANCE'],
+                                        tb.FIBONACCI_LEVELS[0])[0]
+                     for price, support, resistance in zip(candles['close'], supports, resistances)])
+
+
+@pytest.mark.parametrize('criteria', ['fibonacci', 'support_resistance'])
+def test_shipped_config_reproduces_the_trade_criteria(settings, candles, criteria):
+    params = tb.get_strategy_params(dict(settings, TRADE_CRITERIA=criteria, BUY_PRICE=str(np.median(candles['close']))))
+    window = 100
+    buy = tb.build_strategy(params, window).evaluate(candles['close'], candles, series=True)[0]
+    expected = original_decisions(params, candles, window)
+    assert 0 < expected.sum() < len(expected)
+    np.testing.assert_array_equal(buy, expected)
+
+
+def test_buy_price_vetoes_the_combined_vote(settings, candles):
+    cfg = dict(settings, FIBONACCI=True, SUPPORT_RESISTANCE=True, HAMMER_CANDLE=True, RSI=True,
+               BUY_PRICE=str(np.median(candles['close'])), STRATEGY_THRESHOLD='0.25')
+    params = tb.get_strategy_params(cfg)
+    strategy = tb.build_strategy(params, 100)
+    buy, combined, _, votes, _ = strategy.evaluate(candles['close'], candles, series=True)
+    above = candles['close'] > params['BUY_PRICE']
+    assert (above & (combined >= params['STRATEGY_THRESHOLD'])).any()  # Os outros sinais superam o voto contra
+    assert not (buy & above).any()
+    np.testing.assert_array_equal(buy[~above], (combined >= params['STRATEGY_THRESHOLD'])[~above])
+    assert not strategy.evaluate(params['BUY_PRICE'] * 1.01, {'support': params['BUY_PRICE'] * 2, 'resistance': 1e9,
+                                                               'hammer': True, 'rsi': 10.0})[0]
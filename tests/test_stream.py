@@ -0,0 +1,119 @@
+import queue
+import threading
+
+import pytest
+
+import TradingBot as tb
+
+
+def replay_klines(count=320, start=300):
+    """Candles depois dos 300 de candle_frame(), no formato bruto da API."""
+    return tb.synthetic_klines(tb.synthetic_candles(count, price=100.0))[start:]
+
+
+def test_replay_source_emits_each_closed_kline_then_its_close_price():
+    klines = replay_klines()
+    events = []
+    source = tb.ReplaySource(klines)
+    source.start(on_trade=lambda price, ts: events.append(('trade', price, ts)),
+                 on_kline=lambda kline, closed: events.append(('kline', kline, closed)))
+    assert source.finished.wait(5)
+    source.stop()
+    expected = []
+    for kline in klines:
+        expected += [('kline', kline, True), ('trade', float(kline[4]), int(kline[6]))]
+    assert events == expected
+
+
+def test_replay_source_stops_before_the_end():
+    klines = replay_klines()
+    prices = []
+    delivered = threading.Event()
+    source = tb.ReplaySource(klines, speed=20)
+
+    def on_trade(price, ts):
+        prices.append(price)
+        delivered.set()
+
+    source.start(on_trade=on_trade, on_kline=lambda kline, closed: None)
+    assert delivered.wait(5)
+    source.stop()
+    assert len(prices) < len(klines)
+    assert source.finished.is_set()  # Sem mais eventos: o loop do stream pode sair
+
+
+class FakeWebsocketManager:
+    def __init__(self, api_key=None, api_secret=None):
+        self.sockets = {}
+        self.stopped = False
+
+    def start(self):
+        pass
+
+    def start_trade_socket(self, callback, symbol):
+        self.sockets['trade'] = (callback, symbol)
+
+    def start_kline_socket(self, callback, symbol, interval):
+        self.sockets['kline'] = (callback, symbol, interval)
+
+    def start_depth_socket(self, callback, symbol, interval):
+        self.sockets['depth'] = (callback, symbol)
+
+    def stop(self):
+        self.stopped = True
+
+
+def test_binance_stream_source_translates_socket_messages(monkeypatch):
+    import binance
+    monkeypatch.setattr(binance, 'ThreadedWebsocketManager', FakeWebsocketManager)
+    trades, klines, depth = [], [], []
+    source = tb.BinanceStreamSource('key', 'secret', 'BTCBRL', '1m')
+    source.on_depth = depth.append
+    source.start(on_trade=lambda price, ts: trades.append((price, ts)),
+                 on_kline=lambda kline, closed: klines.append((kline, closed)))
+    twm = source.twm
+    assert twm.sockets['kline'][1:] == ('BTCBRL', '1m')
+    handle = twm.sockets['trade'][0]
+
+    handle({'e': 'trade', 'p': '301000.50', 'T': 1700000000123})
+    handle({'e': 'kline', 'k': {'t': 1700000000000, 'o': '1', 'h': '2', 'l': '0.5', 'c': '1.5', 'v': '10',
+                                'T': 1700000059999, 'q': '15', 'n': 7, 'V': '5', 'Q': '7.5', 'B': '0', 'x': False}})
+    message = {'e': 'depthUpdate', 'U': 1, 'u': 2, 'b': [], 'a': []}
+    handle(message)
+    handle({'e': 'error', 'm': 'desconectado'})
+
+    assert trades == [(301000.5, 1700000000123)]
+    assert klines == [([1700000000000, '1', '2', '0.5', '1.5', '10', 1700000059999, '15', 7, '5', '7.5', '0'], False)]
+    assert depth == [message]
+    source.stop()
+    assert twm.stopped
+
+
+@pytest.fixture
+def stream(app, monkeypatch):
+    """run_market_stream sobre um replay, com trade() substituído por um registro das chamadas."""
+    calls = []
+    monkeypatch.setattr(tb, 'control', tb.BotControl())
+    monkeypatch.setattr(tb, 'TIME_CHECK', 3600)
+    monkeypatch.setattr(tb, 'trade', lambda current_price, evaluate_buy: calls.append((current_price, evaluate_buy)))
+    return calls
+
+
+def test_market_stream_applies_every_kline_and_trades_on_the_last_price(app, stream):
+    klines = replay_klines()
+    charts = queue.Queue()
+    tb.run_market_stream(tb.ReplaySource(klines), charts)
+
+    assert app.candle_store.last_open_time == klines[-1][0]
+    assert app.candle_store.df['close'].iloc[-1] == pytest.approx(float(klines[-1][4]))
+    assert len(app.candle_store.load_klines()) == len(klines)
+    assert stream[0][1] and not any(evaluate for _, evaluate in stream[1:])  # Compra avaliada uma vez por TIME_CHECK
+    assert stream[-1][0] == pytest.approx(float(klines[-1][4]))
+    assert not charts.empty()
+
+
+def test_market_stream_paused_does_not_trade(app, stream):
+    tb.control.pause()
+    tb.run_market_stream(tb.ReplaySource(replay_klines()), queue.Queue())
+    assert stream == []
+    assert app.candle_store.last_open_time is not None  # Os candles continuam sendo aplicados
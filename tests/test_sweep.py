@@ -0,0 +1,39 @@
+import itertools
+
+import pytest
+
+import TradingBot as tb
+
+GRID = {'BUY_PRICE': ['300000', '327000'], 'ORDER_MARGIN': ['0.5', '2'],
+        'TRADE_CRITERIA': ['fibonacci', 'support_resistance']}
+
+
+def test_full_grid_is_the_cartesian_product():
+    combos = tb.build_sweep_grid(GRID)
+    assert combos == [dict(zip(GRID, values)) for values in itertools.product(*GRID.values())]
+
+
+def test_sampled_grid_is_a_reproducible_subset_without_repeats():
+    full = tb.build_sweep_grid(GRID)
+    sample = tb.build_sweep_grid(GRID, samples=5, seed=42)
+    assert len(sample) == 5
+    assert all(combo in full for combo in sample)
+    assert len({tuple(combo.values()) for combo in sample}) == 5
+    assert tb.build_sweep_grid(GRID, samples=5, seed=42) == sample
+    assert tb.build_sweep_grid(GRID, samples=100) == full  # Amostra maior que a grade: todas as combinações
+
+
+def test_parallel_sweep_matches_sequential_backtests(settings):
+    candles = tb.synthetic_candles(3000, seed=5, price=320000.0)
+    combos = tb.build_sweep_grid(GRID)
+    args = (1000.0, 0.001, 0.001, 240, 1)
+
+    table = tb.run_parameter_sweep(candles, combos, *args, processes=2)
+
+    assert len(table) == len(combos)
+    pnl = list(table['pnl'])
+    assert pnl == sorted(pnl, reverse=True)
+    for row in table.to_dict('records'):
+        combo = {key: row[key] for key in GRID}
+        stats, _ = tb.run_backtest(candles, tb.get_strategy_params(dict(settings, **combo)), *args)
+        assert {key: row[key] for key in stats} == pytest.approx(stats), combo